@@ -0,0 +1,146 @@
+# audio_kesh.py
+import asyncio
+import hashlib
+import logging
+import os
+
+import aiohttp
+
+from kesh import TTLCache
+
+log = logging.getLogger(__name__)
+
+FILE_ID_TTL = 180 * 24 * 3600  # Telegram file_ids stay valid for a long time
+MAX_AUDIO_BYTES = 2 * 1024 * 1024  # Pronunciation clips are a few KB; anything larger is suspicious
+
+
+class AudioCache:
+    """
+    Per-word pronunciation audio cache.
+
+    Remembers the Telegram `file_id` returned by the first successful
+    send_voice so later sends reuse it without Telegram fetching the remote
+    mp3 again. Optionally keeps downloaded mp3s in a size-bounded local
+    directory (least recently used files are removed first) so the first
+    send can upload the file directly.
+    """
+
+    def __init__(self, db_path=None, store_dir=None, max_store_bytes=100 * 1024 * 1024,
+                 max_size=20000, download_timeout=5.0):
+        """
+        Args:
+            db_path (str | None): SQLite file for the file_id cache, or None for memory only.
+            store_dir (str | None): Directory for downloaded mp3s, or None to disable.
+            max_store_bytes (int): Size limit of `store_dir`.
+            max_size (int): Maximum number of file_ids kept in memory.
+            download_timeout (float): Timeout for a single mp3 download, in seconds.
+        """
+        self.file_ids = TTLCache(max_size=max_size, ttl=FILE_ID_TTL, db_path=db_path, name="audio")
+        self.store_dir = store_dir
+        self.max_store_bytes = max_store_bytes
+        self.download_timeout = download_timeout
+        self._session = None
+        self._store_bytes = 0
+        self.downloads = 0
+        self.download_errors = 0
+        self.store_evictions = 0
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+            self._store_bytes = sum(entry.stat().st_size for entry in os.scandir(store_dir) if entry.is_file())
+
+    def get_file_id(self, word):
+        return self.file_ids.get(word)
+
+    def set_file_id(self, word, file_id):
+        self.file_ids.set(word, file_id)
+
+    def forget(self, word):
+        """Drops a file_id that Telegram no longer accepts."""
+        self.file_ids.delete(word)
+
+    def _path(self, word, url):
+        digest = hashlib.sha1(f"{word}|{url}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.store_dir, f"{digest}.mp3")
+
+    def local_path(self, word, url):
+        """Returns the path of a stored mp3 for `word`, or None."""
+        if not self.store_dir:
+            return None
+        path = self._path(word, url)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # Mark as recently used
+            except OSError:
+                pass
+            return path
+        return None
+
+    async def download(self, word, url):
+        """
+        Downloads `url` into the local store.
+
+        Returns:
+            str | None: The stored file path, or None if the store is disabled or the download failed.
+        """
+        if not self.store_dir:
+            return None
+        path = self._path(word, url)
+        if os.path.exists(path):
+            return path
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.download_timeout))
+        try:
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+                content = await response.content.read(MAX_AUDIO_BYTES + 1)
+            if len(content) > MAX_AUDIO_BYTES:
+                log.warning(f"Audio for '{word}' is larger than {MAX_AUDIO_BYTES} bytes, not stored.")
+                return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.download_errors += 1
+            log.warning(f"Could not download audio for '{word}' from {url}: {e}")
+            return None
+
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.error(f"Could not store audio for '{word}': {e}")
+            return None
+        self.downloads += 1
+        self._store_bytes += len(content)
+        if self._store_bytes > self.max_store_bytes:
+            self._evict()
+        return path
+
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self.store_dir) if entry.is_file()),
+                         key=lambda entry: entry.stat().st_mtime)
+        target = self.max_store_bytes * 0.9  # Leave some headroom to avoid evicting on every download
+        for entry in entries:
+            if self._store_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._store_bytes -= size
+                self.store_evictions += 1
+            except OSError as e:
+                log.warning(f"Could not remove {entry.path}: {e}")
+
+    def stats(self):
+        st = self.file_ids.stats()
+        st.update({
+            "store_bytes": self._store_bytes,
+            "downloads": self.downloads,
+            "download_errors": self.download_errors,
+            "store_evictions": self.store_evictions,
+        })
+        return st
+
+    async def close(self):
+        self.file_ids.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
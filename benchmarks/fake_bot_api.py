@@ -0,0 +1,194 @@
+# benchmarks/fake_bot_api.py
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+
+class FakeBotAPI:
+    """
+    Minimal in-process stand-in for the Telegram Bot API.
+
+    Serves `/bot<token>/<method>` like the real API (point aiogram at it with
+    `TelegramAPIServer.from_base(api.base_url)`), supports both getUpdates
+    long polling and webhook delivery, and answers every other method with a
+    plausible result. Latency and error rate can be injected.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8081, latency=0.0, error_rate=0.0, member_status="member"):
+        """
+        Args:
+            latency (float): Seconds added to every API call.
+            error_rate (float): Fraction of send* calls answered with a 500 error.
+            member_status (str): Status returned by getChatMember.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.member_status = member_status
+        self.calls = Counter()
+        self.errors = 0
+        self.on_send = None  # Callback(method, chat_id, text, reply_to_message_id)
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._webhook_url = None
+        self._webhook_secret = None
+        self._client = None
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._client = aiohttp.ClientSession()
+
+    async def stop(self):
+        if self._client:
+            await self._client.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    # --- Update injection ---
+
+    def make_message_update(self, user_id, text, chat_id=None):
+        chat_id = chat_id or user_id
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else []
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                "chat": {"id": chat_id, "type": "private", "first_name": f"User{user_id}"},
+                "text": text,
+                "entities": entities,
+            },
+        }
+
+    def make_callback_update(self, user_id, data):
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                "chat_instance": "1",
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "...",
+                },
+            },
+        }
+
+    async def push_update(self, update):
+        """Delivers an update via the registered webhook, or queues it for getUpdates."""
+        if self._webhook_url:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self._webhook_secret} if self._webhook_secret else {}
+            async with self._client.post(self._webhook_url, json=update, headers=headers) as response:
+                return response.status
+        self._updates.append(update)
+        self._new_update.set()
+        return 200
+
+    # --- API methods ---
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.body_exists else {}
+        params.update(request.query)
+        self.calls[method] += 1
+        if self.latency and method != "getUpdates":
+            await asyncio.sleep(self.latency)
+        if method.startswith("send") and self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return self._error(500, "Internal Server Error: injected")
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code, description):
+        return web.json_response({"ok": False, "error_code": code, "description": description}, status=code)
+
+    def _message(self, params, **extra):
+        chat_id = int(params.get("chat_id", 0))
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        message.update(extra)
+        return message
+
+    def _notify(self, method, params):
+        if self.on_send:
+            reply_to = params.get("reply_to_message_id")
+            self.on_send(method, int(params.get("chat_id", 0)), params.get("text") or params.get("caption"),
+                         int(reply_to) if reply_to else None)
+
+    async def _api_getMe(self, params):
+        return {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+    async def _api_getUpdates(self, params):
+        offset = int(params.get("offset", 0) or 0)
+        timeout = float(params.get("timeout", 0) or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit", 100) or 100)
+        return self._updates[:limit]
+
+    async def _api_setWebhook(self, params):
+        self._webhook_url = params.get("url") or None
+        self._webhook_secret = params.get("secret_token") or None
+        return True
+
+    async def _api_deleteWebhook(self, params):
+        self._webhook_url = None
+        return True
+
+    async def _api_sendMessage(self, params):
+        self._notify("sendMessage", params)
+        return self._message(params, text=params.get("text", ""))
+
+    async def _api_sendVoice(self, params):
+        self._notify("sendVoice", params)
+        n = next(self._file_ids)
+        return self._message(params, voice={"file_id": f"voice{n}", "file_unique_id": f"u{n}", "duration": 1})
+
+    async def _api_editMessageText(self, params):
+        return self._message(params, text=params.get("text", ""))
+
+    async def _api_getChatMember(self, params):
+        user_id = int(params.get("user_id", 0))
+        return {"status": self.member_status, "user": {"id": user_id, "is_bot": False, "first_name": "U"}}
+
+    async def _api_getChat(self, params):
+        return {"id": -1001, "type": "channel", "title": "Fake Channel", "username": "fake_channel"}
+
+    def summary(self):
+        return json.dumps(dict(self.calls), sort_keys=True)
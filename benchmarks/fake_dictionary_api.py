@@ -0,0 +1,84 @@
+# benchmarks/fake_dictionary_api.py
+import asyncio
+import random
+import zlib
+from collections import Counter
+
+from aiohttp import web
+
+
+class FakeDictionaryAPI:
+    """
+    Local stand-in for api.dictionaryapi.dev.
+
+    Serves `/api/v2/entries/en/{word}` in the real response format and the
+    pronunciation mp3s it links to. Point dictionar at it with
+    `dictionar.API_URL = api.url_template`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8083, latency=0.1, error_rate=0.0, missing_rate=0.1):
+        """
+        Args:
+            latency (float): Seconds added to every lookup.
+            error_rate (float): Fraction of lookups answered with HTTP 500.
+            missing_rate (float): Fraction of words that "do not exist" (stable per word, HTTP 404).
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.calls = Counter()
+        self.errors = 0
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def url_template(self):
+        return f"{self.base_url}/api/v2/entries/en/{{word}}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v2/entries/en/{word}", self._entries)
+        app.router.add_get("/audio/{name}", self._audio)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _missing(self, word):
+        # Stable per word, so negative caching behaves as it would against the real API
+        return (zlib.crc32(word.encode("utf-8")) % 1000) < self.missing_rate * 1000
+
+    async def _entries(self, request):
+        word = request.match_info["word"]
+        self.calls["entries"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"title": "Server Error"}, status=500)
+        if self._missing(word):
+            return web.json_response({"title": "No Definitions Found", "message": "Sorry pal.",
+                                      "resolution": "Try the search again."}, status=404)
+        return web.json_response([{
+            "word": word,
+            "phonetic": f"/{word}/",
+            "phonetics": [{"text": f"/{word}/", "audio": f"{self.base_url}/audio/{word}.mp3"}],
+            "meanings": [
+                {"partOfSpeech": "noun", "definitions": [{"definition": f"A sample meaning {i} of {word}."}
+                                                         for i in range(1, 4)]},
+                {"partOfSpeech": "verb", "definitions": [{"definition": f"To {word} something ({i})."}
+                                                         for i in range(1, 4)]},
+            ],
+        }])
+
+    async def _audio(self, request):
+        self.calls["audio"] += 1
+        return web.Response(body=b"ID3" + bytes(2048), content_type="audio/mpeg")
@@ -0,0 +1,77 @@
+# benchmarks/fake_translator.py
+import random
+import threading
+import time
+from collections import Counter
+
+from til_aniqlash import detect_language
+
+
+class _Detected:
+    def __init__(self, lang, confidence):
+        self.lang = lang
+        self.confidence = confidence
+
+
+class _Translated:
+    def __init__(self, text, src, dest):
+        self.text = text
+        self.src = src
+        self.dest = dest
+
+
+class FakeTranslator:
+    """
+    Offline stand-in for googletrans `Translator`.
+
+    Has the same blocking `detect` / `translate` interface, so it runs in
+    AsyncTranslator's thread pool exactly like the real client; `latency`
+    is spent with time.sleep to hold the worker thread the same way.
+    Known words are translated from a small glossary, anything else is
+    reversed, which keeps single words single and alphabetic. Multi-line
+    text is translated line by line.
+    """
+
+    GLOSSARY = {
+        "hello": "salom", "book": "kitob", "water": "suv", "house": "uy", "apple": "olma",
+        "friend": "do'st", "school": "maktab", "teacher": "o'qituvchi", "city": "shahar", "sun": "quyosh",
+    }
+
+    def __init__(self, latency=0.15, jitter=0.05, error_rate=0.0):
+        """
+        Args:
+            latency (float): Mean seconds spent per call.
+            jitter (float): Uniform +/- variation of the latency.
+            error_rate (float): Fraction of calls that raise an exception.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.errors = 0
+        self._reverse = {uz: en for en, uz in self.GLOSSARY.items()}
+        self._lock = threading.Lock()
+
+    def _spend(self, method):
+        with self._lock:
+            self.calls[method] += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise ConnectionError(f"injected {method} failure")
+
+    def detect(self, text):
+        self._spend("detect")
+        lang, confidence = detect_language(text)
+        return _Detected(lang or "en", confidence)
+
+    def translate(self, text, dest="en", src="auto"):
+        self._spend("translate")
+        # Line by line, as googletrans keeps the line breaks of a pasted word list
+        glossary = self.GLOSSARY if dest == "uz" else self._reverse
+        lines = []
+        for line in text.split("\n"):
+            translated = glossary.get(line.strip().lower())
+            lines.append(translated if translated is not None else " ".join(word[::-1] for word in line.split()))
+        return _Translated("\n".join(lines), src, dest)
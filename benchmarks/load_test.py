@@ -0,0 +1,261 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test of main.py's dispatcher against local stand-ins.
+
+Telegram (FakeBotAPI), googletrans (FakeTranslator) and dictionaryapi.dev
+(FakeDictionaryAPI) all run in-process with configurable latency and
+error injection, so the whole bot can be measured offline. N simulated
+users send /start, words, phrases, menu buttons and subscription checks.
+
+Reports updates/sec, message -> first reply latency, per-handler
+p50/p95/p99 and upstream call counts.
+
+Run from the repository root:
+    python -m benchmarks.load_test --users 200 --actions 10
+    python -m benchmarks.load_test --translate-latency 0.5 --dict-error-rate 0.2 --env MATN_PARALLEL=16
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from aiogram import Bot, Dispatcher
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.fake_dictionary_api import FakeDictionaryAPI
+from benchmarks.fake_translator import FakeTranslator
+
+TOKEN = "123456:LOADTEST"
+
+ENGLISH_WORDS = (
+    "hello book water house apple friend school teacher city sun time people year way day man thing woman "
+    "life child world school state family student group country problem hand part place case week company "
+    "system program question work government number night point home room mother area money story fact "
+    "month lot right study word business issue side kind head service friend father power hour game line"
+).split()
+UZBEK_WORDS = "salom kitob suv uy olma maktab shahar quyosh".split()
+PHRASES = ["how are you", "good morning my friend", "where is the library", "men talabaman", "bugun havo yaxshi"]
+BUTTONS = ["🆘 Yordam", "📊 Statistika"]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+class Recorder:
+    """Collects raw handler durations; passed to HandlerTimingMiddleware instead of a histogram."""
+
+    def __init__(self):
+        self.values = defaultdict(list)
+
+    def observe(self, value, handler):
+        self.values[handler].append(value)
+
+
+def zipf_choice(rnd, items, s=1.1):
+    # Popular words repeat, as they do with real users, so caches see realistic hit rates
+    weights = [1.0 / (rank ** s) for rank in range(1, len(items) + 1)]
+    return rnd.choices(items, weights)[0]
+
+
+def configure_environment(args, tmp):
+    env = {
+        "BOT_TOKEN": TOKEN,
+        "BOT_API_SERVER": f"http://127.0.0.1:{args.api_port}",
+        "BOT_REJIMI": "polling",
+        "ADMIN_IDS": "",
+        "METRIKA_PORT": "0",
+        "FOYDALANUVCHILAR_BAZASI": os.path.join(tmp, "foydalanuvchilar.sqlite3"),
+        "FSM_BAZASI": os.path.join(tmp, "fsm.sqlite3"),
+        "TARJIMA_KESH_FAYLI": "" if args.cold else os.path.join(tmp, "tarjima.sqlite3"),
+        "TARIF_KESH_FAYLI": "" if args.cold else os.path.join(tmp, "tarif.sqlite3"),
+        "AUDIO_KESH_FAYLI": os.path.join(tmp, "audio.sqlite3"),
+        "LUGAT_INDEKS_FAYLI": os.path.join(tmp, "yoq.sqlite3"),
+        "REKLAMA_PAPKASI": os.path.join(tmp, "reklama"),
+        "SOROV_JURNALI_FAYLI": os.path.join(tmp, "sorovlar.sqlite3"),
+        "KESH_SURATI_FAYLI": os.path.join(tmp, "kesh_surati.json"),
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    os.environ.update(env)
+
+
+async def run(args):
+    api = FakeBotAPI(port=args.api_port, latency=args.api_latency, error_rate=args.api_error_rate,
+                     member_status=args.member_status)
+    dictionary = FakeDictionaryAPI(port=args.dict_port, latency=args.dict_latency, error_rate=args.dict_error_rate,
+                                   missing_rate=args.dict_missing_rate)
+    translator = FakeTranslator(latency=args.translate_latency, error_rate=args.translate_error_rate)
+    await api.start()
+    await dictionary.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_environment(args, tmp)
+        import dictionar
+        import main
+        from metrika import HandlerTimingMiddleware
+        logging.getLogger().setLevel(logging.WARNING)
+
+        dictionar.API_URL = dictionary.url_template
+        main.tarjima_xizmati.translator = translator
+        if args.channel:
+            main.JORIY_KANAL_ID = "@fake_channel"
+        recorder = Recorder()
+        main.dp.middleware.setup(HandlerTimingMiddleware(histogram=recorder))
+
+        # Count finished updates (including shed ones) to know when the run is over
+        processed = 0
+        all_processed = asyncio.Event()
+        expected = None
+        original_process_updates = main.dp.process_updates
+
+        async def counting_process_updates(updates, fast=True):
+            nonlocal processed
+            try:
+                return await original_process_updates(updates, fast)
+            finally:
+                processed += len(updates)
+                if expected is not None and processed >= expected:
+                    all_processed.set()
+
+        main.dp.process_updates = counting_process_updates
+
+        pushed_at = {}
+        reply_latencies = []
+
+        def on_send(method, chat_id, text, reply_to):
+            started = pushed_at.pop(reply_to, None) if reply_to else None
+            if started is not None:
+                reply_latencies.append(time.perf_counter() - started)
+
+        api.on_send = on_send
+
+        Bot.set_current(main.bot)
+        Dispatcher.set_current(main.dp)
+        await main.bot_ishga_tushganda(main.dp)
+        polling_task = asyncio.create_task(main.dp.start_polling(timeout=20))
+        await asyncio.sleep(0.2)  # Let the first getUpdates arrive
+
+        pushed = 0
+
+        async def push(update):
+            nonlocal pushed
+            pushed += 1
+            message = update.get("message")
+            if message:
+                pushed_at[message["message_id"]] = time.perf_counter()
+            await api.push_update(update)
+
+        async def user_session(user_id, rnd):
+            await asyncio.sleep(rnd.uniform(0, args.ramp))
+            await push(api.make_message_update(user_id, "/start"))
+            for _ in range(args.actions):
+                await asyncio.sleep(rnd.expovariate(1.0 / args.think) if args.think else 0)
+                if rnd.random() < args.list_rate:
+                    # A pasted vocabulary list, one word per line
+                    words = rnd.sample(ENGLISH_WORDS, min(len(ENGLISH_WORDS), args.list_size))
+                    await push(api.make_message_update(user_id, "\n".join(words)))
+                    continue
+                roll = rnd.random()
+                if roll < 0.60:
+                    await push(api.make_message_update(user_id, zipf_choice(rnd, ENGLISH_WORDS).capitalize()))
+                elif roll < 0.70:
+                    await push(api.make_message_update(user_id, rnd.choice(UZBEK_WORDS)))
+                elif roll < 0.80:
+                    await push(api.make_message_update(user_id, rnd.choice(PHRASES)))
+                elif roll < 0.92:
+                    await push(api.make_message_update(user_id, rnd.choice(BUTTONS)))
+                else:
+                    await push(api.make_callback_update(user_id, "azolikni_tekshir"))
+
+        rnd = random.Random(args.seed)
+        started = time.perf_counter()
+        await asyncio.gather(*(user_session(100_000 + i, random.Random(rnd.random())) for i in range(args.users)))
+        expected = pushed
+        if processed >= expected:
+            all_processed.set()
+        try:
+            await asyncio.wait_for(all_processed.wait(), timeout=args.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Timed out: {processed}/{expected} updates processed")
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.5)  # Let replies streamed after the handler (late definitions) arrive
+
+        main.dp.stop_polling()
+        await main.dp.wait_closed()
+        polling_task.cancel()
+        await main.bot_toxtaganda(main.dp)
+        await main.dp.storage.close()
+        await (await main.bot.get_session()).close()
+        report(args, pushed, processed, elapsed, reply_latencies, recorder, api, translator, dictionary, main)
+
+    await dictionary.stop()
+    await api.stop()
+
+
+def report(args, pushed, processed, elapsed, reply_latencies, recorder, api, translator, dictionary, main):
+    print(f"\nusers={args.users} actions/user={args.actions} think={args.think}s "
+          f"translate={args.translate_latency}s dict={args.dict_latency}s api={args.api_latency}s")
+    print(f"updates: {processed}/{pushed} in {elapsed:.2f} s -> {processed / elapsed:.1f} updates/s")
+    ms = [x * 1000 for x in reply_latencies]
+    print(f"message -> first reply: n={len(ms)}  p50={percentile(ms, 0.50):.1f} ms  "
+          f"p95={percentile(ms, 0.95):.1f} ms  p99={percentile(ms, 0.99):.1f} ms")
+
+    print(f"\n{'handler':32} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for handler, values in sorted(recorder.values.items(), key=lambda item: -len(item[1])):
+        values = [x * 1000 for x in values]
+        print(f"{handler:32} {len(values):>6} {percentile(values, 0.50):>9.1f} "
+              f"{percentile(values, 0.95):>9.1f} {percentile(values, 0.99):>9.1f}")
+
+    print("\nupstream calls:")
+    print(f"  telegram:      {dict(api.calls.most_common())} (injected errors: {api.errors})")
+    print(f"  translator:    {dict(translator.calls)} (injected errors: {translator.errors})")
+    print(f"  dictionaryapi: {dict(dictionary.calls)} (injected errors: {dictionary.errors})")
+    print("\nbot counters:")
+    print(f"  api calls per update: {main.api_metrikasi.stats()}")
+    print(f"  throttling: {main.cheklov.stats()}")
+    print(f"  text admission: {main.matn_navbati.stats()}")
+    print(f"  send scheduler: {main.yuborish_navbati.stats()} (RetryAfter: {main.bot.retry_after_errors})")
+    for cache in (main.tarjima_keshi, main.tarif_keshi, main.azolik_keshi):
+        st = cache.stats()
+        print(f"  cache {st['name']}: hit-rate {st['hit_rate']:.1%} ({st['hits'] + st['disk_hits']}/"
+              f"{st['hits'] + st['disk_hits'] + st['misses']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100, help="simulated users")
+    parser.add_argument("--actions", type=int, default=10, help="actions per user after /start")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between a user's actions")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which users join")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--channel", action="store_true", help="require channel membership (exercises getChatMember)")
+    parser.add_argument("--member-status", default="member")
+    parser.add_argument("--list-rate", type=float, default=0.0, help="share of actions that paste a word list")
+    parser.add_argument("--list-size", type=int, default=30, help="words per pasted list")
+    parser.add_argument("--cold", action="store_true", help="memory-only caches (no disk tier)")
+    parser.add_argument("--api-latency", type=float, default=0.03)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--translate-latency", type=float, default=0.15)
+    parser.add_argument("--translate-error-rate", type=float, default=0.0)
+    parser.add_argument("--dict-latency", type=float, default=0.1)
+    parser.add_argument("--dict-error-rate", type=float, default=0.0)
+    parser.add_argument("--dict-missing-rate", type=float, default=0.1)
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--dict-port", type=int, default=8083)
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a bot setting, e.g. --env MATN_PARALLEL=16 (repeatable)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/webhook_vs_polling.py
+"""
+End-to-end update latency: long polling vs webhook, against a local fake Bot API.
+
+An echo bot is served in each mode; the fake API injects N updates at a fixed
+rate and measures the time until the bot's sendMessage reply arrives.
+
+Run from the repository root:
+    python -m benchmarks.webhook_vs_polling --updates 500 --rate 50
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from webhook import WebhookServer
+
+TOKEN = "123456:BENCHMARK"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+async def run_mode(mode, args):
+    api = FakeBotAPI(port=args.api_port, latency=args.api_latency)
+    await api.start()
+    bot = Bot(TOKEN, server=TelegramAPIServer.from_base(api.base_url))
+    dp = Dispatcher(bot)
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+
+    @dp.message_handler()
+    async def echo(message: types.Message):
+        await bot.send_message(message.chat.id, message.text)
+
+    sent_at = {}
+    latencies = []
+    done = asyncio.Event()
+
+    def on_send(method, chat_id, text, reply_to):
+        started = sent_at.pop(text, None)
+        if started is not None:
+            latencies.append(time.perf_counter() - started)
+            if len(latencies) == args.updates:
+                done.set()
+
+    api.on_send = on_send
+
+    runner = polling_task = None
+    if mode == "webhook":
+        server = WebhookServer(dp, f"http://127.0.0.1:{args.webhook_port}/webhook", "/webhook",
+                               secret_token="benchmark-secret", workers=args.workers)
+        runner = web.AppRunner(server.make_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.webhook_port).start()
+    else:
+        polling_task = asyncio.create_task(dp.start_polling(timeout=20))
+        await asyncio.sleep(0.2)  # Let the first getUpdates arrive
+
+    interval = 1.0 / args.rate
+    for i in range(args.updates):
+        text = f"word{i}"
+        sent_at[text] = time.perf_counter()
+        await api.push_update(api.make_message_update(10_000 + i % 100, text))
+        await asyncio.sleep(interval)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=30)
+    except asyncio.TimeoutError:
+        print(f"  {mode}: timed out with {len(latencies)}/{args.updates} replies")
+
+    if polling_task:
+        dp.stop_polling()
+        await dp.wait_closed()
+        polling_task.cancel()
+    if runner:
+        await runner.cleanup()
+    else:
+        await (await bot.get_session()).close()
+    await api.stop()
+    return latencies
+
+
+def report(mode, latencies):
+    ms = [x * 1000 for x in latencies]
+    print(f"{mode:8} n={len(ms):5}  p50={percentile(ms, 0.50):7.1f} ms  p95={percentile(ms, 0.95):7.1f} ms  "
+          f"p99={percentile(ms, 0.99):7.1f} ms  max={max(ms) if ms else float('nan'):7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=50.0, help="updates per second")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds added to every fake API call")
+    parser.add_argument("--workers", type=int, default=32, help="webhook worker count")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8082)
+    args = parser.parse_args()
+
+    for mode in ("polling", "webhook"):
+        report(mode, await run_mode(mode, args))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -0,0 +1,485 @@
+# cheklov.py
+import asyncio
+import contextlib
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+
+from aiogram import Bot, types
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so
+    short bursts of up to `capacity` are allowed while the long-run rate
+    stays at `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float | None): Bucket size (defaults to `rate`, i.e. one second of burst).
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Takes `tokens` if available right now; returns False otherwise."""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens=1):
+        """Waits until `tokens` are available and takes them (callers are served FIFO)."""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class FairScheduler:
+    """
+    Global concurrency limit with round-robin admission across keys.
+
+    While a slot is free, callers enter immediately. Otherwise each caller
+    waits in its key's queue (at most `max_pending` per key) and freed slots
+    are handed to keys in turn, so one key with many waiters cannot starve
+    the others.
+    """
+
+    def __init__(self, concurrency=32, max_pending=3):
+        """
+        Args:
+            concurrency (int): Maximum callers inside at once.
+            max_pending (int): Maximum waiters per key; further callers are refused.
+        """
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.active = 0
+        self.waiting = 0
+        self._queues = {}  # key -> deque of futures
+        self._ring = deque()  # keys with waiters, in round-robin order
+
+    async def enter(self, key):
+        """
+        Waits for a slot.
+
+        Returns:
+            bool: True once a slot is held (release it with `leave`), False if the key's queue is full.
+        """
+        if self.active < self.concurrency and not self._ring:
+            self.active += 1
+            return True
+        queue = self._queues.get(key)
+        if queue is not None and len(queue) >= self.max_pending:
+            return False
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ring.append(key)
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self.waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.leave()  # The slot was handed over just before the cancellation
+            else:
+                self._discard(key, future)
+            raise
+        finally:
+            self.waiting -= 1
+        return True
+
+    def leave(self):
+        """Releases a slot, handing it straight to the next key in turn."""
+        while self._ring:
+            key = self._ring.popleft()
+            queue = self._queues[key]
+            future = queue.popleft()
+            if queue:
+                self._ring.append(key)
+            else:
+                del self._queues[key]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, key, future):
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[key]
+            self._ring.remove(key)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Per-user rate limiting and fair scheduling for incoming updates.
+
+    Each user has a token bucket; updates beyond it are dropped and the user
+    gets a single notice per `notice_interval`. Admitted updates then pass a
+    FairScheduler, so when the bot is saturated users are served in turn
+    rather than in arrival order. Users in `exempt` bypass both, and so do
+    update kinds outside `update_types` (inline queries arrive on every
+    keystroke and are debounced by their handler instead).
+
+    The slot is released in `on_post_process_update`; register an errors
+    handler on the dispatcher so that runs even when a handler raises.
+    """
+
+    def __init__(self, rate=1.0, burst=5, concurrency=32, max_pending=3, exempt=(), notice=None,
+                 notice_interval=30.0, max_users=100000,
+                 update_types=("message", "edited_message", "callback_query")):
+        """
+        Args:
+            rate (float): Sustained updates per second allowed per user.
+            burst (int): Updates a user may send at once before being limited.
+            concurrency (int): Updates processed at once across all users.
+            max_pending (int): Updates a single user may have waiting for a slot.
+            exempt (iterable[int]): User IDs that are never throttled (e.g. admins).
+            notice (str | None): Message sent to a user whose updates are dropped.
+            notice_interval (float): Minimum seconds between notices to the same user.
+            max_users (int): Number of per-user buckets kept (least recently active are dropped).
+            update_types (tuple[str]): Update fields that are throttled; other updates pass untouched.
+        """
+        super().__init__()
+        self.update_types = update_types
+        self.rate = rate
+        self.burst = burst
+        self.exempt = exempt
+        self.notice = notice
+        self.notice_interval = notice_interval
+        self.max_users = max_users
+        self.scheduler = FairScheduler(concurrency, max_pending)
+        self._buckets = OrderedDict()  # user_id -> TokenBucket
+        self._noticed = {}  # user_id -> monotonic time of the last notice
+        self.throttled = 0  # Admitted, but had to wait for a slot
+        self.shed = 0  # Dropped
+        self.notices = 0
+
+    def _user(self, update: types.Update):
+        event = next((getattr(update, kind) for kind in self.update_types if getattr(update, kind)), None)
+        return event.from_user if event is not None else None
+
+    def _bucket(self, user_id):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_users:
+                old_id, _ = self._buckets.popitem(last=False)
+                self._noticed.pop(old_id, None)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        user = self._user(update)
+        if user is None or user.id in self.exempt:
+            return
+        if not self._bucket(user.id).try_acquire():
+            await self._shed(update, user.id)
+        saturated = self.scheduler.active >= self.scheduler.concurrency
+        if not await self.scheduler.enter(user.id):
+            await self._shed(update, user.id)
+        if saturated:
+            self.throttled += 1
+        data["_throttling_slot"] = True
+
+    async def on_post_process_update(self, update: types.Update, result, data: dict):
+        if data.pop("_throttling_slot", False):
+            self.scheduler.leave()
+
+    async def _shed(self, update: types.Update, user_id):
+        self.shed += 1
+        now = time.monotonic()
+        if self.notice and now - self._noticed.get(user_id, float("-inf")) >= self.notice_interval:
+            self._noticed[user_id] = now
+            self.notices += 1
+            try:
+                if update.callback_query:
+                    await update.callback_query.answer(self.notice)
+                elif update.message or update.edited_message:
+                    await Bot.get_current().send_message(user_id, self.notice)
+            except Exception as e:
+                log.debug(f"Could not send throttling notice to {user_id}: {e}")
+        raise CancelHandler()
+
+    def stats(self):
+        """Returns throttling counters and scheduler occupancy."""
+        return {
+            "users": len(self._buckets),
+            "active": self.scheduler.active,
+            "concurrency": self.scheduler.concurrency,
+            "waiting": self.scheduler.waiting,
+            "throttled": self.throttled,
+            "shed": self.shed,
+            "notices": self.notices,
+        }
+
+
+class AdmissionController:
+    """
+    Admission control for an expensive handler.
+
+    At most `limit` requests run at once. Later requests wait in a bounded
+    FIFO queue for at most `max_wait` seconds. A request that waited longer
+    than `degrade_after` is admitted in degraded mode, so the caller can
+    do less work and drain the backlog faster. Requests that find the queue
+    full, or time out waiting, are refused.
+    """
+
+    FULL = "full"
+    DEGRADED = "degraded"
+
+    def __init__(self, limit=8, queue_size=32, max_wait=8.0, degrade_after=2.0):
+        """
+        Args:
+            limit (int): Maximum requests in flight.
+            queue_size (int): Maximum requests waiting for a slot.
+            max_wait (float): Seconds a request may wait before it is refused.
+            degrade_after (float): Wait (in seconds) after which a request is served degraded.
+        """
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.degrade_after = degrade_after
+        self.active = 0
+        self._waiters = deque()
+        self.max_queue = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.admitted = 0
+        self.degraded = 0
+        self.rejected = 0  # Queue full
+        self.timed_out = 0  # Waited max_wait without getting a slot
+
+    async def acquire(self):
+        """
+        Waits for a slot.
+
+        Returns:
+            str | None: FULL or DEGRADED once a slot is held (release it with
+            `release`), or None if the request should be refused.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return self.FULL
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            return None
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.max_queue = max(self.max_queue, len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            if future.done():
+                self.release()  # The slot was handed over just before the cancellation
+            else:
+                self._waiters.remove(future)
+            raise
+        waited = time.monotonic() - started
+        self.waits += 1
+        self.total_wait += waited
+        if not future.done():
+            self._waiters.remove(future)
+            self.timed_out += 1
+            return None
+        if waited >= self.degrade_after:
+            self.degraded += 1
+            return self.DEGRADED
+        self.admitted += 1
+        return self.FULL
+
+    def release(self):
+        """Releases a slot, handing it to the longest waiting request."""
+        if self._waiters:
+            self._waiters.popleft().set_result(None)
+        else:
+            self.active -= 1
+
+    def stats(self):
+        """Returns occupancy, queue depth, wait time and shedding counters."""
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "avg_wait": self.total_wait / self.waits if self.waits else 0.0,
+            "admitted": self.admitted,
+            "degraded": self.degraded,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+INTERACTIVE = 0  # Replies to users
+BULK = 1  # Broadcasts; only sent while no interactive message is waiting
+
+_send_priority = contextvars.ContextVar("send_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def send_priority(priority):
+    """Sends made inside the block (and in tasks it starts) use `priority`."""
+    token = _send_priority.set(priority)
+    try:
+        yield
+    finally:
+        _send_priority.reset(token)
+
+
+class SendScheduler:
+    """
+    Outbound message scheduler enforcing Telegram's flood limits.
+
+    Every message send first waits for its chat's bucket (about one message
+    per second, with a small burst), then for a slot in the global bucket
+    (about 30 per second). Global slots go to interactive senders first;
+    bulk (broadcast) senders only get the slots nobody else is waiting for.
+    A RetryAfter from Telegram pauses all sends for the requested time.
+    """
+
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=3, max_chats=10000):
+        """
+        Args:
+            global_rate (float): Messages per second across all chats.
+            chat_rate (float): Messages per second to a single chat.
+            chat_burst (int): Messages a chat may receive at once.
+            max_chats (int): Number of per-chat buckets kept (least recently used are dropped).
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate)
+        self._chats = OrderedDict()  # chat_id -> TokenBucket
+        self._queues = (deque(), deque())  # futures per priority
+        self._wakeup = None
+        self._pump_task = None
+        self.paused_until = 0.0
+        self.pauses = 0
+        self.sent = [0, 0]
+        self.waited = [0, 0]
+        self.total_wait = [0.0, 0.0]
+
+    def _chat_bucket(self, chat_id):
+        key = str(chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            bucket = self._chats[key] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(key)
+        return bucket
+
+    async def acquire(self, chat_id):
+        """Waits until a message may be sent to `chat_id`, using the current send priority."""
+        priority = _send_priority.get()
+        started = time.monotonic()
+        await self._chat_bucket(chat_id).acquire()
+        if not (time.monotonic() >= self.paused_until and not any(self._queues) and self._global.try_acquire()):
+            future = asyncio.get_running_loop().create_future()
+            self._queues[priority].append(future)
+            self._ensure_pump()
+            self._wakeup.set()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()  # Skipped by the pump
+                raise
+        waited = time.monotonic() - started
+        self.sent[priority] += 1
+        if waited > 0.001:
+            self.waited[priority] += 1
+            self.total_wait[priority] += waited
+
+    def pause(self, seconds):
+        """Stops all sends for `seconds` (called on RetryAfter)."""
+        self.pauses += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _ensure_pump(self):
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.ensure_future(self._pump())
+
+    def _next_waiter(self):
+        """Returns the queue whose head is the next live waiter (interactive first), dropping cancelled ones."""
+        for queue in self._queues:
+            while queue and queue[0].done():
+                queue.popleft()
+            if queue:
+                return queue
+        return None
+
+    async def _pump(self):
+        have_token = False  # Kept across wakeups, so a token taken for a waiter that then gave up is not lost
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                queue = self._next_waiter()
+                if queue is None:
+                    break
+                delay = self.paused_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                if not have_token:
+                    await self._global.acquire()
+                    have_token = True
+                    continue  # A pause may have started, or the waiter given up, meanwhile
+                queue.popleft().set_result(None)
+                have_token = False
+
+    async def close(self):
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self):
+        """Returns queue depths, send counts and average waits per priority."""
+        return {
+            "waiting_interactive": len(self._queues[INTERACTIVE]),
+            "waiting_bulk": len(self._queues[BULK]),
+            "sent_interactive": self.sent[INTERACTIVE],
+            "sent_bulk": self.sent[BULK],
+            "avg_wait_interactive": self.total_wait[INTERACTIVE] / self.waited[INTERACTIVE] if self.waited[INTERACTIVE] else 0.0,
+            "avg_wait_bulk": self.total_wait[BULK] / self.waited[BULK] if self.waited[BULK] else 0.0,
+            "pauses": self.pauses,
+            "paused": max(0.0, self.paused_until - time.monotonic()),
+        }
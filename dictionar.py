@@ -1,15 +1,310 @@
 # dictionar.py
+import asyncio
 import requests
+import aiohttp
 import json
 import logging
+import time
+
+import metrika
+from kesh import SingleFlight, TTLCache
+from lugat_indeksi import LocalDictionary
 
 # Use logging instead of print for better integration
 log = logging.getLogger(__name__)
 
-def get_definitions(word, max_definitions=7):
+API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/{word}"
+REQUEST_TIMEOUT = 15  # Increased timeout slightly for potentially slower connections
+
+# Cache lifetimes: found words rarely change, "not found" may be fixed upstream sooner
+DEFINITION_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+
+# Result kinds returned by the fetch helpers
+_OK = "ok"              # Definitions found, cached for DEFINITION_TTL
+_NEGATIVE = "negative"  # Word does not exist upstream, cached for NEGATIVE_TTL
+_TRANSIENT = "transient"  # Timeouts, network and server errors, never cached
+
+_cache = None
+_negative_ttl = NEGATIVE_TTL
+_local_index = None
+_inflight = SingleFlight("ta'rif")  # Concurrent lookups of the same word share one API request
+
+# Pooled keep-alive HTTP clients: one for the sync wrapper, one for the async API
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_http_limit = 20
+_http_limit_per_host = 10
+_http_timeout = REQUEST_TIMEOUT
+_aio_session = None
+
+
+class DefinitionResult:
+    """
+    Outcome of a dictionary lookup.
+
+    On success `error` is None and the other fields are filled in; otherwise
+    `error` holds the user-facing (Uzbek) error message.
+    """
+    __slots__ = ("phonetic", "audio", "definitions", "error")
+
+    def __init__(self, phonetic=None, audio=None, definitions=None, error=None):
+        self.phonetic = phonetic
+        self.audio = audio
+        self.definitions = definitions or []
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def to_dict(self):
+        """Returns the legacy dict format (also used for the cache)."""
+        if self.error is not None:
+            return {"error": self.error}
+        return {"phonetic": self.phonetic, "audio": self.audio, "definitions": self.definitions}
+
+    @classmethod
+    def from_dict(cls, data):
+        if "error" in data:
+            return cls(error=data["error"])
+        return cls(phonetic=data.get("phonetic"), audio=data.get("audio"), definitions=data.get("definitions"))
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"DefinitionResult(error={self.error!r})"
+        return f"DefinitionResult(phonetic={self.phonetic!r}, audio={self.audio!r}, definitions={len(self.definitions)})"
+
+
+def configure_cache(db_path=None, max_size=5000, ttl=DEFINITION_TTL, negative_ttl=NEGATIVE_TTL):
+    """
+    Enables the definition cache used by get_definitions.
+
+    Args:
+        db_path (str | None): SQLite file for the persistent tier, or None for memory only.
+        max_size (int): Maximum number of entries kept in memory.
+        ttl (float): Lifetime of found definitions, in seconds.
+        negative_ttl (float): Lifetime of "not found" results, in seconds.
+
+    Returns:
+        TTLCache: The cache, e.g. for reading its stats.
+    """
+    global _cache, _negative_ttl
+    if _cache is not None:
+        _cache.close()
+    _cache = TTLCache(max_size=max_size, ttl=ttl, db_path=db_path, name="ta'rif")
+    _negative_ttl = negative_ttl
+    return _cache
+
+
+def close_cache():
+    """Closes the definition cache, if one was configured."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def configure_local_index(db_path):
+    """
+    Serves lookups from a local index built with lugat_indeksi.py, falling
+    back to the API for words it does not contain.
+
+    Args:
+        db_path (str): Path to the SQLite index.
+
+    Returns:
+        LocalDictionary | None: The index, or None if it could not be opened.
+    """
+    global _local_index
+    close_local_index()
+    try:
+        _local_index = LocalDictionary(db_path)
+        log.info(f"Local dictionary index opened: {db_path}")
+    except Exception as e:
+        log.error(f"Could not open local dictionary index {db_path}: {e}")
+        _local_index = None
+    return _local_index
+
+
+def close_local_index():
+    """Closes the local index, if one was configured."""
+    global _local_index
+    if _local_index is not None:
+        _local_index.close()
+        _local_index = None
+
+
+def configure_http(limit=20, limit_per_host=10, timeout=REQUEST_TIMEOUT):
+    """
+    Sets connection limits for the pooled async client.
+
+    Must be called before the first get_definitions_async call.
+
+    Args:
+        limit (int): Maximum simultaneous connections.
+        limit_per_host (int): Maximum simultaneous connections to the API host.
+        timeout (float): Total per-request timeout, in seconds.
+    """
+    global _http_limit, _http_limit_per_host, _http_timeout
+    _http_limit = limit
+    _http_limit_per_host = limit_per_host
+    _http_timeout = timeout
+
+
+async def close_http():
+    """Closes the pooled async client."""
+    global _aio_session
+    if _aio_session is not None and not _aio_session.closed:
+        await _aio_session.close()
+    _aio_session = None
+
+
+def _get_aio_session():
+    global _aio_session
+    if _aio_session is None or _aio_session.closed:
+        connector = aiohttp.TCPConnector(limit=_http_limit, limit_per_host=_http_limit_per_host,
+                                         keepalive_timeout=60)
+        _aio_session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=_http_timeout))
+    return _aio_session
+
+
+def _local_lookup(word, max_definitions):
+    if _local_index is None:
+        return None
+    try:
+        entry = _local_index.lookup(word)
+    except Exception as e:
+        log.error(f"Local dictionary lookup failed for '{word}': {e}")
+        return None
+    if entry is None or not entry["definitions"]:
+        return None
+    log.info(f"Local dictionary hit for '{word}'.")
+    return DefinitionResult(
+        phonetic=entry["phonetic"] or "Mavjud emas",
+        audio=entry["audio"],
+        definitions=[f"👉 {d}" for d in entry["definitions"][:max_definitions]] or ["Ta'riflar topilmadi."]
+    )
+
+
+def _cache_get(word, max_definitions):
+    if _cache is None:
+        return None
+    cached = _cache.get(f"{word}:{max_definitions}")
+    if cached is not None:
+        log.info(f"Definition cache hit for '{word}'.")
+        return DefinitionResult.from_dict(cached)
+    return None
+
+
+def _cache_set(word, max_definitions, result, kind):
+    if _cache is not None and kind != _TRANSIENT:
+        _cache.set(f"{word}:{max_definitions}", result.to_dict(), ttl=None if kind == _OK else _negative_ttl)
+
+
+def cached_definitions(word, max_definitions=7):
+    """
+    Returns the cached DefinitionResult for `word` without any API request, or None.
+    """
+    normalized = _normalize_word(word)
+    return _cache_get(normalized, max_definitions) if normalized else None
+
+
+def prime_cache(word, max_definitions, result):
+    """
+    Stores a found DefinitionResult in the definition cache (e.g. from a warm-start snapshot).
+    """
+    normalized = _normalize_word(word)
+    if normalized and result.ok:
+        _cache_set(normalized, max_definitions, result, _OK)
+
+
+def _normalize_word(word):
+    if not isinstance(word, str) or not word.strip():
+        return None
+    return word.strip().lower()
+
+
+async def get_definitions_async(word, max_definitions=7):
     """
     Fetches definitions, phonetics, and audio for a given English word
-    from the dictionaryapi.dev API.
+    from the dictionaryapi.dev API over a pooled keep-alive connection.
+
+    Lookups are answered from the local index (configure_local_index) or
+    the definition cache (configure_cache) when possible. Found words and
+    "not found" answers from the API are cached; transient errors are not.
+    Concurrent lookups of the same word share a single API request.
+
+    Args:
+        word (str): The English word to look up.
+        max_definitions (int): The maximum number of definitions to return.
+
+    Returns:
+        DefinitionResult: The phonetic, audio and definitions, or an error message.
+    """
+    normalized = _normalize_word(word)
+    if normalized is None:
+        log.warning("get_definitions_async called with invalid word input.")
+        return DefinitionResult(error="Noto'g'ri so'z kiritildi.")
+
+    local = _local_lookup(normalized, max_definitions)
+    if local is not None:
+        return local
+    cached = _cache_get(normalized, max_definitions)
+    if cached is not None:
+        return cached
+    return await _inflight.do(f"{normalized}:{max_definitions}", _fetch_and_cache, normalized, max_definitions)
+
+
+async def _fetch_and_cache(word, max_definitions):
+    started = time.perf_counter()
+    result, kind = await _fetch_definitions_async(word, max_definitions)
+    metrika.observe_dependency("dictionaryapi", time.perf_counter() - started, error=kind == _TRANSIENT)
+    _cache_set(word, max_definitions, result, kind)
+    return result
+
+
+async def get_definitions_many(words, max_definitions=7, concurrency=8):
+    """
+    Looks up several words concurrently, with at most `concurrency` API requests at once.
+
+    Each word goes through get_definitions_async, so the local index, cache
+    and request coalescing apply to every item. A failing lookup yields a
+    DefinitionResult with an error instead of failing the whole batch.
+
+    Args:
+        words (list[str]): The English words to look up.
+        max_definitions (int): The maximum number of definitions per word.
+        concurrency (int): Maximum lookups in flight.
+
+    Returns:
+        list[DefinitionResult]: Results in the order of `words`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(word):
+        async with semaphore:
+            try:
+                return await get_definitions_async(word, max_definitions)
+            except Exception as e:
+                log.error(f"Batch lookup for '{word}' failed: {e}")
+                return DefinitionResult(error="Ta'rifni olishda xatolik yuz berdi.")
+
+    return await asyncio.gather(*(lookup(word) for word in words))
+
+
+def coalescing_stats():
+    """Returns how many async lookups were served by an already in-flight request."""
+    return _inflight.stats()
+
+
+def get_definitions(word, max_definitions=7):
+    """
+    Synchronous variant of get_definitions_async.
+
+    Uses the shared local index, cache and parsing with a pooled `requests`
+    session and returns the result serialized as before.
 
     Args:
         word (str): The English word to look up.
@@ -19,117 +314,176 @@ def get_definitions(word, max_definitions=7):
         str: A JSON string containing the results (phonetic, audio, definitions)
              or an error message.
     """
-    if not isinstance(word, str) or not word.strip():
+    normalized = _normalize_word(word)
+    if normalized is None:
         log.warning("get_definitions called with invalid word input.")
         return json.dumps({"error": "Noto'g'ri so'z kiritildi."}, ensure_ascii=False, indent=4)
 
-    word = word.strip().lower() # Normalize word
-    url = f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}"
+    result = _local_lookup(normalized, max_definitions) or _cache_get(normalized, max_definitions)
+    if result is None:
+        result, kind = _fetch_definitions(normalized, max_definitions)
+        _cache_set(normalized, max_definitions, result, kind)
+    return json.dumps(result.to_dict(), ensure_ascii=False, indent=4)
+
+
+async def _fetch_definitions_async(word, max_definitions):
+    """
+    Performs the API request for an already normalized word with aiohttp.
+
+    Returns:
+        tuple[DefinitionResult, str]: The result and its kind (_OK, _NEGATIVE or _TRANSIENT).
+    """
+    url = API_URL.format(word=word)
     log.info(f"Requesting definition for '{word}' from {url}")
 
     try:
-        # Increased timeout slightly for potentially slower connections
-        response = requests.get(url, timeout=15)
+        async with _get_aio_session().get(url) as response:
+            if response.status == 404:
+                log.warning(f"Word '{word}' not found (404).")
+                return DefinitionResult(error=f"'{word}' so‘zi topilmadi (404)."), _NEGATIVE
+            if response.status >= 400:
+                log.error(f"HTTP error for '{word}': {response.status}")
+                return DefinitionResult(error=f"Server bilan bog'lanishda xatolik (HTTP {response.status})."), _TRANSIENT
+            try:
+                res = await response.json(content_type=None)
+            except (json.JSONDecodeError, aiohttp.ContentTypeError):
+                text = await response.text()
+                log.error(f"API JSON decode error for '{word}'. Status: {response.status}. Response text: {text[:200]}...")
+                return DefinitionResult(error="API dan noto‘g‘ri JSON javob keldi."), _TRANSIENT
+        return _parse_response(res, word, max_definitions)
+
+    except asyncio.TimeoutError:
+        log.error(f"API request timed out for '{word}'")
+        return DefinitionResult(error="API javob qaytarish vaqti tugadi."), _TRANSIENT
+    except aiohttp.ClientError as e:
+        log.error(f"API request error for '{word}': {e}")
+        return DefinitionResult(error=f"Tarmoq xatoligi: API ga ulanib bo'lmadi."), _TRANSIENT
+    except Exception as e:
+        log.exception(f"An unexpected error occurred in get_definitions_async for '{word}': {e}") # Log traceback
+        return DefinitionResult(error=f"Kutilmagan ichki xatolik yuz berdi."), _TRANSIENT
+
+
+def _fetch_definitions(word, max_definitions):
+    """
+    Performs the API request for an already normalized word with requests.
+
+    Returns:
+        tuple[DefinitionResult, str]: The result and its kind (_OK, _NEGATIVE or _TRANSIENT).
+    """
+    url = API_URL.format(word=word)
+    log.info(f"Requesting definition for '{word}' from {url}")
+
+    try:
+        response = _session.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
 
         try:
             res = response.json()
         except json.JSONDecodeError:
             log.error(f"API JSON decode error for '{word}'. Status: {response.status_code}. Response text: {response.text[:200]}...")
-            return json.dumps({"error": "API dan noto‘g‘ri JSON javob keldi."}, ensure_ascii=False, indent=4)
-
-        # --- Process successful response (expected: list of entries) ---
-        if isinstance(res, list) and res:
-            word_data = res[0]  # API often returns a list, take the first entry
-            phonetics = word_data.get("phonetics", [])
-            audio_url = None
-            phonetic_text = None
-
-            # Find best phonetic text and audio URL
-            # Prioritize audio with .mp3 extension and text availability
-            best_phonetic = {}
-            for phonetic in phonetics:
-                has_text = bool(phonetic.get("text"))
-                has_audio = bool(phonetic.get("audio"))
-                is_mp3 = has_audio and phonetic['audio'].endswith('.mp3')
-
-                # Simple priority: text + mp3 > text + any audio > text only > mp3 only > any audio > fallback
-                current_score = (has_text * 4) + (is_mp3 * 2) + (has_audio * 1)
-
-                if not best_phonetic or current_score > best_phonetic['score']:
-                     best_phonetic = {
-                         'score': current_score,
-                         'text': phonetic.get("text"),
-                         'audio': phonetic.get("audio") if has_audio else None
-                     }
-                # Early exit if we found text + mp3
-                if has_text and is_mp3:
-                    break
-
-            phonetic_text = best_phonetic.get('text')
-            audio_url = best_phonetic.get('audio')
-
-            # Collect definitions up to the limit
-            definitions = []
-            meanings = word_data.get("meanings", [])
-            definitions_count = 0
-            stop_outer = False
-            for meaning in meanings:
-                if stop_outer: break
-                part_of_speech = meaning.get("partOfSpeech", "") # Get part of speech
-                # Optionally add part of speech to output: definitions.append(f"*({part_of_speech})*")
-
-                for definition_item in meaning.get("definitions", []):
-                    if definitions_count < max_definitions:
-                        definition_text = definition_item.get('definition')
-                        if definition_text: # Ensure definition text exists
-                            definitions.append(f"👉 {definition_text}")
-                            definitions_count += 1
-                    else:
-                        stop_outer = True # Signal to break outer loop
-                        break # Break inner loop
-
-            result = {
-                "phonetic": phonetic_text if phonetic_text else "Mavjud emas",
-                "audio": audio_url,  # Remains None if no suitable audio found
-                "definitions": definitions if definitions else ["Ta'riflar topilmadi."]
-            }
-            log.info(f"Successfully found definition data for '{word}'.")
-            return json.dumps(result, ensure_ascii=False, indent=4)
-
-        # --- Handle API error response (expected: dict with 'title') ---
-        elif isinstance(res, dict) and res.get("title"):
-            error_message = res.get("message", "Aniqlanmagan xato.")
-            log.warning(f"API returned error for '{word}': Title: {res.get('title')}, Message: {error_message}")
-            # Use title if informative, otherwise provide generic message
-            if res.get("title") == "No Definitions Found":
-                 return json.dumps({"error": f"'{word}' uchun ta'rif topilmadi."}, ensure_ascii=False, indent=4)
-            else:
-                 return json.dumps({"error": f"API xatosi: {res.get('title')}"}, ensure_ascii=False, indent=4)
-
-        # --- Handle unexpected response format ---
-        else:
-            log.warning(f"Unexpected API response format for '{word}'. Type: {type(res)}, Response: {str(res)[:200]}...")
-            return json.dumps({"error": "API dan kutilmagan javob formati."}, ensure_ascii=False, indent=4)
+            return DefinitionResult(error="API dan noto‘g‘ri JSON javob keldi."), _TRANSIENT
+        return _parse_response(res, word, max_definitions)
 
     # --- Handle Network/Request Errors ---
     except requests.exceptions.Timeout:
         log.error(f"API request timed out for '{word}'")
-        return json.dumps({"error": "API javob qaytarish vaqti tugadi."}, ensure_ascii=False, indent=4)
+        return DefinitionResult(error="API javob qaytarish vaqti tugadi."), _TRANSIENT
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 404:
             log.warning(f"Word '{word}' not found (404).")
-            return json.dumps({"error": f"'{word}' so‘zi topilmadi (404)."}, ensure_ascii=False, indent=4)
+            return DefinitionResult(error=f"'{word}' so‘zi topilmadi (404)."), _NEGATIVE
         else:
             log.error(f"HTTP error for '{word}': {e}")
-            return json.dumps({"error": f"Server bilan bog'lanishda xatolik (HTTP {e.response.status_code})."}, ensure_ascii=False, indent=4)
+            return DefinitionResult(error=f"Server bilan bog'lanishda xatolik (HTTP {e.response.status_code})."), _TRANSIENT
     except requests.exceptions.RequestException as e:
         log.error(f"API request error for '{word}': {e}")
-        return json.dumps({"error": f"Tarmoq xatoligi: API ga ulanib bo'lmadi."}, ensure_ascii=False, indent=4)
+        return DefinitionResult(error=f"Tarmoq xatoligi: API ga ulanib bo'lmadi."), _TRANSIENT
     except Exception as e:
         # Catch any other unexpected errors during processing
         log.exception(f"An unexpected error occurred in get_definitions for '{word}': {e}") # Log traceback
-        return json.dumps({"error": f"Kutilmagan ichki xatolik yuz berdi."}, ensure_ascii=False, indent=4)
+        return DefinitionResult(error=f"Kutilmagan ichki xatolik yuz berdi."), _TRANSIENT
+
+
+def _parse_response(res, word, max_definitions):
+    """
+    Turns a decoded dictionaryapi.dev response into a DefinitionResult.
+
+    Returns:
+        tuple[DefinitionResult, str]: The result and its kind (_OK, _NEGATIVE or _TRANSIENT).
+    """
+    # --- Process successful response (expected: list of entries) ---
+    if isinstance(res, list) and res:
+        word_data = res[0]  # API often returns a list, take the first entry
+        phonetics = word_data.get("phonetics", [])
+        audio_url = None
+        phonetic_text = None
+
+        # Find best phonetic text and audio URL
+        # Prioritize audio with .mp3 extension and text availability
+        best_phonetic = {}
+        for phonetic in phonetics:
+            has_text = bool(phonetic.get("text"))
+            has_audio = bool(phonetic.get("audio"))
+            is_mp3 = has_audio and phonetic['audio'].endswith('.mp3')
+
+            # Simple priority: text + mp3 > text + any audio > text only > mp3 only > any audio > fallback
+            current_score = (has_text * 4) + (is_mp3 * 2) + (has_audio * 1)
+
+            if not best_phonetic or current_score > best_phonetic['score']:
+                 best_phonetic = {
+                     'score': current_score,
+                     'text': phonetic.get("text"),
+                     'audio': phonetic.get("audio") if has_audio else None
+                 }
+            # Early exit if we found text + mp3
+            if has_text and is_mp3:
+                break
+
+        phonetic_text = best_phonetic.get('text')
+        audio_url = best_phonetic.get('audio')
+
+        # Collect definitions up to the limit
+        definitions = []
+        meanings = word_data.get("meanings", [])
+        definitions_count = 0
+        stop_outer = False
+        for meaning in meanings:
+            if stop_outer: break
+            part_of_speech = meaning.get("partOfSpeech", "") # Get part of speech
+            # Optionally add part of speech to output: definitions.append(f"*({part_of_speech})*")
+
+            for definition_item in meaning.get("definitions", []):
+                if definitions_count < max_definitions:
+                    definition_text = definition_item.get('definition')
+                    if definition_text: # Ensure definition text exists
+                        definitions.append(f"👉 {definition_text}")
+                        definitions_count += 1
+                else:
+                    stop_outer = True # Signal to break outer loop
+                    break # Break inner loop
+
+        result = DefinitionResult(
+            phonetic=phonetic_text if phonetic_text else "Mavjud emas",
+            audio=audio_url,  # Remains None if no suitable audio found
+            definitions=definitions if definitions else ["Ta'riflar topilmadi."]
+        )
+        log.info(f"Successfully found definition data for '{word}'.")
+        return result, _OK
+
+    # --- Handle API error response (expected: dict with 'title') ---
+    elif isinstance(res, dict) and res.get("title"):
+        error_message = res.get("message", "Aniqlanmagan xato.")
+        log.warning(f"API returned error for '{word}': Title: {res.get('title')}, Message: {error_message}")
+        # Use title if informative, otherwise provide generic message
+        if res.get("title") == "No Definitions Found":
+             return DefinitionResult(error=f"'{word}' uchun ta'rif topilmadi."), _NEGATIVE
+        else:
+             return DefinitionResult(error=f"API xatosi: {res.get('title')}"), _TRANSIENT
+
+    # --- Handle unexpected response format ---
+    else:
+        log.warning(f"Unexpected API response format for '{word}'. Type: {type(res)}, Response: {str(res)[:200]}...")
+        return DefinitionResult(error="API dan kutilmagan javob formati."), _TRANSIENT
 
 
 if __name__ == '__main__':
@@ -148,4 +502,13 @@ if __name__ == '__main__':
     print(f"\n--- Testing 'example' with max_definitions=0 ---")
     definitions_json = get_definitions('example', 0)
     print(definitions_json)
-    print("-" * 20)
\ No newline at end of file
+    print("-" * 20)
+
+    # Async variant over the pooled client
+    async def _test_async():
+        for word_to_test in ['hello', 'thisshouldnotexistxyz']:
+            print(f"\n--- Testing async '{word_to_test}' ---")
+            print(await get_definitions_async(word_to_test, 3))
+        await close_http()
+
+    asyncio.run(_test_async())
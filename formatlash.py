@@ -0,0 +1,42 @@
+# formatlash.py
+import html
+import re
+
+# Telegram's HTML mode only needs &, < and > escaped; quotes matter inside attributes only
+_TAG = re.compile(r"</?[a-z]+(?:\s[^>]*)?>", re.IGNORECASE)
+
+
+def escape(text):
+    """
+    Escapes arbitrary text (translations, definitions, user names) for parse_mode=HTML.
+
+    Unlike legacy Markdown, escaped HTML can never fail to parse, so the
+    result is sent in a single request whatever characters the text holds.
+    """
+    return html.escape(str(text), quote=False)
+
+
+def bold(text):
+    return f"<b>{escape(text)}</b>"
+
+
+def italic(text):
+    return f"<i>{escape(text)}</i>"
+
+
+def code(text):
+    return f"<code>{escape(text)}</code>"
+
+
+def link(text, url):
+    return f'<a href="{html.escape(str(url), quote=True)}">{escape(text)}</a>'
+
+
+def strip_tags(rendered):
+    """
+    Removes the tags from rendered HTML, keeping its escaped text.
+
+    The result is still valid in HTML mode, so it can be resent as-is
+    with no formatting if Telegram ever rejects the original.
+    """
+    return _TAG.sub("", rendered)
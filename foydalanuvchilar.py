@@ -0,0 +1,138 @@
+# foydalanuvchilar.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class UserStore:
+    """
+    Set of bot user IDs stored in SQLite (WAL mode).
+
+    New IDs are buffered and written in batches; the total is kept as an
+    in-memory counter so count() is O(1); iter_ids() streams IDs in pages so
+    broadcasts never load the whole table.
+    """
+
+    def __init__(self, db_path="foydalanuvchilar.sqlite3", batch_size=100):
+        """
+        Args:
+            db_path (str): SQLite file.
+            batch_size (int): Buffered new IDs that trigger a write.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, added REAL NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> added timestamp, not yet written
+        (self._count,) = self._db.execute("SELECT COUNT(*) FROM users").fetchone()
+
+    def __len__(self):
+        return self.count()
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return user_id in self._pending or self._exists(user_id)
+
+    def count(self):
+        """Returns the number of distinct users (including unflushed ones)."""
+        return self._count
+
+    def add(self, user_id):
+        """
+        Adds a user ID.
+
+        Returns:
+            bool: True if the ID was new.
+        """
+        with self._lock:
+            if user_id in self._pending or self._exists(user_id):
+                return False
+            self._pending[user_id] = time.time()
+            self._count += 1
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            return True
+
+    def flush(self):
+        """Writes buffered IDs to disk."""
+        with self._lock:
+            self._flush()
+
+    def iter_ids(self, page_size=5000):
+        """
+        Yields every user ID in ascending order, one page of rows at a time.
+
+        Pending IDs are flushed first so they are included.
+        """
+        self.flush()
+        last_id = None
+        while True:
+            with self._lock:
+                if last_id is None:
+                    rows = self._db.execute("SELECT user_id FROM users ORDER BY user_id LIMIT ?", (page_size,)).fetchall()
+                else:
+                    rows = self._db.execute("SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                                            (last_id, page_size)).fetchall()
+            if not rows:
+                return
+            for (user_id,) in rows:
+                yield user_id
+            last_id = rows[-1][0]
+
+    def import_text_file(self, path):
+        """
+        Imports IDs from the legacy one-ID-per-line text file, skipping
+        duplicates and malformed lines.
+
+        Returns:
+            int: Number of new IDs imported.
+        """
+        with open(path, "r") as f:
+            ids = {int(line.strip()) for line in f if line.strip().isdigit()}
+        now = time.time()
+        with self._lock:
+            self._flush()
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO users (user_id, added) VALUES (?, ?)",
+                                 ((user_id, now) for user_id in ids))
+            self._db.commit()
+            imported = self._db.total_changes - before
+            self._count += imported
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+    # --- Internal helpers (caller holds the lock) ---
+
+    def _exists(self, user_id):
+        return self._db.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def _flush(self):
+        if not self._pending:
+            return
+        try:
+            self._db.executemany("INSERT OR IGNORE INTO users (user_id, added) VALUES (?, ?)", self._pending.items())
+            self._db.commit()
+            self._pending.clear()
+        except sqlite3.Error as e:
+            log.error(f"Could not write {len(self._pending)} new user IDs to {self.db_path}: {e}")
+
+
+def migrate_text_file(store, path):
+    """Imports the legacy text file into an empty store, if the file exists."""
+    if store.count() or not os.path.exists(path):
+        return 0
+    imported = store.import_text_file(path)
+    log.info(f"{imported} unique user IDs migrated from {path} to {store.db_path}")
+    return imported
@@ -0,0 +1,226 @@
+# fsm_storage.py
+import asyncio
+import copy
+import json
+import logging
+import sqlite3
+import typing
+
+from aiogram.dispatcher.storage import BaseStorage
+
+log = logging.getLogger(__name__)
+
+_EMPTY = {"state": None, "data": {}, "bucket": {}}
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Persistent FSM storage: an in-memory dict backed by SQLite.
+
+    Every state, data and bucket is loaded into memory at startup, so reads
+    cost the same as MemoryStorage. Changes are marked dirty and written in
+    one batch `flush_interval` seconds later (and on close), so a restart
+    keeps admins in the middle of a dialog where they were.
+    """
+
+    def __init__(self, db_path="fsm_holatlari.sqlite3", flush_interval=0.5):
+        """
+        Args:
+            db_path (str): SQLite file.
+            flush_interval (float): Delay before dirty records are written.
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " chat TEXT NOT NULL,"
+            " user TEXT NOT NULL,"
+            " state TEXT,"
+            " data TEXT NOT NULL,"
+            " bucket TEXT NOT NULL,"
+            " PRIMARY KEY (chat, user))"
+        )
+        self._db.commit()
+        self.data = {}  # (chat, user) -> {"state", "data", "bucket"}
+        for chat, user, state, data, bucket in self._db.execute("SELECT chat, user, state, data, bucket FROM fsm"):
+            self.data[(chat, user)] = {"state": state, "data": json.loads(data), "bucket": json.loads(bucket)}
+        self._dirty = set()
+        self._flush_handle = None
+        log.info(f"FSM storage loaded {len(self.data)} records from {db_path}")
+
+    def _key(self, chat, user):
+        chat, user = self.check_address(chat=chat, user=user)
+        return str(chat), str(user)
+
+    def _peek(self, chat, user):
+        # Read path: never creates a record for users without state
+        return self.data.get(self._key(chat, user), _EMPTY)
+
+    def _record(self, chat, user):
+        key = self._key(chat, user)
+        record = self.data.get(key)
+        if record is None:
+            record = self.data[key] = {"state": None, "data": {}, "bucket": {}}
+        return key, record
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+        if self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+                return
+            self._flush_handle = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        """Writes all dirty records to SQLite in one transaction."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for key in dirty:
+            record = self.data.get(key)
+            if record is None or (record["state"] is None and not record["data"] and not record["bucket"]):
+                self.data.pop(key, None)
+                deletes.append(key)
+            else:
+                upserts.append(key + (record["state"], json.dumps(record["data"], ensure_ascii=False),
+                                      json.dumps(record["bucket"], ensure_ascii=False)))
+        try:
+            with self._db:
+                if deletes:
+                    self._db.executemany("DELETE FROM fsm WHERE chat = ? AND user = ?", deletes)
+                if upserts:
+                    self._db.executemany("INSERT OR REPLACE INTO fsm (chat, user, state, data, bucket) VALUES (?, ?, ?, ?, ?)",
+                                         upserts)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            log.error(f"FSM storage flush failed for {len(dirty)} records: {e}")
+            self._dirty |= dirty
+
+    async def close(self):
+        self.flush()
+        self._db.close()
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        record = self._peek(chat, user)
+        return record["state"] if record["state"] is not None else self.resolve_state(default)
+
+    async def get_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[typing.Dict] = None) -> typing.Dict:
+        return copy.deepcopy(self._peek(chat, user)["data"])
+
+    async def update_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        if data is None:
+            data = {}
+        key, record = self._record(chat, user)
+        record["data"].update(data, **kwargs)
+        self._mark_dirty(key)
+
+    async def set_state(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        key, record = self._record(chat, user)
+        record["state"] = self.resolve_state(state)
+        self._mark_dirty(key)
+
+    async def set_data(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key, record = self._record(chat, user)
+        record["data"] = copy.deepcopy(data) if data else {}
+        self._mark_dirty(key)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        return copy.deepcopy(self._peek(chat, user)["bucket"])
+
+    async def set_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key, record = self._record(chat, user)
+        record["bucket"] = copy.deepcopy(bucket) if bucket else {}
+        self._mark_dirty(key)
+
+    async def update_bucket(self, *, chat: typing.Union[str, int, None] = None, user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        if bucket is None:
+            bucket = {}
+        key, record = self._record(chat, user)
+        record["bucket"].update(bucket, **kwargs)
+        self._mark_dirty(key)
+
+
+if __name__ == '__main__':
+    # Micro-benchmark: get/set throughput against MemoryStorage
+    import argparse
+    import os
+    import tempfile
+    import time
+
+    from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+    parser = argparse.ArgumentParser(description="FSM storage micro-benchmark")
+    parser.add_argument("--ops", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    async def bench(storage):
+        results = {}
+        users = [(1000 + i, 1000 + i) for i in range(args.users)]
+
+        start = time.perf_counter()
+        for i in range(args.ops):
+            chat, user = users[i % len(users)]
+            await storage.set_state(chat=chat, user=user, state=f"AdminStates:{i % 2}")
+        results["set_state"] = args.ops / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(args.ops):
+            chat, user = users[i % len(users)]
+            await storage.get_state(chat=chat, user=user)
+        results["get_state"] = args.ops / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(args.ops):
+            chat, user = users[i % len(users)]
+            await storage.update_data(chat=chat, user=user, data={"n": i})
+        results["update_data"] = args.ops / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(args.ops):
+            chat, user = users[i % len(users)]
+            await storage.get_data(chat=chat, user=user)
+        results["get_data"] = args.ops / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await storage.close()
+        await storage.wait_closed()
+        results["close (final flush)"] = time.perf_counter() - start
+        return results
+
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp:
+            memory = await bench(MemoryStorage())
+            sqlite = await bench(SQLiteStorage(os.path.join(tmp, "fsm.sqlite3")))
+            reopened = SQLiteStorage(os.path.join(tmp, "fsm.sqlite3"))
+            print(f"{'operation':20} {'MemoryStorage':>15} {'SQLiteStorage':>15}")
+            for op in memory:
+                if op.startswith("close"):
+                    print(f"{op:20} {memory[op]:>15.4f} {sqlite[op]:>15.4f}  s")
+                else:
+                    print(f"{op:20} {memory[op]:>15,.0f} {sqlite[op]:>15,.0f}  ops/s")
+            print(f"records persisted:   {len(reopened.data)}")
+
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+# isitish.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from cheklov import TokenBucket
+
+log = logging.getLogger(__name__)
+
+
+class QueryLog:
+    """
+    Query-frequency log of normalized queries, stored in SQLite (WAL mode).
+
+    Hits are counted in memory and added to the table in batches. The table
+    is pruned to the `max_entries` most frequent keys, so the file stays
+    small however long the bot runs. `top(n)` names the queries worth
+    keeping warm across restarts.
+    """
+
+    def __init__(self, db_path="sorovlar.sqlite3", max_entries=20000, batch_size=200):
+        """
+        Args:
+            db_path (str): SQLite file.
+            max_entries (int): Keys kept after pruning (least frequent are dropped).
+            batch_size (int): Buffered hits that trigger a write.
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS queries "
+                         "(key TEXT PRIMARY KEY, hits INTEGER NOT NULL, last_seen REAL NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._pending = Counter()  # key -> hits not yet written
+        self.recorded = 0
+
+    def record(self, key):
+        """Counts one query for `key` (e.g. a translation cache key)."""
+        with self._lock:
+            self._pending[key] += 1
+            self.recorded += 1
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        """Writes buffered hits to disk."""
+        with self._lock:
+            self._flush()
+
+    def top(self, n):
+        """
+        Returns the `n` most frequent keys, most frequent first (recently seen first on ties).
+        """
+        with self._lock:
+            self._flush()
+            rows = self._db.execute("SELECT key FROM queries ORDER BY hits DESC, last_seen DESC LIMIT ?",
+                                    (n,)).fetchall()
+        return [key for (key,) in rows]
+
+    def stats(self):
+        with self._lock:
+            (size,) = self._db.execute("SELECT COUNT(*) FROM queries").fetchone()
+            return {"size": size, "pending": len(self._pending), "recorded": self.recorded}
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+    # --- Internal helpers (caller holds the lock) ---
+
+    def _flush(self):
+        if not self._pending:
+            return
+        now = time.time()
+        try:
+            self._db.executemany(
+                "INSERT INTO queries (key, hits, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET hits = hits + excluded.hits, last_seen = excluded.last_seen",
+                ((key, hits, now) for key, hits in self._pending.items()))
+            (size,) = self._db.execute("SELECT COUNT(*) FROM queries").fetchone()
+            if size > self.max_entries * 1.1:  # Prune in steps, not on every write
+                self._db.execute("DELETE FROM queries WHERE key NOT IN "
+                                 "(SELECT key FROM queries ORDER BY hits DESC, last_seen DESC LIMIT ?)",
+                                 (self.max_entries,))
+            self._db.commit()
+            self._pending.clear()
+        except sqlite3.Error as e:
+            log.error(f"Could not write {len(self._pending)} query counts to {self.db_path}: {e}")
+
+
+def save_snapshot(path, sections):
+    """
+    Writes cache entries as JSON, atomically (a crash never leaves a half-written file).
+
+    Args:
+        path (str): Snapshot file.
+        sections (dict): Section name -> {key: JSON-serializable value}.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"saved": time.time(), "sections": sections}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    log.info(f"Cache snapshot saved to {path}: " + ", ".join(f"{name} {len(entries)}" for name, entries in sections.items()))
+
+
+def load_snapshot(path, max_age=None):
+    """
+    Reads a snapshot written by save_snapshot.
+
+    Args:
+        path (str): Snapshot file.
+        max_age (float | None): Snapshots older than this many seconds are ignored.
+
+    Returns:
+        dict: Section name -> {key: value}; empty if the file is missing, stale or unreadable.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read cache snapshot {path}: {e}")
+        return {}
+    if max_age is not None and time.time() - data.get("saved", 0) > max_age:
+        log.info(f"Cache snapshot {path} is older than {max_age} s, ignoring it")
+        return {}
+    return data.get("sections", {})
+
+
+async def prefetch(keys, fetch, rate=5.0, deadline=60.0):
+    """
+    Warms caches by calling `await fetch(key)` for each key, one at a time.
+
+    Calls are spaced to at most `rate` per second, so warming never bursts
+    against upstream quotas; keys left when `deadline` seconds have passed
+    are skipped. A failing key is logged and does not stop the rest.
+
+    Returns:
+        dict: Counts of fetched, failed and skipped keys.
+    """
+    bucket = TokenBucket(rate, 1)
+    started = time.monotonic()
+    fetched = failed = 0
+    keys = list(keys)
+    for i, key in enumerate(keys):
+        if time.monotonic() - started >= deadline:
+            log.info(f"Prefetch deadline of {deadline} s reached, {len(keys) - i} keys skipped")
+            return {"fetched": fetched, "failed": failed, "skipped": len(keys) - i}
+        await bucket.acquire()
+        try:
+            await fetch(key)
+            fetched += 1
+        except Exception as e:
+            failed += 1
+            log.warning(f"Prefetch of '{key}' failed: {e}")
+    return {"fetched": fetched, "failed": failed, "skipped": 0}
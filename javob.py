@@ -0,0 +1,184 @@
+# javob.py
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+from collections import Counter
+
+from aiogram import Bot, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils.exceptions import RetryAfter
+
+import metrika
+
+log = logging.getLogger(__name__)
+
+VOICE_CAPTION_LIMIT = 1024  # Telegram limit for media captions
+CHAT_ACTION_REFRESH = 4.5  # Telegram shows a chat action for about 5 seconds
+
+# Methods that deliver a message and count against Telegram's flood limits
+SEND_METHODS = frozenset({
+    "sendMessage", "sendPhoto", "sendAudio", "sendDocument", "sendVideo", "sendAnimation", "sendVoice",
+    "sendVideoNote", "sendMediaGroup", "sendLocation", "sendVenue", "sendContact", "sendPoll", "sendDice",
+    "sendSticker", "copyMessage", "forwardMessage", "editMessageText", "editMessageCaption", "editMessageMedia",
+})
+
+# Mutable holder so tasks spawned while handling an update count towards the same update
+_update_calls = contextvars.ContextVar("update_calls", default=None)
+
+
+class TrackingBot(Bot):
+    """
+    Bot that counts outgoing API calls per update, routes message sends
+    through a send scheduler and remembers the last reply keyboard sent to
+    each chat.
+
+    With a scheduler, every send (including `message.answer`) waits for its
+    flood-limit slot, and a RetryAfter pauses all sends and is retried up to
+    `max_retries` times before it reaches the caller.
+
+    The keyboard record lets handlers skip re-sending a keyboard the user
+    already has (see `keyboard_if_changed`), whichever handler sent it.
+    """
+
+    def __init__(self, *args, send_scheduler=None, max_retries=3, **kwargs):
+        """
+        Args:
+            send_scheduler (cheklov.SendScheduler): Flood-limit scheduler for message sends, or None.
+            max_retries (int): Retries after RetryAfter before the error is raised.
+        """
+        super().__init__(*args, **kwargs)
+        self.send_scheduler = send_scheduler
+        self.max_retries = max_retries
+        self.retry_after_errors = 0
+        self._keyboards = {}  # chat_id -> id of the last reply keyboard (0 after removal)
+        self._markup_ids = {}  # canonical markup JSON -> small id, so each chat costs one int
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        counter = _update_calls.get()
+        if counter is not None:
+            counter[0] += 1
+        chat_id = data.get("chat_id") if data else None
+        if self.send_scheduler is None or method not in SEND_METHODS or chat_id is None:
+            with metrika.track(f"telegram.{method}"):
+                result = await super().request(method, data, files, **kwargs)
+        else:
+            result = await self._scheduled_request(chat_id, method, data, files, **kwargs)
+        if data and data.get("reply_markup") and data.get("chat_id") is not None:
+            self._track_keyboard(data["chat_id"], data["reply_markup"])
+        return result
+
+    async def _scheduled_request(self, chat_id, method, data, files, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            await self.send_scheduler.acquire(chat_id)
+            try:
+                with metrika.track(f"telegram.{method}"):
+                    return await super().request(method, data, files, **kwargs)
+            except RetryAfter as e:
+                self.retry_after_errors += 1
+                self.send_scheduler.pause(e.timeout)
+                log.warning(f"Flood control on {method} to {chat_id}: pausing sends for {e.timeout} s "
+                            f"(attempt {attempt + 1}/{self.max_retries + 1})")
+                if attempt == self.max_retries:
+                    raise
+
+    def _track_keyboard(self, chat_id, markup):
+        if isinstance(markup, str):
+            try:
+                markup = json.loads(markup)
+            except ValueError:
+                return
+        elif hasattr(markup, "to_python"):
+            markup = markup.to_python()
+        if not isinstance(markup, dict):
+            return
+        # Inline keyboards belong to a single message and do not replace the reply keyboard
+        if "keyboard" in markup:
+            self._keyboards[str(chat_id)] = self._markup_id(markup)
+        elif markup.get("remove_keyboard"):
+            self._keyboards[str(chat_id)] = 0
+
+    def _markup_id(self, markup):
+        key = json.dumps(markup, sort_keys=True, ensure_ascii=False)
+        return self._markup_ids.setdefault(key, len(self._markup_ids) + 1)
+
+    def keyboard_if_changed(self, chat_id, keyboard):
+        """
+        Returns `keyboard` if the chat does not already show it, otherwise None.
+
+        Args:
+            chat_id (int | str): Target chat.
+            keyboard (ReplyKeyboardMarkup): The keyboard the chat should show.
+        """
+        if self._keyboards.get(str(chat_id)) == self._markup_id(keyboard.to_python()):
+            return None
+        return keyboard
+
+    def forget_keyboard(self, chat_id):
+        self._keyboards.pop(str(chat_id), None)
+
+
+class ApiCallMetrics(BaseMiddleware):
+    """Records how many Bot API calls each update caused, per update type."""
+
+    def __init__(self, target=2):
+        """
+        Args:
+            target (int): Calls per update considered acceptable; the share of updates within it is reported.
+        """
+        super().__init__()
+        self.target = target
+        self.histograms = {}  # update type -> Counter(calls -> updates)
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        data["_api_calls"] = [0]
+        data["_api_calls_token"] = _update_calls.set(data["_api_calls"])
+
+    async def on_post_process_update(self, update: types.Update, result, data: dict):
+        counter = data.pop("_api_calls", None)
+        token = data.pop("_api_calls_token", None)
+        if token is not None:
+            _update_calls.reset(token)
+        if counter is None:
+            return
+        kind = next((name for name in update.to_python() if name != "update_id"), "unknown")
+        self.histograms.setdefault(kind, Counter())[counter[0]] += 1
+
+    def stats(self):
+        result = {}
+        for kind, histogram in self.histograms.items():
+            updates = sum(histogram.values())
+            calls = sum(n * count for n, count in histogram.items())
+            result[kind] = {
+                "updates": updates,
+                "avg_calls": calls / updates if updates else 0.0,
+                "max_calls": max(histogram) if histogram else 0,
+                "within_target": sum(count for n, count in histogram.items() if n <= self.target) / updates if updates else 1.0,
+            }
+        return result
+
+
+@contextlib.asynccontextmanager
+async def chat_action_after(bot, chat_id, delay=0.5, action=types.ChatActions.TYPING):
+    """
+    Shows a chat action only if the wrapped block takes longer than `delay`.
+
+    Fast (cached) answers cost no extra API call; slow ones show "typing..."
+    until the block finishes, refreshed before Telegram hides it.
+    """
+    async def show():
+        await asyncio.sleep(delay)
+        while True:
+            try:
+                await bot.send_chat_action(chat_id, action)
+            except Exception as e:
+                log.debug(f"Chat action failed for {chat_id}: {e}")
+                return
+            await asyncio.sleep(CHAT_ACTION_REFRESH)
+
+    task = asyncio.create_task(show())
+    try:
+        yield
+    finally:
+        task.cancel()
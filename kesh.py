@@ -0,0 +1,425 @@
+# kesh.py
+import asyncio
+import bisect
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize_text(text):
+    """
+    Normalizes free text for use in cache keys: trims, case-folds and
+    collapses internal whitespace so "Hello ", "hello" and "HELLO" share a key.
+    """
+    return " ".join(str(text).casefold().split())
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and an optional SQLite tier.
+
+    The memory tier holds at most `max_size` entries and evicts the least
+    recently used one when full. If `db_path` is given, every `set` is also
+    written to SQLite so entries survive restarts; memory misses fall through
+    to disk and disk hits are promoted back into memory. Values stored on
+    disk must be JSON-serializable.
+
+    Disk writes and access times are buffered and committed together once
+    `batch_size` are pending or `flush_interval` seconds have passed, so a
+    lookup or `set` on the event loop never waits for a commit.
+    """
+
+    def __init__(self, max_size=10000, ttl=24 * 3600, db_path=None, disk_max_size=None, name="kesh",
+                 batch_size=200, flush_interval=5.0):
+        """
+        Args:
+            max_size (int): Maximum number of entries kept in memory.
+            ttl (float): Default time-to-live in seconds.
+            db_path (str | None): SQLite file for the persistent tier, or None.
+            disk_max_size (int | None): Maximum rows kept on disk (defaults to 20 * max_size).
+            name (str): Name used in logs and stats.
+            batch_size (int): Buffered disk writes that trigger a commit.
+            flush_interval (float): Maximum seconds a buffered write waits for its commit.
+        """
+        self.name = name
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self.disk_max_size = int(disk_max_size) if disk_max_size else self.max_size * 20
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        self._pending_writes = {}  # key -> (value_json, expires_at), not yet on disk
+        self._pending_access = {}  # key -> last disk hit time, not yet on disk
+        self._last_flush = time.monotonic()
+        self._disk_writes = 0
+        self._unpruned_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS kesh ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " expires REAL NOT NULL,"
+                    " accessed REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS kesh_accessed ON kesh(accessed)")
+                self._db.execute("DELETE FROM kesh WHERE expires < ?", (time.time(),))
+                self._db.commit()
+                log.info(f"Cache '{name}': disk tier opened at {db_path}")
+            except sqlite3.Error as e:
+                log.error(f"Cache '{name}': could not open disk tier {db_path}: {e}. Running memory-only.")
+                self._db = None
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key`, or `default` on a miss or expiry."""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                value = self._disk_get(key, now)
+                if value is not _MISSING:
+                    self.disk_hits += 1
+                    self._maybe_flush()
+                    return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Stores `value` under `key` for `ttl` seconds (the cache default if None)."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._memory_set(key, value, expires_at)
+            if self._db is not None:
+                self._disk_set(key, value, expires_at)
+                self._maybe_flush()
+
+    def flush(self):
+        """Commits buffered disk writes and access times."""
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+
+    def delete(self, key):
+        """Removes `key` from both tiers."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._pending_writes.pop(key, None)
+            self._pending_access.pop(key, None)
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM kesh WHERE key = ?", (key,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    log.warning(f"Cache '{self.name}': disk delete failed for '{key}': {e}")
+
+    def clear(self):
+        """Drops every entry from both tiers."""
+        with self._lock:
+            self._data.clear()
+            self._pending_writes.clear()
+            self._pending_access.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM kesh")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    log.warning(f"Cache '{self.name}': disk clear failed: {e}")
+
+    def stats(self):
+        """Returns a dict with size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "disk_pending": len(self._pending_writes) + len(self._pending_access),
+            }
+
+    def close(self):
+        """Commits buffered writes and closes the disk tier, if any."""
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                try:
+                    self._db.close()
+                except sqlite3.Error as e:
+                    log.warning(f"Cache '{self.name}': error while closing disk tier: {e}")
+                self._db = None
+
+    # --- Internal helpers (caller holds the lock) ---
+
+    def _memory_set(self, key, value, expires_at):
+        if key in self._data:
+            self._data.move_to_end(key)
+        self._data[key] = (expires_at, value)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key, now):
+        pending = self._pending_writes.get(key)
+        try:
+            if pending is not None:
+                value_json, expires_at = pending
+            else:
+                row = self._db.execute("SELECT value, expires FROM kesh WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return _MISSING
+                value_json, expires_at = row
+            if expires_at < now:
+                self.expirations += 1  # The row itself is removed by the next prune
+                return _MISSING
+            value = json.loads(value_json)
+        except (sqlite3.Error, ValueError) as e:
+            log.warning(f"Cache '{self.name}': disk read failed for '{key}': {e}")
+            return _MISSING
+        if pending is None:
+            self._pending_access[key] = now
+        self._memory_set(key, value, expires_at)
+        return value
+
+    def _disk_set(self, key, value, expires_at):
+        try:
+            self._pending_writes[key] = (json.dumps(value, ensure_ascii=False), expires_at)
+        except (TypeError, ValueError) as e:
+            log.warning(f"Cache '{self.name}': disk write failed for '{key}': {e}")
+            return
+        self._pending_access.pop(key, None)
+
+    def _maybe_flush(self):
+        if (len(self._pending_writes) + len(self._pending_access) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending_writes and not self._pending_access:
+            return
+        now = time.time()
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO kesh (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                ((key, value_json, expires_at, now) for key, (value_json, expires_at) in self._pending_writes.items()),
+            )
+            self._db.executemany(
+                "UPDATE kesh SET accessed = ? WHERE key = ?",
+                ((accessed, key) for key, accessed in self._pending_access.items()),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            log.warning(f"Cache '{self.name}': could not write {len(self._pending_writes)} entries to disk: {e}")
+            self._db.rollback()
+            return  # Kept buffered and retried on the next flush
+        self._disk_writes += len(self._pending_writes)
+        self._unpruned_writes += len(self._pending_writes)
+        self._pending_writes.clear()
+        self._pending_access.clear()
+        # Trim the disk tier periodically rather than on every flush
+        if self._unpruned_writes >= 500:
+            self._unpruned_writes = 0
+            try:
+                self._disk_prune()
+            except sqlite3.Error as e:
+                log.warning(f"Cache '{self.name}': disk prune failed: {e}")
+
+    def _disk_prune(self):
+        now = time.time()
+        self._db.execute("DELETE FROM kesh WHERE expires < ?", (now,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM kesh").fetchone()
+        overflow = count - self.disk_max_size
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM kesh WHERE key IN (SELECT key FROM kesh ORDER BY accessed LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+            log.info(f"Cache '{self.name}': pruned {overflow} least recently used rows from disk.")
+        self._db.commit()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async calls into one upstream call.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it is in flight await the same task and share its result or
+    exception. The task is shielded, so a waiter that times out or is
+    cancelled does not abort the call for the others. Nothing is kept once
+    the call finishes - pair it with a TTLCache for that.
+    """
+
+    def __init__(self, name="singleflight"):
+        """
+        Args:
+            name (str): Name used in stats.
+        """
+        self.name = name
+        self._tasks = {}  # key -> asyncio.Task
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Returns the result of `await func(*args, **kwargs)`, sharing it with
+        any concurrent call made with the same `key`.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._tasks[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter gave up
+
+    def stats(self):
+        """Returns upstream call and coalesced waiter counters."""
+        return {
+            "name": self.name,
+            "in_flight": len(self._tasks),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+class PrefixCache:
+    """
+    In-memory LRU cache with TTL that can also list entries by key prefix.
+
+    Keys are kept in a sorted list next to the LRU map, so `with_prefix`
+    is a bisect plus a short scan. Meant for small, hot result sets such as
+    inline query answers, where "hel" can be served from what "hello"
+    already produced. Used from the event loop thread only.
+    """
+
+    def __init__(self, max_size=5000, ttl=3600, name="prefiks"):
+        """
+        Args:
+            max_size (int): Maximum number of entries (least recently used are evicted).
+            ttl (float): Seconds an entry stays valid.
+            name (str): Name used in stats.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._keys = []  # Sorted keys of _data
+        self.hits = 0
+        self.misses = 0
+        self.prefix_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        if key not in self._data:
+            bisect.insort(self._keys, key)
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def with_prefix(self, prefix, limit=10):
+        """
+        Returns up to `limit` live (key, value) pairs whose key starts with `prefix`, in key order.
+        """
+        now = time.monotonic()
+        found = []
+        i = bisect.bisect_left(self._keys, prefix)
+        while i < len(self._keys) and len(found) < limit and self._keys[i].startswith(prefix):
+            key = self._keys[i]
+            value, expires_at = self._data[key]
+            if expires_at > now:
+                found.append((key, value))
+            i += 1
+        if found:
+            self.prefix_hits += 1
+        return found
+
+    def _remove(self, key):
+        del self._data[key]
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def stats(self):
+        """Returns size, hit and prefix-hit counters."""
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "prefix_hits": self.prefix_hits,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,272 @@
+# lugat_indeksi.py
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "lugat.sqlite3"
+MAX_STORED_DEFINITIONS = 20  # Per word; lookups usually ask for 5-7
+IMPORT_BATCH_SIZE = 5000
+
+
+class LocalDictionary:
+    """
+    Read-mostly English dictionary stored in SQLite.
+
+    Built once from a bulk dump with import_dump(); lookups are a single
+    primary-key query and take microseconds.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        """
+        Args:
+            db_path (str): Path to an index created by import_dump().
+        """
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA query_only=ON")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, word):
+        """
+        Looks up an already normalized (lowercase, stripped) word.
+
+        Returns:
+            dict | None: {"phonetic", "audio", "definitions"} with raw
+                definition strings, or None if the word is not indexed.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT phonetic, audio, definitions FROM entries WHERE word = ?", (word,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        phonetic, audio, definitions = row
+        return {"phonetic": phonetic, "audio": audio, "definitions": json.loads(definitions)}
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _open_dump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _parse_dictionaryapi_entry(entry):
+    # dictionaryapi.dev format: {"word", "phonetics": [{"text", "audio"}], "meanings": [{"definitions": [{"definition"}]}]}
+    phonetic = entry.get("phonetic")
+    audio = None
+    for item in entry.get("phonetics", []):
+        phonetic = phonetic or item.get("text")
+        candidate = item.get("audio")
+        if candidate and (audio is None or (candidate.endswith(".mp3") and not audio.endswith(".mp3"))):
+            audio = candidate
+    definitions = [
+        d["definition"]
+        for meaning in entry.get("meanings", [])
+        for d in meaning.get("definitions", [])
+        if d.get("definition")
+    ]
+    return phonetic, audio, definitions
+
+
+def _parse_wiktionary_entry(entry):
+    # Wiktionary (wiktextract/kaikki) format: {"word", "lang_code", "sounds": [{"ipa", "mp3_url"}], "senses": [{"glosses"}]}
+    if entry.get("lang_code", "en") != "en":
+        return None
+    phonetic = audio = None
+    for sound in entry.get("sounds", []):
+        phonetic = phonetic or sound.get("ipa")
+        audio = audio or sound.get("mp3_url")
+    definitions = [
+        gloss
+        for sense in entry.get("senses", [])
+        for gloss in sense.get("glosses", [])[:1]
+        if gloss
+    ]
+    return phonetic, audio, definitions
+
+
+def _parse_entry(entry):
+    """Returns (word, phonetic, audio, definitions) or None for unusable lines."""
+    word = entry.get("word")
+    if not isinstance(word, str) or not word.strip():
+        return None
+    if "senses" in entry:
+        parsed = _parse_wiktionary_entry(entry)
+    else:
+        parsed = _parse_dictionaryapi_entry(entry)
+    if parsed is None:
+        return None
+    return (word.strip().lower(),) + parsed
+
+
+def _parse_line(data):
+    """
+    Returns the usable entries of one dump line.
+
+    dictionaryapi.dev returns a JSON list of entries per word, so a line may
+    hold a list instead of a single entry object.
+    """
+    entries = data if isinstance(data, list) else [data]
+    return [parsed for parsed in map(_parse_entry, entries) if parsed is not None]
+
+
+def _merge(existing, new):
+    phonetic, audio, definitions = existing
+    new_phonetic, new_audio, new_definitions = new
+    merged = definitions + [d for d in new_definitions if d not in definitions]
+    return phonetic or new_phonetic, audio or new_audio, merged[:MAX_STORED_DEFINITIONS]
+
+
+def _flush(db, batch):
+    existing_rows = db.execute(
+        f"SELECT word, phonetic, audio, definitions FROM entries WHERE word IN ({','.join('?' * len(batch))})",
+        list(batch),
+    ).fetchall()
+    for word, phonetic, audio, definitions in existing_rows:
+        batch[word] = _merge((phonetic, audio, json.loads(definitions)), batch[word])
+    db.executemany(
+        "INSERT OR REPLACE INTO entries (word, phonetic, audio, definitions) VALUES (?, ?, ?, ?)",
+        [(word, p, a, json.dumps(d, ensure_ascii=False)) for word, (p, a, d) in batch.items()],
+    )
+    db.commit()
+
+
+def import_dump(dump_path, db_path=DEFAULT_DB_PATH):
+    """
+    Builds (or extends) a local index from a JSONL dictionary dump.
+
+    Each line must be one JSON entry (or, as dictionaryapi.dev returns them,
+    a list of entries) in either the dictionaryapi.dev format or the
+    Wiktionary/wiktextract format. Multiple entries for the same word are merged. `.gz` dumps are read transparently.
+
+    Args:
+        dump_path (str): Path to the JSONL (or JSONL.gz) dump.
+        db_path (str): Path of the SQLite index to write.
+
+    Returns:
+        tuple[int, int]: (lines imported, lines skipped).
+    """
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=OFF")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS entries ("
+        " word TEXT PRIMARY KEY,"
+        " phonetic TEXT,"
+        " audio TEXT,"
+        " definitions TEXT NOT NULL)"
+    )
+    imported = skipped = 0
+    batch = {}
+    with _open_dump(dump_path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries = _parse_line(json.loads(line))
+            except (ValueError, AttributeError, TypeError) as e:
+                log.warning(f"Skipping line {line_no}: {e}")
+                entries = []
+            if not entries:
+                skipped += 1
+                continue
+            for word, phonetic, audio, definitions in entries:
+                if word in batch:
+                    batch[word] = _merge(batch[word], (phonetic, audio, definitions))
+                else:
+                    batch[word] = (phonetic, audio, definitions[:MAX_STORED_DEFINITIONS])
+            imported += 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _flush(db, batch)
+                batch = {}
+                log.info(f"{imported} entries imported...")
+    if batch:
+        _flush(db, batch)
+    # Words without a single definition are useless for lookups; let the API answer them
+    db.execute("DELETE FROM entries WHERE definitions = '[]'")
+    db.commit()
+    db.execute("PRAGMA optimize")
+    db.close()
+    return imported, skipped
+
+
+def _benchmark(db_path, sample_size):
+    import random
+    import time
+
+    index = LocalDictionary(db_path)
+    db = sqlite3.connect(db_path)
+    words = [row[0] for row in db.execute("SELECT word FROM entries ORDER BY RANDOM() LIMIT ?", (sample_size,))]
+    db.close()
+    if not words:
+        print("Index is empty.")
+        return
+    # Half of the lookups miss, as real traffic would
+    queries = words + [w + "zzq" for w in words]
+    random.shuffle(queries)
+
+    timings = []
+    for word in queries:
+        start = time.perf_counter()
+        index.lookup(word)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    def pct(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1e6
+
+    print(f"entries:  {len(index)}")
+    print(f"lookups:  {len(queries)} (hit rate {index.stats()['hit_rate']:.0%})")
+    print(f"p50:      {pct(0.50):.1f} us")
+    print(f"p95:      {pct(0.95):.1f} us")
+    print(f"p99:      {pct(0.99):.1f} us")
+    print(f"mean:     {sum(timings) / len(timings) * 1e6:.1f} us")
+    index.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local offline dictionary index")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help=f"index file (default: {DEFAULT_DB_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_cmd = commands.add_parser("import", help="import a JSONL(.gz) dump")
+    import_cmd.add_argument("dump")
+    lookup_cmd = commands.add_parser("lookup", help="look up a single word")
+    lookup_cmd.add_argument("word")
+    bench_cmd = commands.add_parser("bench", help="lookup latency benchmark")
+    bench_cmd.add_argument("--words", type=int, default=5000, help="number of indexed words to sample")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        imported, skipped = import_dump(args.dump, args.db)
+        print(f"Imported {imported} entries into {args.db} ({skipped} skipped).")
+    elif not os.path.exists(args.db):
+        parser.error(f"index {args.db} does not exist; run the import command first")
+    elif args.command == "lookup":
+        print(json.dumps(LocalDictionary(args.db).lookup(args.word.strip().lower()), ensure_ascii=False, indent=4))
+    else:
+        _benchmark(args.db, args.words)
@@ -1,8 +1,9 @@
 # main.py
 import logging
-import json
 import asyncio
+import hashlib
 import os
+import re
 import traceback # Xatoliklarni batafsil loglash uchun
 
 # --- .env faylini yuklash uchun ---
@@ -10,15 +11,15 @@ from dotenv import load_dotenv
 load_dotenv() # .env faylidagi o'zgaruvchilarni os.environ ga yuklaydi
 # -----------------------------------
 
-from aiogram import Bot, Dispatcher, types
+from aiogram import Dispatcher, types
 from aiogram.utils import executor
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.types import (ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
                            InlineKeyboardMarkup, InlineKeyboardButton, ParseMode)
 from aiogram.utils.exceptions import (BotBlocked, ChatNotFound, UserDeactivated, CantParseEntities,
                                       MessageNotModified, RetryAfter, TelegramAPIError)
 from aiogram.contrib.middlewares.logging import LoggingMiddleware
 # <<< FSM uchun kerakli importlar >>>
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 # <<< FSM importlar tugadi >>>
@@ -26,7 +27,21 @@ from aiogram.dispatcher.filters.state import State, StatesGroup
 from googletrans import Translator, LANGUAGES
 
 # dictionar.py fayli shu papkada deb taxmin qilinadi
-from dictionar import get_definitions
+from dictionar import get_definitions_async
+import dictionar
+from kesh import TTLCache, PrefixCache, normalize_text
+from tarjimon import AsyncTranslator
+from til_aniqlash import detect_language
+from reklama import Broadcaster
+from cheklov import ThrottlingMiddleware, AdmissionController, SendScheduler, send_priority, BULK
+from foydalanuvchilar import UserStore, migrate_text_file
+from fsm_storage import SQLiteStorage
+from audio_kesh import AudioCache
+from isitish import QueryLog, save_snapshot, load_snapshot, prefetch
+import metrika
+from formatlash import escape, bold, italic, code, strip_tags
+from metrika import HandlerTimingMiddleware, MetricsServer
+from javob import TrackingBot, ApiCallMetrics, chat_action_after, VOICE_CAPTION_LIMIT
 
 # --- Logging sozlamalari (o'zgarishsiz) ---
 logging.basicConfig(level=logging.INFO,
@@ -37,9 +52,94 @@ log = logging.getLogger(__name__)
 # Endi bu yerda to'g'ridan-to'g'ri qiymat berilmaydi
 API_TOKEN = os.environ.get("BOT_TOKEN")
 ADMIN_IDS_STR = os.environ.get("ADMIN_IDS")
+# --- Ishga tushirish rejimi: "polling" (standart) yoki "webhook" ---
+BOT_REJIMI = os.environ.get("BOT_REJIMI", "polling").strip().lower()
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST") # Tashqi manzil, masalan: https://bot.example.com
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") # Telegram har bir so'rovda yuboradigan maxfiy token
+WEBAPP_HOST = os.environ.get("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.environ.get("WEBAPP_PORT", "8080"))
+WEBHOOK_NAVBAT_HAJMI = int(os.environ.get("WEBHOOK_NAVBAT_HAJMI", "1000")) # Qayta ishlanmagan yangilanishlar chegarasi
+WEBHOOK_ISHCHILARI = int(os.environ.get("WEBHOOK_ISHCHILARI", "32"))
+# Bot API server manzili (masalan, lokal Bot API server yoki benchmark uchun soxta server)
+BOT_API_SERVER = os.environ.get("BOT_API_SERVER")
 # --- Fayl nomlari (o'zgarishsiz) ---
-USER_FILE = "foydalanuvchi_idlar.txt"
+USER_FILE = "foydalanuvchi_idlar.txt" # Eski format: faqat bazaga bir martalik ko'chirish uchun o'qiladi
+USER_DB_FILE = os.environ.get("FOYDALANUVCHILAR_BAZASI", "foydalanuvchilar.sqlite3")
+FSM_DB_FILE = os.environ.get("FSM_BAZASI", "fsm_holatlari.sqlite3") # Admin dialog holatlari (restartdan keyin ham saqlanadi)
 CHANNEL_CONFIG_FILE = "kanal_id.txt"
+# --- Tarjima keshi sozlamalari ---
+TARJIMA_KESH_FAYLI = os.environ.get("TARJIMA_KESH_FAYLI", "tarjima_kesh.sqlite3")
+TARJIMA_KESH_HAJMI = int(os.environ.get("TARJIMA_KESH_HAJMI", "5000")) # Xotiradagi yozuvlar soni
+TARJIMA_KESH_TTL = int(os.environ.get("TARJIMA_KESH_TTL", str(7 * 24 * 3600))) # Soniyalarda (standart: 7 kun)
+# --- Ta'rif keshi sozlamalari (topilmagan so'zlar qisqaroq muddatga saqlanadi) ---
+TARIF_KESH_FAYLI = os.environ.get("TARIF_KESH_FAYLI", "tarif_kesh.sqlite3")
+TARIF_KESH_HAJMI = int(os.environ.get("TARIF_KESH_HAJMI", "5000"))
+TARIF_KESH_TTL = int(os.environ.get("TARIF_KESH_TTL", str(30 * 24 * 3600))) # Standart: 30 kun
+TARIF_KESH_NEGATIV_TTL = int(os.environ.get("TARIF_KESH_NEGATIV_TTL", str(24 * 3600))) # Standart: 1 kun
+# --- Talaffuz audio keshi: Telegram file_id lar qayta ishlatiladi, mp3 lar ixtiyoriy ravishda lokal saqlanadi ---
+AUDIO_KESH_FAYLI = os.environ.get("AUDIO_KESH_FAYLI", "audio_kesh.sqlite3")
+AUDIO_PAPKASI = os.environ.get("AUDIO_PAPKASI", "") # Bo'sh bo'lsa mp3 lar yuklab olinmaydi
+AUDIO_PAPKA_HAJMI_MB = int(os.environ.get("AUDIO_PAPKA_HAJMI_MB", "100")) # Lokal papka hajmi chegarasi
+# --- Javob sozlamalari ---
+YOZMOQDA_KECHIKISHI = float(os.environ.get("YOZMOQDA_KECHIKISHI", "0.5")) # Javob shundan uzoq tayyorlansa "yozmoqda..." ko'rsatiladi
+TARIF_TIMEOUT = float(os.environ.get("TARIF_TIMEOUT", "8")) # Ta'rif bosqichi uchun umumiy chegara (soniyalarda)
+TARIF_SONI = 5 # Bitta so'z uchun ko'rsatiladigan ta'riflar (ta'rif keshi kaliti ham shunga bog'liq)
+# Tarjimadan keyin ta'rifni shuncha kutib, ikkalasi bitta xabarga birlashtiriladi; kechiksa alohida yuboriladi
+TARIF_BIRLASHTIRISH_OYNASI = float(os.environ.get("TARIF_BIRLASHTIRISH_OYNASI", "0.3"))
+# --- Ko'p qatorli so'zlar ro'yxati (har qatorda bitta so'z/ibora) ---
+ROYXAT_MAKS = int(os.environ.get("ROYXAT_MAKS", "100")) # Bitta ro'yxatdagi maksimal qatorlar
+ROYXAT_SAHIFA = int(os.environ.get("ROYXAT_SAHIFA", "10")) # Bir sahifadagi so'zlar
+ROYXAT_TARIF_PARALLEL = int(os.environ.get("ROYXAT_TARIF_PARALLEL", "8")) # Bir vaqtda olinadigan ta'riflar
+ROYXAT_SAQLASH = int(os.environ.get("ROYXAT_SAQLASH", "3600")) # Sahifalash uchun ro'yxat saqlanadigan vaqt (soniyalarda)
+# --- Inline rejim (@bot so'z) ---
+INLINE_KECHIKISHI = float(os.environ.get("INLINE_KECHIKISHI", "0.6")) # Foydalanuvchi yozishdan to'xtashini kutish (soniyalarda)
+INLINE_KESH_VAQTI = int(os.environ.get("INLINE_KESH_VAQTI", "86400")) # answer_inline_query cache_time (Telegram serverida)
+INLINE_KESH_HAJMI = int(os.environ.get("INLINE_KESH_HAJMI", "5000")) # Botdagi tayyor inline javoblar soni
+INLINE_TARIF_KUTISH = float(os.environ.get("INLINE_TARIF_KUTISH", "3")) # Ta'rifni kutish; kechiksa faqat tarjima beriladi
+INLINE_MAKS_UZUNLIK = 100 # Uzunroq so'rovlar qisqartiriladi
+# --- Foydalanuvchi cheklovi (adminlarga ta'sir qilmaydi) ---
+FOYDALANUVCHI_TEZLIGI = float(os.environ.get("FOYDALANUVCHI_TEZLIGI", "1")) # Bitta foydalanuvchi uchun soniyasiga xabarlar
+FOYDALANUVCHI_PORTLASH = int(os.environ.get("FOYDALANUVCHI_PORTLASH", "5")) # Birdaniga ruxsat etilgan xabarlar
+FOYDALANUVCHI_NAVBATI = int(os.environ.get("FOYDALANUVCHI_NAVBATI", "3")) # Bitta foydalanuvchining navbatdagi xabarlari (kamida 1)
+PARALLEL_YANGILANISHLAR = int(os.environ.get("PARALLEL_YANGILANISHLAR", "32")) # Bir vaqtda qayta ishlanadigan update lar
+# --- Matnni qayta ishlash yuklanish nazorati ---
+MATN_PARALLEL = int(os.environ.get("MATN_PARALLEL", "8")) # Bir vaqtda tarjima qilinadigan xabarlar
+MATN_NAVBATI = int(os.environ.get("MATN_NAVBATI", "32")) # Navbatda kutishi mumkin bo'lgan xabarlar
+MATN_KUTISH = float(os.environ.get("MATN_KUTISH", "8")) # Navbatda maksimal kutish (soniyalarda), keyin "band" javobi
+MATN_SODDALASHTIRISH = float(os.environ.get("MATN_SODDALASHTIRISH", "2")) # Shundan uzoq kutganlarga faqat tarjima beriladi
+# --- Prometheus metrikalari (http://METRIKA_HOST:METRIKA_PORT/metrics), METRIKA_PORT=0 bo'lsa o'chiq ---
+METRIKA_HOST = os.environ.get("METRIKA_HOST", "127.0.0.1")
+METRIKA_PORT = int(os.environ.get("METRIKA_PORT", "9102"))
+# --- Chiquvchi xabarlar rejalashtiruvchisi (Telegram flood limitlari) ---
+YUBORISH_TEZLIGI = float(os.environ.get("YUBORISH_TEZLIGI", "30")) # Barcha chatlarga soniyasiga xabarlar
+CHAT_TEZLIGI = float(os.environ.get("CHAT_TEZLIGI", "1")) # Bitta chatga soniyasiga xabarlar
+CHAT_PORTLASH = int(os.environ.get("CHAT_PORTLASH", "3")) # Bitta chatga birdaniga yuborish mumkin bo'lgan xabarlar
+YUBORISH_URINISHLARI = int(os.environ.get("YUBORISH_URINISHLARI", "3")) # RetryAfter dan keyin qayta urinishlar
+# --- Reklama yuborish sozlamalari ---
+REKLAMA_TEZLIGI = float(os.environ.get("REKLAMA_TEZLIGI", "25")) # Soniyasiga xabarlar (Telegram limiti ~30)
+REKLAMA_ISHCHILARI = int(os.environ.get("REKLAMA_ISHCHILARI", "8")) # Bir vaqtda yuboruvchilar soni
+REKLAMA_PAPKASI = os.environ.get("REKLAMA_PAPKASI", "reklama_holati") # Davom ettirish uchun checkpoint fayllari
+# --- A'zolik tekshiruvi keshi (soniyalarda) ---
+AZOLIK_KESH_TTL = int(os.environ.get("AZOLIK_KESH_TTL", "600")) # A'zo foydalanuvchilar uchun
+AZOLIK_KESH_NEGATIV_TTL = int(os.environ.get("AZOLIK_KESH_NEGATIV_TTL", "30")) # A'zo bo'lmaganlar uchun
+KANAL_YANGILASH_DAVRI = int(os.environ.get("KANAL_YANGILASH_DAVRI", "1800")) # Kanal ma'lumotini yangilash oralig'i
+# --- Lokal (offlayn) lug'at indeksi: `python lugat_indeksi.py import dump.jsonl` bilan yaratiladi ---
+LUGAT_INDEKS_FAYLI = os.environ.get("LUGAT_INDEKS_FAYLI", "lugat.sqlite3")
+# --- Lug'at API uchun umumiy (keep-alive) HTTP ulanishlar cheklovi ---
+LUGAT_HTTP_ULANISHLAR = int(os.environ.get("LUGAT_HTTP_ULANISHLAR", "20"))
+# --- Issiq start: mashhur so'rovlar restartdan keyin ham tayyor turadi (SOROV_JURNALI_FAYLI bo'sh bo'lsa o'chiq) ---
+SOROV_JURNALI_FAYLI = os.environ.get("SOROV_JURNALI_FAYLI", "sorovlar.sqlite3") # So'rovlar chastotasi jurnali
+KESH_SURATI_FAYLI = os.environ.get("KESH_SURATI_FAYLI", "kesh_surati.json") # To'xtashda saqlanadigan issiq yozuvlar
+ISITISH_SONI = int(os.environ.get("ISITISH_SONI", "500")) # Saqlanadigan va oldindan olinadigan eng mashhur so'rovlar
+ISITISH_TEZLIGI = float(os.environ.get("ISITISH_TEZLIGI", "5")) # Oldindan olishda soniyasiga upstream so'rovlar
+ISITISH_VAQTI = float(os.environ.get("ISITISH_VAQTI", "60")) # Oldindan olishga ajratilgan maksimal vaqt (soniyalarda)
+LUGAT_HTTP_TIMEOUT = float(os.environ.get("LUGAT_HTTP_TIMEOUT", "15"))
+# --- Tarjima xizmati sozlamalari ---
+TARJIMA_ISHCHILARI = int(os.environ.get("TARJIMA_ISHCHILARI", "8")) # googletrans uchun alohida threadlar soni
+TARJIMA_TIMEOUT = float(os.environ.get("TARJIMA_TIMEOUT", "10")) # Har bir chaqiruv uchun soniyalarda
+# Lokal til aniqlagich ishonchi shundan past bo'lsa, googletrans detect ishlatiladi
+TIL_ANIQLASH_CHEGARASI = float(os.environ.get("TIL_ANIQLASH_CHEGARASI", "0.8"))
 
 # --- Kirish ma'lumotlarini tekshirish ---
 if not API_TOKEN:
@@ -64,56 +164,112 @@ else:
 # --- Global o'zgaruvchi: Joriy kanal ID si (o'zgarishsiz) ---
 JORIY_KANAL_ID = None
 
-# --- FSM uchun Storage (o'zgarishsiz) ---
-storage = MemoryStorage() # Holatlarni xotirada saqlash
+# --- FSM uchun Storage ---
+# Holatlar xotirada o'qiladi, o'zgarishlar esa paket bilan SQLite ga yoziladi (restartda yo'qolmaydi)
+storage = SQLiteStorage(FSM_DB_FILE)
 
 # --- Asosiy obyektlar (o'zgarishsiz) ---
 # Bot obyektini yaratishda .env dan olingan API_TOKEN ishlatiladi
-bot = Bot(token=API_TOKEN, parse_mode=ParseMode.MARKDOWN)
+# TrackingBot: har bir update uchun API chaqiruvlarini sanaydi va chatdagi oxirgi klaviaturani eslab qoladi
+# Barcha xabar yuborishlar (message.answer, send_voice, reklama ham) yuborish_navbati orqali o'tadi:
+# chatga ~1/s, jami ~30/s, RetryAfter kelsa hamma yuborish to'xtab turadi; javoblar reklamadan oldin
+yuborish_navbati = SendScheduler(global_rate=YUBORISH_TEZLIGI, chat_rate=CHAT_TEZLIGI, chat_burst=CHAT_PORTLASH)
+# Barcha matnlar HTML rejimida: o'zgaruvchan qismlar formatlash.escape dan o'tadi, shuning uchun
+# tarjima yoki ta'rifdagi _ * ` belgilari xabarni buzmaydi (CantParseEntities va qayta yuborish yo'q)
+bot = TrackingBot(token=API_TOKEN, parse_mode=ParseMode.HTML,
+          server=TelegramAPIServer.from_base(BOT_API_SERVER) if BOT_API_SERVER else TELEGRAM_PRODUCTION,
+          send_scheduler=yuborish_navbati, max_retries=YUBORISH_URINISHLARI)
 # Dispatcherga storage ni berish (o'zgarishsiz)
 dp = Dispatcher(bot, storage=storage)
 dp.middleware.setup(LoggingMiddleware())
+# Har bir foydalanuvchi uchun token bucket + navbat bilan adolatli (round-robin) qayta ishlash
+cheklov = ThrottlingMiddleware(rate=FOYDALANUVCHI_TEZLIGI, burst=FOYDALANUVCHI_PORTLASH,
+                               concurrency=PARALLEL_YANGILANISHLAR, max_pending=FOYDALANUVCHI_NAVBATI,
+                               exempt=ADMIN_IDS,
+                               notice="⏳ Juda ko'p xabar yuboryapsiz. Iltimos, biroz kutib, qayta yuboring.")
+dp.middleware.setup(cheklov)
+# matn_qayta_ishlash uchun: cheklangan parallel ishlov, navbat, yuklanishda soddalashtirilgan javob
+matn_navbati = AdmissionController(limit=MATN_PARALLEL, queue_size=MATN_NAVBATI,
+                                   max_wait=MATN_KUTISH, degrade_after=MATN_SODDALASHTIRISH)
+api_metrikasi = ApiCallMetrics(target=2) # Maqsad: bitta update uchun 2 tadan ko'p bo'lmagan API chaqiruvi
+dp.middleware.setup(api_metrikasi)
+dp.middleware.setup(HandlerTimingMiddleware()) # Har bir handler funksiyasining bajarilish vaqti
 translator = Translator()
+# Tarjimalar keshi: xotirada LRU + diskda SQLite (restartdan keyin ham saqlanadi)
+tarjima_keshi = TTLCache(max_size=TARJIMA_KESH_HAJMI, ttl=TARJIMA_KESH_TTL,
+                         db_path=TARJIMA_KESH_FAYLI or None, name="tarjima")
+# Ta'riflar keshi (dictionar.get_definitions ichida ishlatiladi)
+tarif_keshi = dictionar.configure_cache(db_path=TARIF_KESH_FAYLI or None, max_size=TARIF_KESH_HAJMI,
+                                        ttl=TARIF_KESH_TTL, negative_ttl=TARIF_KESH_NEGATIV_TTL)
+# Lokal indeks mavjud bo'lsa, ta'riflar avval undan qidiriladi (API faqat zaxira sifatida)
+lugat_indeksi = None
+if LUGAT_INDEKS_FAYLI and os.path.exists(LUGAT_INDEKS_FAYLI):
+    lugat_indeksi = dictionar.configure_local_index(LUGAT_INDEKS_FAYLI)
+else:
+    log.info(f"Lokal lug'at indeksi ('{LUGAT_INDEKS_FAYLI}') topilmadi. Ta'riflar faqat API dan olinadi.")
+dictionar.configure_http(limit=LUGAT_HTTP_ULANISHLAR, limit_per_host=LUGAT_HTTP_ULANISHLAR,
+                         timeout=LUGAT_HTTP_TIMEOUT)
+# googletrans chaqiruvlari event loop ni bloklamasligi uchun alohida executor da bajariladi
+# Tilni avval lokal (offlayn) aniqlagich bilan aniqlaydi, faqat ishonch past bo'lsa tarmoqqa murojaat qiladi
+tarjima_xizmati = AsyncTranslator(translator, max_workers=TARJIMA_ISHCHILARI,
+                                  timeout=TARJIMA_TIMEOUT, cache=tarjima_keshi,
+                                  local_detector=detect_language, local_threshold=TIL_ANIQLASH_CHEGARASI)
+
+# Talaffuz audiosi: birinchi yuborishdan keyin Telegram file_id si saqlanadi va qayta ishlatiladi
+audio_keshi = AudioCache(db_path=AUDIO_KESH_FAYLI or None, store_dir=AUDIO_PAPKASI or None,
+                         max_store_bytes=AUDIO_PAPKA_HAJMI_MB * 1024 * 1024)
+
+# Normallashtirilgan so'rovlar chastotasi: to'xtashda kesh surati va ishga tushishda isitish uchun
+sorov_jurnali = QueryLog(SOROV_JURNALI_FAYLI) if SOROV_JURNALI_FAYLI else None
+
+# Inline javoblar (faqat xotirada): "hel" yozilganda allaqachon tayyor "hello" ham taklif qilinadi
+inline_keshi = PrefixCache(max_size=INLINE_KESH_HAJMI, ttl=TARJIMA_KESH_TTL, name="inline")
+
+# Ro'yxat sahifalari (faqat xotirada): "◀️ ▶️" tugmalari bosilganda qayta hisoblanmaydi
+royxat_sahifalari = TTLCache(max_size=1000, ttl=ROYXAT_SAQLASH, name="ro'yxat")
+
+# A'zolik natijalari keshi: har bir xabarda bot.get_chat_member chaqirmaslik uchun (faqat xotirada)
+azolik_keshi = TTLCache(max_size=100000, ttl=AZOLIK_KESH_TTL, name="a'zolik")
+
+def azolik_kaliti(user_id: int) -> str:
+    # Kalitga kanal ID si ham kiradi, kanal almashsa eski natijalar ishlatilmaydi
+    return f"{JORIY_KANAL_ID}:{user_id}"
+
+# --- Foydalanuvchi va Kanal ID boshqaruvi ---
+# Foydalanuvchilar SQLite bazasida (WAL) saqlanadi: soni O(1), yangi IDlar paket bilan yoziladi
+foydalanuvchilar = UserStore(USER_DB_FILE)
+foydalanuvchilar_yozish_taski = None
 
-# --- Foydalanuvchi va Kanal ID boshqaruvi (o'zgarishsiz) ---
-FOYDALANUVCHI_IDLAR_CACHE = set()
 def foydalanuvchi_idlarni_yuklash():
-    global FOYDALANUVCHI_IDLAR_CACHE
-    if not os.path.exists(USER_FILE):
-        log.warning(f"Foydalanuvchi fayli '{USER_FILE}' topilmadi. Bo'sh ro'yxat bilan boshlanmoqda.")
-        FOYDALANUVCHI_IDLAR_CACHE = set()
-        try:
-            with open(USER_FILE, "w"): pass
-            log.info(f"Bo'sh foydalanuvchi fayli yaratildi: {USER_FILE}")
-        except IOError as e:
-             log.error(f"Foydalanuvchi faylini yaratishda xatolik {USER_FILE}: {e}")
-        return
+    # Birinchi ishga tushishda eski matnli fayldagi IDlar bazaga ko'chiriladi (dublikatlarsiz)
     try:
-        with open(USER_FILE, "r") as f:
-            ids = {int(line.strip()) for line in f if line.strip().isdigit()}
-            FOYDALANUVCHI_IDLAR_CACHE = ids
-            log.info(f"{len(FOYDALANUVCHI_IDLAR_CACHE)} ta foydalanuvchi IDsi {USER_FILE} faylidan yuklandi")
-    except ValueError as e:
-        log.error(f"'{USER_FILE}' faylini o'qishda xatolik. Noto'g'ri ID bormi? {e}")
+        migrate_text_file(foydalanuvchilar, USER_FILE)
     except Exception as e:
-        log.error(f"'{USER_FILE}' faylini o'qishda xatolik: {e}")
+        log.error(f"'{USER_FILE}' faylini bazaga ko'chirishda xatolik: {e}")
+    log.info(f"{foydalanuvchilar.count()} ta foydalanuvchi {USER_DB_FILE} bazasida")
 
-def get_foydalanuvchi_idlar():
-    return FOYDALANUVCHI_IDLAR_CACHE.copy()
+def foydalanuvchilar_soni() -> int:
+    return foydalanuvchilar.count()
+
+def foydalanuvchi_idlari():
+    # Barcha IDlarni sahifalab o'qiydi (butun ro'yxat xotiraga yuklanmaydi)
+    return foydalanuvchilar.iter_ids()
 
 def foydalanuvchi_id_qoshish(user_id: int):
-    if user_id not in FOYDALANUVCHI_IDLAR_CACHE:
-        FOYDALANUVCHI_IDLAR_CACHE.add(user_id)
-        try:
-            with open(USER_FILE, "a") as f:
-                f.write(str(user_id) + "\n")
-            log.info(f"Yangi foydalanuvchi qo'shildi: {user_id}. Jami: {len(FOYDALANUVCHI_IDLAR_CACHE)}")
+    try:
+        if foydalanuvchilar.add(user_id):
+            log.info(f"Yangi foydalanuvchi qo'shildi: {user_id}. Jami: {foydalanuvchilar.count()}")
             return True
-        except IOError as e:
-            log.error(f"Foydalanuvchi ID {user_id} ni '{USER_FILE}' fayliga yozishda xatolik: {e}")
-            return False
+    except Exception as e:
+        log.error(f"Foydalanuvchi ID {user_id} ni bazaga yozishda xatolik: {e}")
     return False
 
+async def foydalanuvchilarni_davriy_yozish():
+    # Paketga yig'ilgan yangi IDlar uzoq kutib qolmasligi uchun
+    while True:
+        await asyncio.sleep(5)
+        foydalanuvchilar.flush()
+
 def kanal_idni_yuklash():
     global JORIY_KANAL_ID
     try:
@@ -134,12 +290,14 @@ def kanal_idni_yuklash():
     return False
 
 def kanal_idni_saqlash(kanal_id: str):
-    global JORIY_KANAL_ID
+    global JORIY_KANAL_ID, AZOLIK_XABARI
     try:
         cleaned_id = kanal_id.strip()
         with open(CHANNEL_CONFIG_FILE, "w") as f:
             f.write(cleaned_id)
         JORIY_KANAL_ID = cleaned_id
+        azolik_keshi.clear() # Yangi kanal uchun a'zolik qaytadan tekshiriladi
+        AZOLIK_XABARI = None # Eski kanal xabari yangi kanal uchun tayyorlanguncha ishlatilmaydi
         log.info(f"Kanal IDsi muvaffaqiyatli o'rnatildi va saqlandi: {JORIY_KANAL_ID}")
         return True
     except IOError as e:
@@ -150,16 +308,24 @@ def kanal_idni_saqlash(kanal_id: str):
         return False
 
 # --- Kanalga a'zolikni tekshirish va xabar yuborish (o'zgarishsiz) ---
-async def azolikni_tekshirish(user_id: int) -> bool:
+async def azolikni_tekshirish(user_id: int, yangilash: bool = False) -> bool:
+    # yangilash=True bo'lsa keshga qaramasdan Telegramdan qayta so'raladi ("A'zolikni Tekshirish" tugmasi uchun)
     if not JORIY_KANAL_ID:
         log.debug("A'zolik tekshiruvi o'tkazib yuborildi: Kanal ID si o'rnatilmagan.")
         return True
+    kalit = azolik_kaliti(user_id)
+    if not yangilash:
+        keshdagi = azolik_keshi.get(kalit)
+        if keshdagi is not None:
+            return keshdagi
     try:
         member = await bot.get_chat_member(chat_id=JORIY_KANAL_ID, user_id=user_id)
         is_member = member.status in [types.ChatMemberStatus.MEMBER,
                                        types.ChatMemberStatus.ADMINISTRATOR,
                                        types.ChatMemberStatus.CREATOR]
         log.debug(f"A'zolik tekshiruvi: Foydalanuvchi={user_id}, Kanal={JORIY_KANAL_ID}: Status={member.status}, A'zo={is_member}")
+        # Faqat aniq javoblar keshlanadi; xatoliklar (pastdagi except lar) keshlanmaydi
+        azolik_keshi.set(kalit, is_member, ttl=AZOLIK_KESH_TTL if is_member else AZOLIK_KESH_NEGATIV_TTL)
         return is_member
     except ChatNotFound:
         log.error(f"A'zolik tekshiruvi muvaffaqiyatsiz: Belgilangan kanal ({JORIY_KANAL_ID}) topilmadi yoki bot admin emas.")
@@ -171,39 +337,61 @@ async def azolikni_tekshirish(user_id: int) -> bool:
         log.error(f"Foydalanuvchi {user_id} ning {JORIY_KANAL_ID} kanalidagi a'zoligini tekshirishda xatolik: {e}")
         return False # Boshqa xatoliklarda ham a'zo emas deb hisoblaymiz (xavfsizlik uchun)
 
-async def azolik_xabarini_yuborish(chat_id: int):
-    if not JORIY_KANAL_ID:
-        await bot.send_message(chat_id, "Bot hozirda hech qanday kanalga ulanmagan. Administrator sozlamalarni amalga oshirishini kuting.")
-        log.warning(f"A'zolik xabarini yuborishga urinildi (chat: {chat_id}), lekin kanal o'rnatilmagan.")
-        return
+# --- A'zolik so'rovi xabari keshi ---
+# Kanal nomi, havolasi va tayyor xabar (matn + klaviatura) kanal o'rnatilganda/yuklanganda bir marta
+# tayyorlanadi va fon rejimida vaqti-vaqti bilan yangilanadi. Shunda a'zo bo'lmaganlarga javob
+# berishda qo'shimcha API chaqiruvi bo'lmaydi.
+AZOLIK_XABARI = None # (xabar_matni, keyboard) yoki None (hali tayyorlanmagan)
+azolik_xabari_yangilash_taski = None
+
+async def azolik_xabarini_tayyorlash(kanal_id=None, chat_info=None):
+    # kanal_id: xabar tayyorlanadigan kanal (standart: joriy kanal); chat_info: oldindan olingan
+    # get_chat natijasi (kanal qayta so'ralmaydi). Tayyorlangan xabar qaytariladi va, agar shu
+    # orada kanal almashtirilmagan bo'lsa, AZOLIK_XABARI ga yoziladi.
+    global AZOLIK_XABARI
+    kanal_id = kanal_id or JORIY_KANAL_ID
+    if not kanal_id:
+        AZOLIK_XABARI = None
+        return None
+
+    def saqlash(xabar):
+        global AZOLIK_XABARI
+        # get_chat kutilayotganda admin kanalni almashtirgan bo'lsa, eski kanal xabari yozilmaydi
+        if kanal_id == JORIY_KANAL_ID:
+            AZOLIK_XABARI = xabar
+        else:
+            log.info(f"A'zolik xabari ({kanal_id}) tashlab yuborildi: kanal o'zgargan.")
+        return xabar
 
     keyboard = InlineKeyboardMarkup(row_width=1)
-    kanal_nomi = JORIY_KANAL_ID # Default nom sifatida ID ni olamiz
+    kanal_nomi = kanal_id # Default nom sifatida ID ni olamiz
     kanal_link = None
 
     try:
         # Kanal ma'lumotlarini olishga harakat qilamiz
-        chat_info = await bot.get_chat(JORIY_KANAL_ID)
-        kanal_nomi = chat_info.full_name or chat_info.title or JORIY_KANAL_ID # To'liq nom, sarlavha yoki ID
+        if chat_info is None:
+            chat_info = await bot.get_chat(kanal_id)
+        kanal_nomi = chat_info.full_name or chat_info.title or kanal_id # To'liq nom, sarlavha yoki ID
         if chat_info.username: # Agar kanal public bo'lsa va username bo'lsa
             kanal_link = f"https://t.me/{chat_info.username}"
         else: # Agar kanal private bo'lsa yoki username bo'lmasa
-             log.warning(f"Belgilangan kanal ({JORIY_KANAL_ID}) yopiq yoki username'ga ega emas. Oddiy havola yaratib bo'lmadi.")
+             log.warning(f"Belgilangan kanal ({kanal_id}) yopiq yoki username'ga ega emas. Oddiy havola yaratib bo'lmadi.")
              # Bu yerda invite link olishga harakat qilish mumkin, lekin u vaqtinchalik bo'lishi mumkin
     except ChatNotFound:
-         log.error(f"Belgilangan kanal ({JORIY_KANAL_ID}) ma'lumotlarini olib bo'lmadi. ID xato yoki botda ruxsat yo'q.")
-         # Foydalanuvchiga xato haqida xabar berish
-         await bot.send_message(chat_id, f"❗️ Administrator tomonidan belgilangan kanal ({JORIY_KANAL_ID}) topilmadi yoki botda ruxsat yo'q. Administrator bilan bog'laning.")
-         return # Kanal topilmasa, xabar yuborishni to'xtatamiz
+         log.error(f"Belgilangan kanal ({kanal_id}) ma'lumotlarini olib bo'lmadi. ID xato yoki botda ruxsat yo'q.")
+         # Foydalanuvchiga xato haqida xabar beriladi (klaviaturasiz)
+         return saqlash((f"❗️ Administrator tomonidan belgilangan kanal ({escape(kanal_id)}) topilmadi yoki botda ruxsat yo'q. Administrator bilan bog'laning.", None))
     except Exception as e:
         # Boshqa kutilmagan xatoliklar
-        log.warning(f"Kanal ({JORIY_KANAL_ID}) ma'lumotlarini olishda xatolik. Asosiy ma'lumotlardan foydalanilmoqda. Xatolik: {e}")
+        log.warning(f"Kanal ({kanal_id}) ma'lumotlarini olishda xatolik. Asosiy ma'lumotlardan foydalanilmoqda. Xatolik: {e}")
+        if AZOLIK_XABARI is not None and kanal_id == JORIY_KANAL_ID:
+            return AZOLIK_XABARI # Vaqtinchalik xatolikda oldin tayyorlangan xabar saqlanib qoladi
         # Agar ID @ bilan boshlansa, uni link qilishga urinib ko'ramiz
-        if JORIY_KANAL_ID.startswith('@'):
-            kanal_link = f"https://t.me/{JORIY_KANAL_ID[1:]}"
+        if kanal_id.startswith('@'):
+            kanal_link = f"https://t.me/{kanal_id[1:]}"
 
     # Xabar matni
-    xabar_matni = f"✨ Botdan toʻliq foydalanish uchun, iltimos, *{kanal_nomi}* kanalimizga aʼzo boʻling.\n\n"
+    xabar_matni = f"✨ Botdan toʻliq foydalanish uchun, iltimos, {bold(kanal_nomi)} kanalimizga aʼzo boʻling.\n\n"
 
     # Agar kanal linki mavjud bo'lsa, tugmani qo'shamiz
     if kanal_link:
@@ -216,16 +404,37 @@ async def azolik_xabarini_yuborish(chat_id: int):
     keyboard.add(InlineKeyboardButton("✅ A'zolikni Tekshirish", callback_data="azolikni_tekshir"))
     xabar_matni += "A'zo bo'lgach, '✅ A'zolikni Tekshirish' tugmasini bosing."
 
+    log.info(f"A'zolik xabari tayyorlandi: kanal '{kanal_nomi}' ({kanal_id}), havola: {kanal_link}")
+    return saqlash((xabar_matni, keyboard))
+
+async def azolik_xabarini_davriy_yangilash():
+    # Kanal nomi yoki username o'zgarsa ham xabar eskirib qolmasligi uchun
+    while True:
+        await asyncio.sleep(KANAL_YANGILASH_DAVRI)
+        try:
+            await azolik_xabarini_tayyorlash()
+        except Exception as e:
+            log.error(f"A'zolik xabarini davriy yangilashda xatolik: {e}")
+
+async def azolik_xabarini_yuborish(chat_id: int):
+    if not JORIY_KANAL_ID:
+        await bot.send_message(chat_id, "Bot hozirda hech qanday kanalga ulanmagan. Administrator sozlamalarni amalga oshirishini kuting.")
+        log.warning(f"A'zolik xabarini yuborishga urinildi (chat: {chat_id}), lekin kanal o'rnatilmagan.")
+        return
+
+    # Odatda startup da tayyorlanadi, bu faqat zaxira holat
+    xabar_matni, keyboard = AZOLIK_XABARI or await azolik_xabarini_tayyorlash()
+
     # Xabarni yuborish
     await bot.send_message(
         chat_id,
         xabar_matni,
-        reply_markup=keyboard,
-        parse_mode=ParseMode.MARKDOWN
+        reply_markup=keyboard
     )
 
 
-# --- Xavfsiz xabar yuborish (o'zgarishsiz) ---
+# --- Xavfsiz xabar yuborish ---
+# RetryAfter ni bot.request o'zi kutib, cheklangan marta qayta urinadi; bu yerga faqat urinishlar tugaganda yetadi
 async def xavfsiz_xabar_yuborish(chat_id: int, text: str, **kwargs):
     try:
         return await bot.send_message(chat_id, text, **kwargs)
@@ -236,23 +445,140 @@ async def xavfsiz_xabar_yuborish(chat_id: int, text: str, **kwargs):
     except UserDeactivated:
         log.warning(f"Xabar yuborib bo'lmadi (chat {chat_id}): Foydalanuvchi akkaunti o'chirilgan.")
     except CantParseEntities as e:
-        log.warning(f"Markdown xatoligi ({chat_id}): {e}. Oddiy matn yuborilmoqda.")
+        # Matnlar formatlash orqali tayyorlanadi, bu holat bo'lmasligi kerak (metrika: bot_send_fallbacks_total)
+        metrika.SEND_FALLBACKS.inc("cant_parse_entities")
+        log.warning(f"Formatlash xatoligi ({chat_id}): {e}. Formatsiz matn yuborilmoqda.")
         try:
-            # Eng ko'p ishlatiladigan markdown belgilarni olib tashlash
-            plain_text = text.replace('*','').replace('_','').replace('`','').replace('[','').replace(']','')
-            return await bot.send_message(chat_id, plain_text, **kwargs)
+            # Teglarni olib tashlash; escape qilingan matn HTML rejimida ham to'g'ri qoladi
+            return await bot.send_message(chat_id, strip_tags(text), **dict(kwargs, parse_mode=ParseMode.HTML))
         except Exception as plain_err:
             log.error(f"Oddiy matnli xabarni yuborishda xatolik ({chat_id}): {plain_err}")
     except RetryAfter as e:
-        log.warning(f"Flood control ({chat_id}). {e.timeout} soniya kutamiz.")
-        await asyncio.sleep(e.timeout)
-        return await xavfsiz_xabar_yuborish(chat_id, text, **kwargs) # Qayta urinish
+        log.warning(f"Flood control ({chat_id}): {e.timeout} soniya, qayta urinishlar tugadi. Xabar yuborilmadi.")
     except TelegramAPIError as e:
         log.error(f"Telegram API xatoligi tufayli xabar yuborilmadi ({chat_id}): {e}")
     except Exception as e:
         log.error(f"Xabar yuborishda kutilmagan xatolik ({chat_id}): {e}\n{traceback.format_exc()}")
     return None # Xatolik bo'lsa None qaytaradi
 
+# --- Talaffuz audiosini yuborish ---
+async def talaffuz_yuborish(chat_id: int, soz: str, audio_url: str, caption: str = None, **kwargs):
+    caption = caption or f"{code(soz)} talaffuzi"
+    # 1. Avval saqlangan file_id: Telegram faylni qayta yuklab olmaydi, bitta yengil chaqiruv
+    file_id = audio_keshi.get_file_id(soz)
+    if file_id:
+        try:
+            return await bot.send_voice(chat_id, file_id, caption=caption, **kwargs)
+        except (RetryAfter, CantParseEntities):
+            raise
+        except TelegramAPIError as e:
+            # file_id endi yaroqsiz bo'lsa, o'chirib, fayl/URL orqali qayta yuboramiz
+            log.warning(f"'{soz}' uchun saqlangan file_id ishlamadi, qayta yuklanadi: {e}")
+            audio_keshi.forget(soz)
+
+    # 2. Lokal papkadagi mp3 (yoqilgan bo'lsa), aks holda URL
+    manba = audio_url
+    lokal_fayl = audio_keshi.local_path(soz, audio_url) or await audio_keshi.download(soz, audio_url)
+    if lokal_fayl:
+        manba = types.InputFile(lokal_fayl)
+    yuborilgan = await bot.send_voice(chat_id, manba, caption=caption, **kwargs)
+    if yuborilgan and yuborilgan.voice:
+        audio_keshi.set_file_id(soz, yuborilgan.voice.file_id)
+    return yuborilgan
+
+
+# --- So'zga javob: tarjima, ta'riflar va talaffuz iloji boricha bitta xabarda ---
+async def tarif_olish(soz: str):
+    # Ta'rif bosqichi o'z timeouti bilan: sekin lug'at tarjimani kechiktirmaydi
+    try:
+        # dictionar.py dagi asinxron funksiyani chaqirish (umumiy keep-alive ulanish orqali)
+        return await asyncio.wait_for(get_definitions_async(soz, TARIF_SONI), timeout=TARIF_TIMEOUT)
+    except asyncio.TimeoutError:
+        log.warning(f"'{soz}' uchun ta'rif {TARIF_TIMEOUT} soniyada olinmadi.")
+        return dictionar.DefinitionResult(error="Lug'at xizmati javob bermadi.")
+    except Exception as e_def:
+        log.error(f"Ta'rifni qayta ishlashda xatolik ('{soz}' uchun): {e_def}\n{traceback.format_exc()}")
+        return None
+
+def tarjima_qismi(lang: str, dest: str, tarjima: str) -> str:
+    return f"{bold(lang)} → {bold(dest)} Tarjimasi:\n{code(tarjima)}"
+
+def tarif_qismi(soz: str, lookup, tarjima_korsatilgan: bool) -> str:
+    if lookup is None: # Kutilmagan xatolik (log qilingan)
+        return "❗️ Ta'riflarni olishda kutilmagan xatolik yuz berdi."
+    if not lookup.ok: # Agar ta'rif topilmasa yoki API da xatolik bo'lsa
+        error_msg = lookup.error or "Noma'lum sabab"
+        log.info(f"'{soz}' uchun ta'rif topilmadi: {error_msg}")
+        if tarjima_korsatilgan:
+            return f"ℹ️ Qo'shimcha ma'lumot ({code(soz)} uchun ta'rif/fonetika) topilmadi."
+        return f"ℹ️ {code(soz)} uchun tarjima, ta'rif yoki fonetika topilmadi."
+    fonetika_matni = escape(lookup.phonetic) if lookup.phonetic else italic("Mavjud emas")
+    # Ta'riflarni formatlash (lug'at matni escape qilinadi)
+    tariflar_matni = "\n".join([f"🔹 {escape(t)}" for t in lookup.definitions]) if lookup.definitions else italic("Ta'riflar topilmadi.")
+    return "\n".join([
+        f"📖 So'z: {code(soz)}",
+        f"🔊 Fonetika: {fonetika_matni}",
+        f"\n📚 Ta'riflar:\n{tariflar_matni}",
+    ])
+
+async def javob_yuborish(message: types.Message, javob: str, kb, soz: str = None, audio_url: str = None):
+    chat_id = message.chat.id
+    # Klaviatura faqat foydalanuvchida hali yo'q bo'lsa biriktiriladi (alohida "Asosiy menyu" xabarisiz)
+    reply_markup = bot.keyboard_if_changed(chat_id, kb)
+    if audio_url and len(javob) <= VOICE_CAPTION_LIMIT:
+        # Butun javob talaffuz audiosining izohi sifatida: bitta API chaqiruvi
+        try:
+            log.info(f"Audio yuborilmoqda: {audio_url} ({soz} uchun)")
+            if await talaffuz_yuborish(chat_id, soz, audio_url, caption=javob,
+                                       reply_to_message_id=message.message_id, reply_markup=reply_markup):
+                return
+        except Exception as audio_err:
+            metrika.SEND_FALLBACKS.inc("voice_caption")
+            log.warning(f"Audio ({audio_url}) yuborishda xatolik ('{soz}' uchun): {audio_err}. Faqat matn yuboriladi.")
+        audio_url = None
+    await xavfsiz_xabar_yuborish(chat_id, javob, reply_to_message_id=message.message_id, reply_markup=reply_markup)
+    if audio_url: # Javob izoh uchun juda uzun: audio alohida yuboriladi
+        try:
+            await talaffuz_yuborish(chat_id, soz, audio_url)
+        except Exception as audio_err:
+            log.warning(f"Audio ({audio_url}) yuborishda xatolik ('{soz}' uchun): {audio_err}")
+
+
+# --- Reklama yuborish xizmati ---
+async def reklama_xabarini_yuborish(user_id: int, text: str):
+    with send_priority(BULK): # Foydalanuvchilarga javoblar navbatda turganda reklama kutadi
+        natija = await xavfsiz_xabar_yuborish(user_id, text, disable_web_page_preview=True)
+    metrika.BROADCAST_MESSAGES.inc("sent" if natija else "failed")
+    return natija
+
+async def reklama_holatini_korsatish(job):
+    # Adminning holat xabarini vaqti-vaqti bilan tahrirlash
+    sarlavha = "✅ Reklama yuborish yakunlandi!" if job.finished else "🚀 Reklama yuborilmoqda..."
+    matn = (f"{sarlavha}\n\n"
+            f"👤 {job.sent} yetkazildi.\n"
+            f"🚫 {job.failed} xatolik/blok.\n"
+            f"⏭ {job.skipped} avval yuborilgan (qayta yuborilmadi).\n"
+            f"⚡️ {job.rate:.1f} xabar/s.")
+    try:
+        await bot.edit_message_text(matn, job.admin_chat_id, job.status_message_id)
+    except MessageNotModified: pass
+    except Exception as edit_e:
+        log.error(f"Reklama statusini tahrirlashda xatolik: {edit_e}")
+        if job.finished: # Yakuniy natija albatta yetib borishi kerak
+            await xavfsiz_xabar_yuborish(job.admin_chat_id, matn)
+
+reklama_xizmati = Broadcaster(reklama_xabarini_yuborish, foydalanuvchi_idlari, report=reklama_holatini_korsatish,
+                              rate=REKLAMA_TEZLIGI, workers=REKLAMA_ISHCHILARI, checkpoint_dir=REKLAMA_PAPKASI)
+reklama_taski = None # Joriy reklama yuborish taski (bir vaqtda faqat bittasi)
+
+async def tugallanmagan_reklamalarni_davom_ettirish():
+    # Bot qayta ishga tushganda to'xtab qolgan reklamalarni yuborilmaganlarga davom ettirish
+    for job in reklama_xizmati.pending_jobs():
+        log.info(f"Tugallanmagan reklama davom ettirilmoqda: {job.job_id} ({len(job.done)} ta allaqachon yuborilgan)")
+        await xavfsiz_xabar_yuborish(job.admin_chat_id, "♻️ Bot qayta ishga tushdi. To'xtab qolgan reklama yuborish davom ettirilmoqda...")
+        await reklama_xizmati.run(job)
+
+
 # --- FSM uchun Holatlar (States) (o'zgarishsiz) ---
 class AdminStates(StatesGroup):
     kanal_id_kutish = State()  # Kanal ID sini kutish holati
@@ -267,6 +593,33 @@ admin_asosiy_kb.add(KeyboardButton("📢 Reklama Yuborish"))
 admin_asosiy_kb.add(KeyboardButton("🔧 Kanal Sozlash"), KeyboardButton("🗑 Kanalni O'chirish"))
 admin_asosiy_kb.add(KeyboardButton("⬅️ Ortga (Foydalanuvchi rejimi)"))
 
+# --- Tayyor matnlar: HTML bir marta (import paytida) tayyorlanadi, handlerlarda faqat ism qo'yiladi ---
+SALOM_SHABLONI = ("👋 Salom, {ism}! Speak English botiga xush kelibsiz 😊\n\n"
+                  "Foydalanish uchun so'z yoki ibora yuboring, yoki pastdagi tugmalardan birini bosing 👇")
+ADMIN_ESLATMASI = "\n\n" + bold("(Siz adminsiz. /admin buyrug'i orqali admin paneliga o'tishingiz mumkin)")
+YORDAM_MATNI = (
+    f"📖 {bold('FOYDALANISH QO‘LLANMASI')} 🚀\n\n"
+    "🔹 Ingliz yoki o‘zbek tilidagi so‘z yoki iborani yuboring.\n"
+    "🔹 Bot sizga quyidagilarni taqdim etadi:\n"
+    f"  ✅ {bold('Tarjima')} {escape('(o‘zbekcha <> inglizcha)')}\n"
+    f"  ✅ {bold('Ta’rif')} (inglizcha so'zlar uchun)\n"
+    f"  ✅ {bold('Fonetika')} (inglizcha so'zlar uchun)\n"
+    f"  ✅ 🔊 {bold('Talaffuz')} (audio, agar mavjud bo‘lsa)\n\n"
+    f"💡 {bold('Misol:')}\n"
+    f"   Yuboring: {code('apple')}\n"
+    "   Bot javobi:\n"
+    f"   {code('en -> uz Tarjimasi:')}\n"
+    f"   {code('olma')}\n\n"
+    f"   {code('''📖 So'z: apple''')}\n"
+    f"   {code('🔊 Fonetika: /ˈæp.əl/')}\n"
+    f"   {code('''📚 Ta'riflar:''')}\n"
+    f"   {code('👉 The round fruit of a tree of the rose family...')}\n"
+    f"   {italic('(Audio fayl ham yuboriladi)')} \n\n"
+    "📌 Til o‘rganish – muvaffaqiyat kaliti!"
+)
+KANAL_FORMATI_XATO = (f"❗️ Format xato. Kanal manzilini {code('@username')}, {code('-100...')} yoki "
+                      f"{code('https://t.me/...')} ko'rinishida kiriting.\n\nQaytadan urinib ko'ring yoki /cancel.")
+
 
 # --- Asosiy Handlerlar (o'zgarishsiz) ---
 # !!! Handlerlarning TARTIBI muhim !!!
@@ -291,12 +644,12 @@ async def start_buyrugi(message: types.Message, state: FSMContext):
 
     # A'zo bo'lgan foydalanuvchiga xush kelibsiz xabari
     keyboard_to_show = oddiy_foydalanuvchi_kb
-    salom_matni = f"👋 Salom, {first_name}! Speak English botiga xush kelibsiz 😊\n\nFoydalanish uchun so'z yoki ibora yuboring, yoki pastdagi tugmalardan birini bosing 👇"
+    salom_matni = SALOM_SHABLONI.format(ism=escape(first_name)) # Ismda < > & bo'lishi mumkin
 
     # Agar foydalanuvchi admin bo'lsa, eslatma qo'shamiz
     # ADMIN_IDS endi .env dan olingan qiymatga asoslanadi
     if user_id in ADMIN_IDS:
-        salom_matni += "\n\n*(Siz adminsiz. /admin buyrug'i orqali admin paneliga o'tishingiz mumkin)*"
+        salom_matni += ADMIN_ESLATMASI
         # Adminga ham boshida oddiy klaviaturani ko'rsatamiz
 
     await xavfsiz_xabar_yuborish(chat_id, salom_matni, reply_markup=keyboard_to_show)
@@ -325,6 +678,65 @@ async def admin_paneli_buyrugi(message: types.Message):
     await message.reply("Salom, Admin! Kerakli bo'limni tanlang:", reply_markup=admin_asosiy_kb)
 
 
+# Kesh statistikasi (faqat adminlar uchun)
+@dp.message_handler(commands=['kesh'], user_id=ADMIN_IDS, state=None)
+async def kesh_statistikasi(message: types.Message):
+    qatorlar = [f"📦 {bold('Kesh statistikasi:')}"]
+    for kesh_obyekti in (tarjima_keshi, tarif_keshi, azolik_keshi):
+        st = kesh_obyekti.stats()
+        qatorlar.append(
+            f"\n{bold(st['name'])}: {st['size']}/{st['max_size']} yozuv\n"
+            f"  hit: {st['hits']} (disk: {st['disk_hits']}), miss: {st['misses']}\n"
+            f"  chiqarildi: {st['evictions']}, muddati o'tdi: {st['expirations']}\n"
+            f"  hit-rate: {st['hit_rate']:.1%}"
+        )
+    st = audio_keshi.stats()
+    qatorlar.append(
+        f"\n<b>audio</b>: {st['size']} file_id, hit: {st['hits']} (disk: {st['disk_hits']}), miss: {st['misses']}\n"
+        f"  lokal papka: {st['store_bytes'] / 1024 / 1024:.1f} MB, yuklandi: {st['downloads']}, "
+        f"xatolik: {st['download_errors']}, o'chirildi: {st['store_evictions']}"
+    )
+    ns = matn_navbati.stats()
+    qatorlar.append(
+        f"\n<b>matn navbati</b>: bajarilmoqda {ns['active']}/{ns['limit']}, navbatda {ns['queued']} (maks. {ns['max_queue']})\n"
+        f"  o'rtacha kutish: {ns['avg_wait'] * 1000:.0f} ms, to'liq: {ns['admitted']}, faqat tarjima: {ns['degraded']}\n"
+        f"  rad etildi: navbat to'la {ns['rejected']}, kutish tugadi {ns['timed_out']}"
+    )
+    cs = cheklov.stats()
+    qatorlar.append(
+        f"\n<b>cheklov</b>: bajarilmoqda {cs['active']}/{cs['concurrency']}, navbatda {cs['waiting']}\n"
+        f"  kutgan: {cs['throttled']}, tashlab yuborilgan: {cs['shed']}, ogohlantirish: {cs['notices']}"
+    )
+    ys = yuborish_navbati.stats()
+    qatorlar.append(
+        f"\n<b>yuborish</b>: javoblar {ys['sent_interactive']} (navbatda {ys['waiting_interactive']}, "
+        f"o'rtacha kutish {ys['avg_wait_interactive'] * 1000:.0f} ms)\n"
+        f"  reklama: {ys['sent_bulk']} (navbatda {ys['waiting_bulk']}, o'rtacha kutish {ys['avg_wait_bulk'] * 1000:.0f} ms)\n"
+        f"  RetryAfter: {bot.retry_after_errors}, to'xtashlar: {ys['pauses']}, "
+        f"qayta yuborishlar (maqsad 0): {metrika.SEND_FALLBACKS.total()}"
+    )
+    for turi, ms in api_metrikasi.stats().items():
+        qatorlar.append(f"\n{bold('API/' + turi)}: {ms['updates']} update, o'rtacha {ms['avg_calls']:.2f} chaqiruv, "
+                        f"maks. {ms['max_calls']}, ≤{api_metrikasi.target}: {ms['within_target']:.1%}")
+    ins = inline_keshi.stats()
+    qatorlar.append(f"\n<b>inline</b>: {ins['size']}/{ins['max_size']} javob, hit: {ins['hits']}, miss: {ins['misses']}, "
+                    f"prefiks: {ins['prefix_hits']}, hit-rate: {ins['hit_rate']:.1%}")
+    if lugat_indeksi is not None:
+        ls = lugat_indeksi.stats()
+        qatorlar.append(f"\n<b>lokal lug'at</b>: hit: {ls['hits']}, miss: {ls['misses']}, hit-rate: {ls['hit_rate']:.1%}")
+    xs = tarjima_xizmati.stats()
+    qatorlar.append(
+        f"\n<b>googletrans</b>: navbatda {xs['waiting']} (maks. {xs['max_waiting']}), "
+        f"bajarilmoqda {xs['in_flight']}/{xs['max_concurrency']}\n"
+        f"  chaqiruvlar: {xs['calls']}, timeout: {xs['timeouts']}, xatolik: {xs['errors']}\n"
+        f"  o'rtacha kutish: {xs['avg_wait'] * 1000:.1f} ms\n"
+        f"  til aniqlash: lokal {xs['local_detections']}, tarmoq {xs['remote_detections']}\n"
+        f"  birlashtirilgan so'rovlar: tarjima {xs['coalesced']}, ta'rif {dictionar.coalescing_stats()['coalesced']}\n"
+        f"  ro'yxatlar: bitta so'rovda {xs['batched']} qator, mos kelmadi {xs['batch_mismatches']}"
+    )
+    await message.reply("\n".join(qatorlar), reply_markup=admin_asosiy_kb)
+
+
 # 2. Admin tugmalari uchun handlerlar (holatni o'rnatadi)
 # "Reklama Yuborish" tugmasi bosilganda
 @dp.message_handler(lambda message: message.text == "📢 Reklama Yuborish", user_id=ADMIN_IDS, state=None)
@@ -337,14 +749,14 @@ async def reklama_yuborish_sorash(message: types.Message, state: FSMContext):
 @dp.message_handler(lambda message: message.text == "🔧 Kanal Sozlash", user_id=ADMIN_IDS, state=None)
 async def kanal_sozlash_sorash(message: types.Message, state: FSMContext):
     await state.set_state(AdminStates.kanal_id_kutish) # Kanal ID sini kutish holatiga o'tish
-    current_channel_info = f"Joriy kanal: `{JORIY_KANAL_ID}`" if JORIY_KANAL_ID else "Hozirda kanal belgilanmagan."
+    current_channel_info = f"Joriy kanal: {code(JORIY_KANAL_ID)}" if JORIY_KANAL_ID else "Hozirda kanal belgilanmagan."
     await message.reply(f"{current_channel_info}\n\nMajburiy a'zolik uchun kanal manzilini kiriting (@username yoki -ID):\n\nBekor qilish uchun /cancel.",
-                        reply_markup=ReplyKeyboardRemove(), parse_mode=ParseMode.MARKDOWN)
+                        reply_markup=ReplyKeyboardRemove())
 
 # "Kanalni O'chirish" tugmasi bosilganda
 @dp.message_handler(lambda message: message.text == "🗑 Kanalni O'chirish", user_id=ADMIN_IDS, state=None)
 async def kanal_ochirish_bajarish(message: types.Message, state: FSMContext): # state bu yerda ishlatilmaydi
-    global JORIY_KANAL_ID
+    global JORIY_KANAL_ID, AZOLIK_XABARI
     if not JORIY_KANAL_ID:
         await message.reply("❗️ Majburiy a'zolik uchun hech qanday kanal belgilanmagan.", reply_markup=admin_asosiy_kb)
         return
@@ -354,12 +766,14 @@ async def kanal_ochirish_bajarish(message: types.Message, state: FSMContext): #
     #     InlineKeyboardButton("Ha, o'chirilsin", callback_data="confirm_delete_channel"),
     #     InlineKeyboardButton("Yo'q", callback_data="cancel_delete_channel")
     # )
-    # await message.reply(f"`{JORIY_KANAL_ID}` kanalini majburiy a'zolikdan o'chirishga ishonchingiz komilmi?", reply_markup=confirm_kb)
+    # await message.reply(f"{code(JORIY_KANAL_ID)} kanalini majburiy a'zolikdan o'chirishga ishonchingiz komilmi?", reply_markup=confirm_kb)
     # Bu callback handlerni keyinroq qo'shish kerak bo'ladi
 
     # Hozircha to'g'ridan-to'g'ri o'chiramiz
     old_channel_id = JORIY_KANAL_ID
     JORIY_KANAL_ID = None # Xotiradagi ID ni tozalash
+    AZOLIK_XABARI = None
+    azolik_keshi.clear()
     deleted_from_file = False
     try:
         if os.path.exists(CHANNEL_CONFIG_FILE):
@@ -376,8 +790,8 @@ async def kanal_ochirish_bajarish(message: types.Message, state: FSMContext): #
 
     # Agar xotiradan va fayldan (yoki fayl yo'q bo'lsa) o'chirilgan bo'lsa
     if deleted_from_file and JORIY_KANAL_ID is None:
-         await message.reply(f"✅ Majburiy a'zolik funksiyasi o'chirildi (avvalgi kanal: `{old_channel_id}`).",
-                             reply_markup=admin_asosiy_kb, parse_mode=ParseMode.MARKDOWN)
+         await message.reply(f"✅ Majburiy a'zolik funksiyasi o'chirildi (avvalgi kanal: {code(old_channel_id)}).",
+                             reply_markup=admin_asosiy_kb)
     else:
          # Agar faylni o'chirishda xatolik bo'lsa
          await message.reply("❌ Majburiy a'zolikni o'chirishda xatolik yuz berdi. Log fayllarini tekshiring.",
@@ -395,64 +809,26 @@ async def admin_panelidan_chiqish(message: types.Message):
 # Reklama matnini kutish holatida xabar kelsa
 @dp.message_handler(state=AdminStates.reklama_matn_kutish, user_id=ADMIN_IDS, content_types=types.ContentType.TEXT)
 async def reklama_matnini_qabul_qilish(message: types.Message, state: FSMContext):
-    reklama_matni = message.text # Kelgan matnni olish
+    global reklama_taski
+    reklama_matni = message.html_text # Admin bergan formatlash (qalin, havola, ...) HTML ko'rinishida saqlanadi
     await state.finish() # Holatni tugatish
 
-    # Reklama yuborish logikasi (avvalgi kod bilan bir xil)
-    foydalanuvchi_idlar = get_foydalanuvchi_idlar()
-    if not foydalanuvchi_idlar:
+    # Bir vaqtda faqat bitta reklama yuboriladi
+    if reklama_taski and not reklama_taski.done():
+        await message.reply("⏳ Oldingi reklama hali yuborilmoqda. U tugagach qayta urinib ko'ring.", reply_markup=admin_asosiy_kb)
+        return
+
+    foydalanuvchi_soni = foydalanuvchilar_soni()
+    if not foydalanuvchi_soni:
         await message.reply("🚫 Foydalanuvchilar ro'yxati bo'sh.", reply_markup=admin_asosiy_kb)
         return
 
-    yuborildi = 0
-    xatolik = 0
-    # Yuborishdan oldin xabar berish
-    tasdiq_xabari = await message.reply(f"🚀 Reklama yuborish boshlanmoqda (jami {len(foydalanuvchi_idlar)} foydalanuvchiga)...",
+    # Yuborishdan oldin xabar berish (shu xabar jarayon davomida tahrirlanib boradi)
+    tasdiq_xabari = await message.reply(f"🚀 Reklama yuborish boshlanmoqda (jami {foydalanuvchi_soni} foydalanuvchiga)...",
                                         reply_markup=admin_asosiy_kb) # Admin panelini qayta ko'rsatish
-    start_time = asyncio.get_event_loop().time() # Boshlanish vaqti
-    broadcast_tasks = [] # Xabar yuborish tasklari uchun ro'yxat
-
-    # Har bir foydalanuvchiga xabar yuborish uchun asinxron task yaratish
-    for user_id in foydalanuvchi_idlar:
-        task = asyncio.create_task(xavfsiz_xabar_yuborish(user_id, reklama_matni, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True))
-        broadcast_tasks.append((user_id, task))
-        # Telegram limitlariga duch kelmaslik uchun pauza
-        if len(broadcast_tasks) % 25 == 0: # Har 25 ta xabardan keyin
-            await asyncio.sleep(1.1) # 1.1 soniya kutish
-
-    # Barcha tasklar tugashini kutish va natijalarni yig'ish
-    for user_id, task in broadcast_tasks:
-         try:
-            result = await task # Task natijasini olish (None yoki Message obyekti)
-            if result: yuborildi += 1 # Agar xabar yuborilgan bo'lsa
-            else: xatolik += 1 # Agar xatolik bo'lgan bo'lsa (blok, topilmadi va hokazo)
-         except Exception as task_e:
-             # Task bajarilishida kutilmagan xatolik bo'lsa
-             log.error(f"Reklama yuborish taskida xatolik (foydalanuvchi {user_id}): {task_e}")
-             xatolik += 1
-
-    # Yakuniy natijani hisoblash va xabar berish
-    end_time = asyncio.get_event_loop().time() # Tugash vaqti
-    duration = end_time - start_time # Sarflangan vaqt
-    try:
-        # Boshlang'ich xabarni tahrirlash
-        await tasdiq_xabari.edit_text(
-            f"✅ Reklama yuborish yakunlandi!\n\n"
-            f"👤 {yuborildi} yetkazildi.\n"
-            f"🚫 {xatolik} xatolik/blok.\n"
-            f"⏱ {duration:.2f}s."
-        )
-    except MessageNotModified: pass # Agar xabar o'zgarmagan bo'lsa (kamdan-kam holat)
-    except Exception as edit_e:
-        # Agar tahrirlashda xatolik bo'lsa, yangi xabar yuborish
-        log.error(f"Reklama statusini tahrirlashda xatolik: {edit_e}")
-        await message.reply(
-             f"✅ Reklama yuborish yakunlandi!\n"
-             f"👤 {yuborildi} yetkazildi.\n"
-             f"🚫 {xatolik} xatolik/blok.\n"
-             f"⏱ {duration:.2f}s.",
-             reply_markup=admin_asosiy_kb
-        )
+    # Yuborish fon rejimida: cheklangan ishchilar, umumiy tezlik limiti va diskka checkpoint bilan
+    job = reklama_xizmati.create_job(reklama_matni, message.chat.id, tasdiq_xabari.message_id)
+    reklama_taski = asyncio.create_task(reklama_xizmati.run(job))
 
 
 # Kanal ID sini kutish holatida xabar kelsa
@@ -491,23 +867,26 @@ async def kanal_idni_qabul_qilish(message: types.Message, state: FSMContext):
         # Kanal ID sini faylga saqlashga urinish
         if kanal_idni_saqlash(kanal_identifikatori):
             # Muvaffaqiyatli saqlansa, xabar berish
-            await message.reply(f"✅ Kanal muvaffaqiyatli o'rnatildi: `{JORIY_KANAL_ID}`",
-                                reply_markup=admin_asosiy_kb, parse_mode=ParseMode.MARKDOWN)
+            kanal_id = JORIY_KANAL_ID # Quyidagi await lar paytida kanal almashtirilishi mumkin
+            await message.reply(f"✅ Kanal muvaffaqiyatli o'rnatildi: {code(kanal_id)}",
+                                reply_markup=admin_asosiy_kb)
             # Bot kanalni topa olishini tekshirish
             try:
-                chat_info = await bot.get_chat(JORIY_KANAL_ID)
-                await message.reply(f"ℹ️ Bot '{chat_info.title}' ({JORIY_KANAL_ID}) kanalini topa oldi.",
+                chat_info = await bot.get_chat(kanal_id)
+                await message.reply(f"ℹ️ Bot '{escape(chat_info.title)}' ({escape(kanal_id)}) kanalini topa oldi.",
                                     reply_markup=admin_asosiy_kb)
+                # Yangi kanal uchun a'zolik xabarini oldindan tayyorlash (kanal qayta so'ralmaydi)
+                await azolik_xabarini_tayyorlash(kanal_id, chat_info)
             except Exception as e:
                  # Agar topa olmasa, ogohlantirish
-                 await message.reply(f"⚠️ Diqqat: Bot `{JORIY_KANAL_ID}` kanalini topa olmadi yoki ma'lumotlarini o'qiy olmadi. ID to'g'riligini va botning kanalda *admin* huquqi borligini tekshiring.\nXatolik: `{e}`",
-                                     reply_markup=admin_asosiy_kb, parse_mode=ParseMode.MARKDOWN)
+                 await message.reply(f"⚠️ Diqqat: Bot {code(kanal_id)} kanalini topa olmadi yoki ma'lumotlarini o'qiy olmadi. ID to'g'riligini va botning kanalda {bold('admin')} huquqi borligini tekshiring.\nXatolik: {code(e)}",
+                                     reply_markup=admin_asosiy_kb)
         else:
             # Saqlashda xatolik bo'lsa
             await message.reply("❌ Kanal ID sini saqlashda xatolik.", reply_markup=admin_asosiy_kb)
     else:
         # Agar kiritilgan format noto'g'ri bo'lsa
-        await message.reply("❗️ Format xato. Kanal manzilini `@username`, `-100...` yoki `https://t.me/...` ko'rinishida kiriting.\n\nQaytadan urinib ko'ring yoki /cancel.",
+        await message.reply(KANAL_FORMATI_XATO,
                             reply_markup=ReplyKeyboardRemove()) # Klaviatura yopiqligicha qoladi
 
 
@@ -521,29 +900,7 @@ async def yordam_yuborish(message: types.Message):
         await azolik_xabarini_yuborish(message.chat.id)
         return
 
-    # Yordam matni
-    yordam_matni = (
-        "📖 *FOYDALANISH QO‘LLANMASI* 🚀\n\n"
-        "🔹 Ingliz yoki o‘zbek tilidagi so‘z yoki iborani yuboring.\n"
-        "🔹 Bot sizga quyidagilarni taqdim etadi:\n"
-        "  ✅ *Tarjima* (o‘zbekcha <> inglizcha)\n"
-        "  ✅ *Ta’rif* (inglizcha so'zlar uchun)\n"
-        "  ✅ *Fonetika* (inglizcha so'zlar uchun)\n"
-        "  ✅ 🔊 *Talaffuz* (audio, agar mavjud bo‘lsa)\n\n"
-        "💡 *Misol:*\n"
-        "   Yuboring: `apple`\n"
-        "   Bot javobi:\n"
-        "   `en -> uz Tarjimasi:`\n"
-        "   `olma`\n\n"
-        "   `📖 So'z: apple`\n"
-        "   `🔊 Fonetika: /ˈæp.əl/`\n"
-        "   `📚 Ta'riflar:`\n"
-        "   `👉 The round fruit of a tree of the rose family...`\n"
-        "   _(Audio fayl ham yuboriladi)_ \n\n"
-        "📌 Til o‘rganish – muvaffaqiyat kaliti!"
-    )
-    # Yordam matnini yuborish (klaviaturani olib tashlash bilan)
-    await xavfsiz_xabar_yuborish(message.chat.id, yordam_matni, parse_mode=ParseMode.MARKDOWN, reply_markup=ReplyKeyboardRemove())
+    await xavfsiz_xabar_yuborish(message.chat.id, YORDAM_MATNI, reply_markup=ReplyKeyboardRemove())
     # Foydalanuvchiga asosiy klaviaturani qayta ko'rsatish
     await asyncio.sleep(0.5) # Kichik pauza
     await message.answer("Asosiy menyu:", reply_markup=oddiy_foydalanuvchi_kb)
@@ -558,8 +915,8 @@ async def statistika_korish(message: types.Message):
         return
 
     # Statistika olish va yuborish
-    foydalanuvchi_soni = len(get_foydalanuvchi_idlar())
-    await xavfsiz_xabar_yuborish(message.chat.id, f"📊 Botimizdan jami foydalanuvchilar soni: *{foydalanuvchi_soni}* nafar.")
+    foydalanuvchi_soni = foydalanuvchilar_soni()
+    await xavfsiz_xabar_yuborish(message.chat.id, f"📊 Botimizdan jami foydalanuvchilar soni: {bold(foydalanuvchi_soni)} nafar.")
 
 
 # 5. Callback Query Handler (inline tugmalar uchun, holatdan mustaqil)
@@ -573,8 +930,8 @@ async def azolikni_tekshirish_callback(callback_query: types.CallbackQuery, stat
     # Foydalanuvchiga kutish haqida bildirish (tugma bosilganda kichik xabar)
     await bot.answer_callback_query(callback_query.id, "Tekshirilmoqda...")
 
-    # A'zolikni tekshirish
-    if await azolikni_tekshirish(user_id):
+    # A'zolikni tekshirish (keshdagi eski "a'zo emas" natijasiga qaramasdan)
+    if await azolikni_tekshirish(user_id, yangilash=True):
         # Agar a'zo bo'lsa
         await xavfsiz_xabar_yuborish(chat_id, "✅ Rahmat! Kanalga a'zo bo'lgansiz.\nEndi botdan foydalanishingiz mumkin.")
         # A'zolik so'ralgan xabarni o'chirish
@@ -603,6 +960,19 @@ async def azolikni_tekshirish_callback(callback_query: types.CallbackQuery, stat
         await bot.answer_callback_query(callback_query.id, "❌ Hali kanalga a'zo bo'lmadingiz yoki a'zoligingizni tekshira olmadim. Qaytadan urinib ko'ring.", show_alert=True)
 
 
+# Kanal a'zoligi o'zgarganda (qo'shildi/chiqdi) keshdagi natijani bekor qilish
+# Bot kanalda admin bo'lsa va polling da "chat_member" yangilanishlari so'ralsa ishlaydi
+@dp.chat_member_handler()
+async def azolik_ozgarganda(update: types.ChatMemberUpdated):
+    if not JORIY_KANAL_ID:
+        return
+    chat = update.chat
+    if str(chat.id) == JORIY_KANAL_ID or (chat.username and JORIY_KANAL_ID.lower() == f"@{chat.username.lower()}"):
+        azolik_keshi.delete(azolik_kaliti(update.new_chat_member.user.id))
+        log.debug(f"A'zolik keshi yangilandi: foydalanuvchi {update.new_chat_member.user.id}, "
+                  f"status {update.old_chat_member.status} -> {update.new_chat_member.status}")
+
+
 # 6. Umumiy Matn Handleri ENG OXIRIDA (va hech qanday holatda bo'lmaganda)
 # Qolgan barcha matnli xabarlarni qabul qiladi
 @dp.message_handler(content_types=types.ContentType.TEXT, state=None) # state=None - FSM holatida bo'lmaganda
@@ -625,130 +995,483 @@ async def matn_qayta_ishlash(message: types.Message):
         await azolik_xabarini_yuborish(chat_id)
         return
 
-    # Tarjima va ta'rif logikasi (o'zgarishsiz)
-    qayta_ishlash_xabari = None # "Izlanmoqda..." xabarini saqlash uchun
+    # Yuklanish nazorati: bir vaqtda cheklangan sonli xabar qayta ishlanadi, qolganlari navbatda kutadi
+    rejim = await matn_navbati.acquire()
+    if rejim is None: # Navbat to'la yoki kutish vaqti tugadi
+        await xavfsiz_xabar_yuborish(chat_id, "⏳ Bot hozir juda band. Iltimos, birozdan keyin qayta urinib ko'ring.",
+                                     reply_to_message_id=message.message_id)
+        return
     try:
-        # Tilni aniqlash
-        try:
-            detected = translator.detect(text)
-            lang = detected.lang
-            if not lang or lang == 'und' or lang not in LANGUAGES: # Agar aniqlanmasa yoki qo'llab-quvvatlanmasa
-                 lang = 'en' # Inglizcha deb hisoblash
-                 log.warning(f"Til aniqlanmadi yoki qo'llab-quvvatlanmaydi ('{detected.lang}'). 'en' deb qabul qilinmoqda.")
-        except Exception as detect_err:
-            log.error(f"Tilni aniqlashda xatolik: {detect_err}. 'en' deb qabul qilinmoqda.")
-            lang = 'en' # Xatolik bo'lsa ham inglizcha deb olish
-
-        # Tarjima qilinadigan tilni tanlash
-        dest = "uz" if lang == "en" else "en"
-
-        # Tarjima qilish
-        try:
-            translation_result = translator.translate(text, dest=dest, src=lang)
-            tarjima = translation_result.text
-            # Agar tarjima asl matndan farq qilsa, yuborish
-            if text.strip().lower() != tarjima.strip().lower():
-                await xavfsiz_xabar_yuborish(chat_id, f"*{lang}* → *{dest}* Tarjimasi:\n`{tarjima}`", reply_to_message_id=message.message_id)
-            else:
-                 # Agar bir xil bo'lsa (masalan, raqamlar, ismlar)
-                 log.info(f"Tarjima asl matnga o'xshash, tarjima xabari yuborilmadi: '{text}'")
-                 # Bu yerda ta'rif qidirish kerakmi? Hozircha shart emas.
-        except Exception as translate_err:
-             log.error(f"Tarjima qilishda xatolik (googletrans): {translate_err}. Matn: {text[:50]}")
-             await xavfsiz_xabar_yuborish(chat_id, "❗️ Tarjima qilishda xatolik yuz berdi.", reply_to_message_id=message.message_id)
-             return # Tarjima qila olmasak, davom etmaymiz
-
-        # Ta'rif va talaffuz qidirish (faqat bitta so'z bo'lsa va inglizcha bo'lsa)
-        izlanadigan_soz = None
-        # Agar asl matn inglizcha va bitta so'z bo'lsa
-        if lang == 'en' and len(text.split()) == 1 and text.isalpha(): # isalpha() faqat harflardan iboratligini tekshiradi
-            izlanadigan_soz = text.lower()
-        # Agar o'zbekchadan inglizchaga tarjima qilingan bo'lsa va natija bitta so'z bo'lsa
-        elif dest == 'en' and tarjima and len(tarjima.split()) == 1 and tarjima.isalpha():
-            izlanadigan_soz = tarjima.lower()
-
-        # Agar ta'rif izlash uchun so'z topilsa
-        if izlanadigan_soz:
-            # "Izlanmoqda" xabarini yuborish
-            qayta_ishlash_xabari = await xavfsiz_xabar_yuborish(chat_id, f"`{izlanadigan_soz}` uchun ta'rif va talaffuz izlanmoqda...",
-                                                                reply_markup=ReplyKeyboardRemove(), parse_mode=ParseMode.MARKDOWN)
+        # Navbatda uzoq kutgan xabarlarga faqat tarjima beriladi (ta'rif va audiosiz), navbat tezroq bo'shaydi
+        satrlar = royxat_satrlari(text)
+        if len(satrlar) > 1: # Ko'p qatorli so'zlar ro'yxati: bitta tarjima so'rovi, sahifalangan lug'at
+            await royxatga_javob_berish(message, satrlar, tarif_bilan=rejim == AdmissionController.FULL)
+        else:
+            await matnga_javob_berish(message, text, tarif_bilan=rejim == AdmissionController.FULL)
+    finally:
+        matn_navbati.release()
+
+
+async def matnga_javob_berish(message: types.Message, text: str, tarif_bilan: bool = True):
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    # Tarjima va ta'rif logikasi: natija bitta xabarda (audio bo'lsa, uning izohida) yuboriladi
+    kb = admin_asosiy_kb if user_id in ADMIN_IDS else oddiy_foydalanuvchi_kb
+    try:
+        # Javob tez tayyor bo'lsa (kesh) "yozmoqda..." ham yuborilmaydi
+        async with chat_action_after(bot, chat_id, delay=YOZMOQDA_KECHIKISHI):
+            # Tilni aniqlash
             try:
-                # dictionar.py dagi funksiyani chaqirish (bloklanmaslik uchun executor da)
-                loop = asyncio.get_running_loop()
-                lookup_json_str = await loop.run_in_executor(None, get_definitions, izlanadigan_soz, 5) # 5 sekund timeout
-                lookup = json.loads(lookup_json_str) # Natijani JSON dan dict ga o'tkazish
-
-                # "Izlanmoqda" xabarini o'chirish (agar yuborilgan bo'lsa)
-                if qayta_ishlash_xabari:
-                    try: await bot.delete_message(chat_id=chat_id, message_id=qayta_ishlash_xabari.message_id)
-                    except Exception as del_err: log.warning(f"Qayta ishlash xabarini ({qayta_ishlash_xabari.message_id}) o'chirib bo'lmadi: {del_err}")
-
-                # Agar natija muvaffaqiyatli va xatoliksiz bo'lsa
-                if lookup and isinstance(lookup, dict) and "error" not in lookup:
-                    fonetika_matni = lookup.get("phonetic", "_Mavjud emas_")
-                    tariflar_list = lookup.get("definitions", [])
-                    # Ta'riflarni formatlash
-                    tariflar_matni = "\n".join([f"🔹 {t}" for t in tariflar_list]) if tariflar_list else "_Ta'riflar topilmadi._"
-
-                    # Yakuniy javobni yig'ish
-                    javob_qismlari = [
-                        f"📖 So'z: `{izlanadigan_soz}`",
-                        f"🔊 Fonetika: {fonetika_matni}",
-                        f"\n📚 Ta'riflar:\n{tariflar_matni}"
-                    ]
-                    javob = "\n".join(javob_qismlari)
-                    await xavfsiz_xabar_yuborish(chat_id, javob, parse_mode=ParseMode.MARKDOWN)
-
-                    # Agar audio linki bo'lsa, audioni yuborish
-                    if lookup.get("audio"):
-                        audio_url = lookup["audio"]
-                        try:
-                            log.info(f"Audio yuborilmoqda: {audio_url} ({izlanadigan_soz} uchun)")
-                            await bot.send_chat_action(chat_id, types.ChatActions.UPLOAD_VOICE) # "Audio yozilmoqda..." statusi
-                            await bot.send_voice(chat_id, audio_url, caption=f"`{izlanadigan_soz}` talaffuzi", parse_mode=ParseMode.MARKDOWN)
-                        except Exception as audio_err:
-                            log.warning(f"Audio ({audio_url}) yuborishda xatolik ('{izlanadigan_soz}' uchun): {audio_err}")
-                            # Audio yuborishda xatolik bo'lsa, shunchaki log qilish yetarli
-                            # await xavfsiz_xabar_yuborish(chat_id, "_(Audio faylni yuborishda xatolik yuz berdi.)_")
-                else: # Agar ta'rif topilmasa yoki API da xatolik bo'lsa
-                    error_msg = lookup.get("error", "Noma'lum sabab") if isinstance(lookup, dict) else "API dan javob kelmadi"
-                    log.info(f"'{izlanadigan_soz}' uchun ta'rif topilmadi: {error_msg}")
-                    # Agar tarjimasi yuqorida ko'rsatilgan bo'lsa, qo'shimcha xabar berish
-                    if text.strip().lower() != tarjima.strip().lower():
-                         await xavfsiz_xabar_yuborish(chat_id, f"✅ Tarjimasi yuqorida ko'rsatildi.\n\nℹ️ Qo'shimcha ma'lumot (`{izlanadigan_soz}` uchun ta'rif/fonetika) topilmadi.")
-                    else: # Agar tarjima ham bo'lmagan bo'lsa (asl matnga o'xshash bo'lsa)
-                        await xavfsiz_xabar_yuborish(chat_id, f"ℹ️ `{izlanadigan_soz}` uchun tarjima, ta'rif yoki fonetika topilmadi.")
-
-            except json.JSONDecodeError as json_err:
-                 # Agar get_definitions dan kelgan javob JSON bo'lmasa
-                 log.error(f"get_definitions dan kelgan JSON ni decode qilishda xatolik ('{izlanadigan_soz}' uchun): {json_err}. Javob: {lookup_json_str[:200]}")
-                 if qayta_ishlash_xabari:
-                    try: await bot.delete_message(chat_id=chat_id, message_id=qayta_ishlash_xabari.message_id)
-                    except Exception: pass
-                 await xavfsiz_xabar_yuborish(chat_id,"❗️ Ta'rif ma'lumotlarini qayta ishlashda xatolik.")
-            except Exception as e_def:
-                # Boshqa kutilmagan xatoliklar
-                log.error(f"Ta'rifni qayta ishlashda xatolik ('{izlanadigan_soz}' uchun): {e_def}\n{traceback.format_exc()}")
-                if qayta_ishlash_xabari:
-                    try: await bot.delete_message(chat_id=chat_id, message_id=qayta_ishlash_xabari.message_id)
-                    except Exception: pass
-                await xavfsiz_xabar_yuborish(chat_id, "❗️ Ta'riflarni olishda kutilmagan xatolik yuz berdi.")
-            finally:
-                 # Ta'rif izlash tugagach (xatolik bo'lsa ham), foydalanuvchiga mos klaviaturani qaytarish
-                 kb_to_show = oddiy_foydalanuvchi_kb
-                 if user_id in ADMIN_IDS: kb_to_show = admin_asosiy_kb
-                 await message.answer("Asosiy menyu:", reply_markup=kb_to_show)
+                detected_lang = await tarjima_xizmati.detect(text)
+                lang = detected_lang
+                if not lang or lang == 'und' or lang not in LANGUAGES: # Agar aniqlanmasa yoki qo'llab-quvvatlanmasa
+                     lang = 'en' # Inglizcha deb hisoblash
+                     log.warning(f"Til aniqlanmadi yoki qo'llab-quvvatlanmaydi ('{detected_lang}'). 'en' deb qabul qilinmoqda.")
+            except Exception as detect_err:
+                log.error(f"Tilni aniqlashda xatolik: {detect_err}. 'en' deb qabul qilinmoqda.")
+                lang = 'en' # Xatolik bo'lsa ham inglizcha deb olish
+
+            # Tarjima qilinadigan tilni tanlash
+            dest = "uz" if lang == "en" else "en"
+
+            # Ta'rif va talaffuz qidirish (faqat bitta so'z bo'lsa va inglizcha bo'lsa)
+            izlanadigan_soz = None
+            tarif_taski = None
+            # Agar asl matn inglizcha va bitta so'z bo'lsa: kalit oldindan ma'lum, ta'rif tarjima bilan parallel olinadi
+            if tarif_bilan and lang == 'en' and len(text.split()) == 1 and text.isalpha(): # isalpha() faqat harflardan iboratligini tekshiradi
+                izlanadigan_soz = text.lower()
+                tarif_taski = asyncio.create_task(tarif_olish(izlanadigan_soz))
+
+            # Tarjima qilish (xizmat avval keshdan qidiradi)
+            try:
+                tarjima = await tarjima_xizmati.translate(text, dest=dest, src=lang)
+            except Exception as translate_err:
+                 log.error(f"Tarjima qilishda xatolik (googletrans): {translate_err}. Matn: {text[:50]}")
+                 if tarif_taski:
+                     tarif_taski.cancel()
+                 await xavfsiz_xabar_yuborish(chat_id, "❗️ Tarjima qilishda xatolik yuz berdi.", reply_to_message_id=message.message_id,
+                                              reply_markup=bot.keyboard_if_changed(chat_id, kb))
+                 return # Tarjima qila olmasak, davom etmaymiz
+
+            sorovni_yozish(text, lang, dest)
+
+            # Agar o'zbekchadan inglizchaga tarjima qilingan bo'lsa va natija bitta so'z bo'lsa (kalit faqat endi ma'lum)
+            if tarif_bilan and not izlanadigan_soz and dest == 'en' and tarjima and len(tarjima.split()) == 1 and tarjima.isalpha():
+                izlanadigan_soz = tarjima.lower()
+                tarif_taski = asyncio.create_task(tarif_olish(izlanadigan_soz))
+
+            tarjima_farqli = text.strip().lower() != tarjima.strip().lower()
+            if not tarjima_farqli:
+                # Agar bir xil bo'lsa (masalan, raqamlar, ismlar)
+                log.info(f"Tarjima asl matnga o'xshash, tarjima qismi qo'shilmadi: '{text}'")
+
+            if tarif_taski and tarjima_farqli:
+                # Ta'rif qisqa vaqt ichida tayyor bo'lsa, tarjima bilan bitta xabarda yuboriladi;
+                # aks holda tarjima darhol yuboriladi, ta'rif esa tayyor bo'lganda alohida keladi
+                await asyncio.wait({tarif_taski}, timeout=TARIF_BIRLASHTIRISH_OYNASI)
+                if not tarif_taski.done():
+                    await javob_yuborish(message, tarjima_qismi(lang, dest, tarjima), kb)
+                    lookup = await tarif_taski
+                    await javob_yuborish(message, tarif_qismi(izlanadigan_soz, lookup, tarjima_farqli), kb,
+                                         izlanadigan_soz, lookup.audio if lookup is not None and lookup.ok else None)
+                    return
+            lookup = await tarif_taski if tarif_taski else None
+
+        # Javobni yig'ish
+        qismlar = []
+        if tarjima_farqli:
+            qismlar.append(tarjima_qismi(lang, dest, tarjima))
+        if izlanadigan_soz:
+            qismlar.append(tarif_qismi(izlanadigan_soz, lookup, tarjima_farqli))
+        if not qismlar:
+            return
+
+        audio_url = lookup.audio if lookup is not None and lookup.ok else None
+        await javob_yuborish(message, "\n\n".join(qismlar), kb, izlanadigan_soz, audio_url)
 
     except Exception as e_main: # Umumiy matnni qayta ishlashdagi eng tashqi xatolik ushlagich
         log.error(f"matn_qayta_ishlash da umumiy xatolik (foydalanuvchi {user_id}, matn '{text}'): {e_main}\n{traceback.format_exc()}")
-        if qayta_ishlash_xabari: # Agar "Izlanmoqda" xabari yuborilgan bo'lsa, o'chirish
-             try: await bot.delete_message(chat_id=chat_id, message_id=qayta_ishlash_xabari.message_id)
-             except Exception: pass
-        await xavfsiz_xabar_yuborish(chat_id, "🚫 Noma'lum xatolik yuz berdi. Iltimos, qayta urinib ko'ring yoki keyinroq harakat qiling.")
-        # Xatolikdan keyin ham klaviaturani ko'rsatish
-        kb_to_show = oddiy_foydalanuvchi_kb
-        if user_id in ADMIN_IDS: kb_to_show = admin_asosiy_kb
-        await message.answer("Asosiy menyu:", reply_markup=kb_to_show)
+        # Xatolikdan keyin ham klaviaturani ko'rsatish (agar foydalanuvchida bo'lmasa)
+        await xavfsiz_xabar_yuborish(chat_id, "🚫 Noma'lum xatolik yuz berdi. Iltimos, qayta urinib ko'ring yoki keyinroq harakat qiling.",
+                                     reply_markup=bot.keyboard_if_changed(chat_id, kb))
+
+
+# --- So'zlar ro'yxati (har qatorda bitta so'z yoki ibora) ---
+ROYXAT_BELGISI = re.compile(r"^\s*(?:[-–•*]|\d+[.)])\s*") # "1. apple", "- apple" kabi raqam/belgilar
+
+def royxat_satrlari(text: str) -> list:
+    # Bo'sh qatorlar, raqamlash belgilari va takrorlar olib tashlanadi, tartib saqlanadi
+    satrlar, korilgan = [], set()
+    for satr in text.splitlines():
+        satr = ROYXAT_BELGISI.sub("", satr).strip()
+        if satr and satr.lower() not in korilgan:
+            korilgan.add(satr.lower())
+            satrlar.append(satr)
+    return satrlar
+
+def yakka_soz(matn: str) -> bool:
+    return bool(matn) and len(matn.split()) == 1 and matn.isalpha()
+
+def royxat_qatori(soz: str, tarjima: str, lookup) -> str:
+    qator = f"• {bold(soz)} — {escape(tarjima)}" if tarjima and tarjima.lower() != soz.lower() else f"• {bold(soz)}"
+    if lookup is not None and lookup.ok:
+        if lookup.phonetic:
+            qator += f" {italic(lookup.phonetic)}"
+        if lookup.definitions:
+            tarif = lookup.definitions[0]
+            qator += f"\n    {escape(tarif if len(tarif) <= 120 else tarif[:117] + '...')}"
+    return qator
+
+def royxat_tugmalari(xabar_id: int, sahifa: int, jami: int):
+    if jami <= 1:
+        return None
+    tugmalar = []
+    if sahifa > 0:
+        tugmalar.append(InlineKeyboardButton("◀️", callback_data=f"royxat:{xabar_id}:{sahifa - 1}"))
+    tugmalar.append(InlineKeyboardButton(f"{sahifa + 1}/{jami}", callback_data=f"royxat:{xabar_id}:{sahifa}"))
+    if sahifa < jami - 1:
+        tugmalar.append(InlineKeyboardButton("▶️", callback_data=f"royxat:{xabar_id}:{sahifa + 1}"))
+    return InlineKeyboardMarkup().row(*tugmalar)
+
+async def royxatga_javob_berish(message: types.Message, satrlar: list, tarif_bilan: bool = True):
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    kb = admin_asosiy_kb if user_id in ADMIN_IDS else oddiy_foydalanuvchi_kb
+    qisqartirildi = len(satrlar) > ROYXAT_MAKS
+    satrlar = satrlar[:ROYXAT_MAKS]
+    try:
+        async with chat_action_after(bot, chat_id, delay=YOZMOQDA_KECHIKISHI):
+            # Til butun ro'yxat bo'yicha bir marta aniqlanadi
+            try:
+                lang = await tarjima_xizmati.detect("\n".join(satrlar))
+            except Exception as detect_err:
+                log.error(f"Ro'yxat tilini aniqlashda xatolik: {detect_err}. 'en' deb qabul qilinmoqda.")
+                lang = None
+            if not lang or lang == 'und' or lang not in LANGUAGES:
+                lang = 'en'
+            dest = "uz" if lang == "en" else "en"
+
+            # Inglizcha so'zlar ma'lum bo'lsa, ta'riflar tarjima bilan parallel olinadi (cheklangan parallellik)
+            tarif_taski = None
+            if tarif_bilan and lang == 'en':
+                inglizcha = [s.lower() if yakka_soz(s) else None for s in satrlar]
+                tarif_taski = asyncio.create_task(dictionar.get_definitions_many(
+                    [s for s in inglizcha if s], TARIF_SONI, concurrency=ROYXAT_TARIF_PARALLEL))
+
+            # Barcha qatorlar bitta so'rov bilan tarjima qilinadi (keshdagilar so'ralmaydi)
+            try:
+                tarjimalar = await tarjima_xizmati.translate_batch(satrlar, dest=dest, src=lang)
+            except Exception as translate_err:
+                log.error(f"Ro'yxatni tarjima qilishda xatolik: {translate_err}. Qatorlar: {len(satrlar)}")
+                if tarif_taski:
+                    tarif_taski.cancel()
+                await xavfsiz_xabar_yuborish(chat_id, "❗️ Tarjima qilishda xatolik yuz berdi.", reply_to_message_id=message.message_id,
+                                             reply_markup=bot.keyboard_if_changed(chat_id, kb))
+                return
+
+            for satr in satrlar:
+                sorovni_yozish(satr, lang, dest)
+
+            # O'zbekchadan inglizchaga: ta'rif kalitlari faqat tarjimadan keyin ma'lum
+            if tarif_bilan and dest == 'en':
+                inglizcha = [t.lower() if yakka_soz(t) else None for t in tarjimalar]
+                tarif_taski = asyncio.create_task(dictionar.get_definitions_many(
+                    [t for t in inglizcha if t], TARIF_SONI, concurrency=ROYXAT_TARIF_PARALLEL))
+            lookuplar = [None] * len(satrlar)
+            if tarif_taski:
+                natijalar = iter(await tarif_taski) # Faqat yakka inglizcha so'zlar uchun, tartib bo'yicha
+                lookuplar = [next(natijalar) if soz else None for soz in inglizcha]
+
+        qatorlar = [royxat_qatori(soz, tarjima, lookup) for soz, tarjima, lookup in zip(satrlar, tarjimalar, lookuplar)]
+        sahifalar_soni = (len(qatorlar) + ROYXAT_SAHIFA - 1) // ROYXAT_SAHIFA
+        sarlavha = f"📋 {bold(f'{lang} → {dest}')} so'zlar ro'yxati ({len(qatorlar)} ta)"
+        if qisqartirildi:
+            sarlavha += f"\n{italic(f'Faqat birinchi {ROYXAT_MAKS} ta qator tarjima qilindi.')}"
+        sahifalar = []
+        for i in range(sahifalar_soni):
+            qism = qatorlar[i * ROYXAT_SAHIFA:(i + 1) * ROYXAT_SAHIFA]
+            sahifalar.append(f"{sarlavha}\n\n" + "\n".join(qism))
+
+        if sahifalar_soni > 1:
+            # Keyingi sahifalar inline tugmalar orqali (xabar tahrirlanadi, yangi xabar yuborilmaydi)
+            royxat_sahifalari.set(f"{chat_id}:{message.message_id}", sahifalar)
+            reply_markup = royxat_tugmalari(message.message_id, 0, sahifalar_soni)
+        else:
+            reply_markup = bot.keyboard_if_changed(chat_id, kb)
+        await xavfsiz_xabar_yuborish(chat_id, sahifalar[0], reply_to_message_id=message.message_id, reply_markup=reply_markup)
+
+    except Exception as e_main:
+        log.error(f"Ro'yxatni qayta ishlashda xatolik (foydalanuvchi {user_id}, {len(satrlar)} qator): {e_main}\n{traceback.format_exc()}")
+        await xavfsiz_xabar_yuborish(chat_id, "🚫 Noma'lum xatolik yuz berdi. Iltimos, qayta urinib ko'ring yoki keyinroq harakat qiling.",
+                                     reply_markup=bot.keyboard_if_changed(chat_id, kb))
+
+
+# Ro'yxat sahifasini almashtirish ("◀️ ▶️" tugmalari)
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith("royxat:"), state="*")
+async def royxat_sahifasini_korsatish(callback_query: types.CallbackQuery):
+    chat_id = callback_query.message.chat.id
+    try:
+        _, xabar_id, sahifa = callback_query.data.split(":")
+        xabar_id, sahifa = int(xabar_id), int(sahifa)
+    except ValueError:
+        await bot.answer_callback_query(callback_query.id)
+        return
+    sahifalar = royxat_sahifalari.get(f"{chat_id}:{xabar_id}")
+    if sahifalar is None:
+        await bot.answer_callback_query(callback_query.id, "⌛️ Ro'yxat eskirgan. Uni qayta yuboring.", show_alert=True)
+        return
+    sahifa = max(0, min(sahifa, len(sahifalar) - 1))
+    try:
+        await bot.edit_message_text(sahifalar[sahifa], chat_id, callback_query.message.message_id,
+                                    reply_markup=royxat_tugmalari(xabar_id, sahifa, len(sahifalar)))
+    except MessageNotModified: pass # Joriy sahifa tugmasi bosildi
+    await bot.answer_callback_query(callback_query.id)
+
+
+# 7. Inline rejim: istalgan chatda "@bot so'z"
+# Har bir harf yangi inline so'rov bo'lib keladi: googletrans va lug'atga faqat foydalanuvchi
+# yozishdan to'xtagan (INLINE_KECHIKISHI davomida yangisi kelmagan) so'rovlar yetadi
+inline_oxirgi_sorov = {} # user_id -> kutilayotgan eng so'nggi keshsiz inline so'rov id si
+inline_sorovlar = metrika.REGISTRY.counter("bot_inline_queries_total", "Inline queries by outcome.", ("result",))
+
+async def inline_natijalarini_tayyorlash(soz: str) -> list:
+    # Natija: (tur, sarlavha, tavsif, HTML matn) lar ro'yxati; keshga shu ko'rinishda yoziladi
+    try:
+        lang = await tarjima_xizmati.detect(soz)
+    except Exception as detect_err:
+        log.error(f"Inline: tilni aniqlashda xatolik: {detect_err}. 'en' deb qabul qilinmoqda.")
+        lang = None
+    if not lang or lang == 'und' or lang not in LANGUAGES:
+        lang = 'en'
+    dest = "uz" if lang == "en" else "en"
+
+    izlanadigan_soz = soz if lang == 'en' and yakka_soz(soz) else None
+    tarif_taski = asyncio.create_task(tarif_olish(izlanadigan_soz)) if izlanadigan_soz else None
+    try:
+        tarjima = await tarjima_xizmati.translate(soz, dest=dest, src=lang)
+    except Exception:
+        if tarif_taski:
+            tarif_taski.cancel()
+        raise
+    sorovni_yozish(soz, lang, dest)
+    if not izlanadigan_soz and dest == 'en' and yakka_soz(tarjima):
+        izlanadigan_soz = tarjima.lower()
+        tarif_taski = asyncio.create_task(tarif_olish(izlanadigan_soz))
+
+    lookup = None
+    if tarif_taski:
+        try:
+            # Sekin lug'at inline javobni ushlab turmaydi; taski davom etib, keyingi so'rov uchun keshni to'ldiradi
+            lookup = await asyncio.wait_for(asyncio.shield(tarif_taski), timeout=INLINE_TARIF_KUTISH)
+        except asyncio.TimeoutError:
+            log.info(f"Inline: '{izlanadigan_soz}' ta'rifi {INLINE_TARIF_KUTISH} soniyada tayyor bo'lmadi, faqat tarjima beriladi.")
+
+    tarjima_matni = tarjima_qismi(lang, dest, tarjima)
+    natijalar = [("tarjima", f"{lang} → {dest}: {tarjima}", soz, tarjima_matni)]
+    if lookup is not None and lookup.ok:
+        tavsif = lookup.definitions[0] if lookup.definitions else (lookup.phonetic or "")
+        natijalar.append(("tarif", f"📖 {izlanadigan_soz} {lookup.phonetic or ''}".strip(), tavsif,
+                          tarjima_matni + "\n\n" + tarif_qismi(izlanadigan_soz, lookup, True)))
+    return natijalar
+
+def inline_maqolalar(kalit: str, natijalar: list) -> list:
+    return [types.InlineQueryResultArticle(
+                id=hashlib.md5(f"{kalit}:{tur}".encode("utf-8")).hexdigest(), # Bitta javobda takrorlanmas, 64 baytdan qisqa
+                title=sarlavha[:100], description=tavsif[:200],
+                input_message_content=types.InputTextMessageContent(matn, parse_mode=ParseMode.HTML))
+            for tur, sarlavha, tavsif, matn in natijalar]
+
+@dp.inline_handler(state="*")
+async def inline_sorov(inline_query: types.InlineQuery):
+    user_id = inline_query.from_user.id
+    soz = normalize_text(inline_query.query)[:INLINE_MAKS_UZUNLIK]
+    if len(soz) < 2:
+        await inline_query.answer([], cache_time=INLINE_KESH_VAQTI, switch_pm_text="Tarjima uchun so'z yozing",
+                                  switch_pm_parameter="inline")
+        return
+
+    natijalar = inline_keshi.get(soz)
+    if natijalar is None:
+        # Debounce: faqat keyinroq kelgan keshsiz so'rov eski kutib turganini bekor qiladi
+        # (keshdan darhol javob berilganlar kutayotgan so'rovga ta'sir qilmaydi).
+        # Yangi so'rov INLINE_KECHIKISHI davomida kelmasa, foydalanuvchi yozishdan to'xtagan hisoblanadi
+        inline_oxirgi_sorov[user_id] = inline_query.id
+        await asyncio.sleep(INLINE_KECHIKISHI)
+        if inline_oxirgi_sorov.get(user_id) != inline_query.id:
+            inline_sorovlar.inc("superseded")
+            return
+        del inline_oxirgi_sorov[user_id]
+
+    if not await azolikni_tekshirish(user_id):
+        await inline_query.answer([], cache_time=0, is_personal=True,
+                                  switch_pm_text="Avval kanalga a'zo bo'ling", switch_pm_parameter="azolik")
+        return
+
+    if natijalar is None:
+        try:
+            natijalar = await inline_natijalarini_tayyorlash(soz)
+        except Exception as e:
+            inline_sorovlar.inc("error")
+            log.error(f"Inline so'rovni qayta ishlashda xatolik ('{soz}'): {e}")
+            await inline_query.answer([], cache_time=5, is_personal=True)
+            return
+        inline_keshi.set(soz, natijalar)
+        inline_sorovlar.inc("answered")
+    else:
+        inline_sorovlar.inc("cached")
+
+    # Shu prefiks bilan boshlanadigan, allaqachon tayyor so'zlar ham taklif qilinadi (upstream chaqiruvisiz)
+    maqolalar = inline_maqolalar(soz, natijalar)
+    for kalit, boshqa in inline_keshi.with_prefix(soz, limit=6):
+        if kalit != soz:
+            maqolalar.extend(inline_maqolalar(kalit, boshqa[:1]))
+    # Kanal majburiy bo'lsa, Telegram javobni har bir foydalanuvchi uchun alohida keshlaydi
+    await inline_query.answer(maqolalar[:10], cache_time=INLINE_KESH_VAQTI, is_personal=bool(JORIY_KANAL_ID))
+
+
+# Handlerdagi kutilmagan xatoliklar: log qilinadi va update yakunlangan hisoblanadi
+# (shunda middleware lar, masalan cheklov, o'z post_process qismini bajaradi)
+@dp.errors_handler()
+async def xatoliklarni_ushlash(update: types.Update, exception: Exception):
+    log.error(f"Update {update.update_id} ni qayta ishlashda xatolik: {exception}\n{traceback.format_exc()}")
+    return True
+
+
+# --- Issiq start: so'rovlar jurnali, kesh surati va oldindan olish ---
+def sorovni_yozish(text: str, lang: str, dest: str):
+    # Faqat so'z va qisqa iboralar: ular takrorlanadi, uzun matnlar esa deyarli hech qachon
+    if sorov_jurnali is not None and len(text.split()) <= 3:
+        sorov_jurnali.record(AsyncTranslator.cache_key(text, lang, dest))
+
+def tarif_sozi(kalit: str, tarjima: str):
+    # Jurnal kalitidan ("en:uz:apple") ta'rifi olinadigan inglizcha so'z, bo'lmasa None
+    lang, dest, matn = kalit.split(":", 2)
+    if lang == "en" and yakka_soz(matn):
+        return matn
+    if dest == "en" and tarjima and yakka_soz(tarjima):
+        return tarjima.lower()
+    return None
+
+def kesh_suratini_saqlash():
+    # Eng mashhur so'rovlarning tarjima, ta'rif va audio file_id yozuvlari bitta JSON faylga
+    tarjimalar, tariflar, audiolar = {}, {}, {}
+    for kalit in sorov_jurnali.top(ISITISH_SONI):
+        tarjima = tarjima_keshi.get(kalit)
+        if tarjima is None:
+            continue
+        tarjimalar[kalit] = tarjima
+        soz = tarif_sozi(kalit, tarjima)
+        lookup = dictionar.cached_definitions(soz, TARIF_SONI) if soz else None
+        if lookup is not None and lookup.ok:
+            tariflar[soz] = lookup.to_dict()
+            file_id = audio_keshi.get_file_id(soz)
+            if file_id:
+                audiolar[soz] = file_id
+    save_snapshot(KESH_SURATI_FAYLI, {"tarjima": tarjimalar, "tarif": tariflar, "audio": audiolar})
+
+def kesh_suratini_yuklash():
+    # Upstream ga murojaatsiz: oldingi ishdan qolgan issiq yozuvlar keshlarga qaytariladi
+    surat = load_snapshot(KESH_SURATI_FAYLI, max_age=TARJIMA_KESH_TTL)
+    for kalit, tarjima in surat.get("tarjima", {}).items():
+        tarjima_keshi.set(kalit, tarjima)
+    for soz, data in surat.get("tarif", {}).items():
+        dictionar.prime_cache(soz, TARIF_SONI, dictionar.DefinitionResult.from_dict(data))
+    for soz, file_id in surat.get("audio", {}).items():
+        audio_keshi.set_file_id(soz, file_id)
+    if surat:
+        log.info(f"Kesh surati yuklandi: {len(surat.get('tarjima', {}))} tarjima, {len(surat.get('tarif', {}))} ta'rif, "
+                 f"{len(surat.get('audio', {}))} audio")
+
+async def sorovni_isitish(kalit: str):
+    lang, dest, matn = kalit.split(":", 2)
+    tarjima = await tarjima_xizmati.translate(matn, dest=dest, src=lang) # Keshda bo'lsa upstream ga bormaydi
+    soz = tarif_sozi(kalit, tarjima)
+    if soz:
+        await get_definitions_async(soz, TARIF_SONI)
+
+def isitish_kerak(kalit: str) -> bool:
+    tarjima = tarjima_keshi.get(kalit)
+    if tarjima is None:
+        return True
+    soz = tarif_sozi(kalit, tarjima)
+    return bool(soz) and dictionar.cached_definitions(soz, TARIF_SONI) is None
+
+async def mashhur_sorovlarni_isitish():
+    # Surat yuklangandan keyin ham keshda yo'q mashhur so'rovlar sekin (ISITISH_TEZLIGI) oldindan olinadi
+    kalitlar = [kalit for kalit in sorov_jurnali.top(ISITISH_SONI) if isitish_kerak(kalit)]
+    if kalitlar:
+        log.info(f"{len(kalitlar)} ta mashhur so'rov oldindan olinmoqda ({ISITISH_TEZLIGI}/s, maks. {ISITISH_VAQTI} s)...")
+        natija = await prefetch(kalitlar, sorovni_isitish, rate=ISITISH_TEZLIGI, deadline=ISITISH_VAQTI)
+        log.info(f"Oldindan olish tugadi: {natija}")
+    await dictionar.close_http() # Sessiya shu event loop ga bog'langan; polling o'zinikini ochadi
+
+
+# --- Metrikalar: mavjud stats() lar faqat so'ralganda (scrape) o'qiladi, asosiy yo'lga qo'shimcha yuk yo'q ---
+for kesh_obyekti in (tarjima_keshi, tarif_keshi, azolik_keshi, audio_keshi.file_ids, inline_keshi):
+    metrika.register_cache(kesh_obyekti)
+metrika.REGISTRY.add_stats("bot_translator", "googletrans worker pool (see tarjimon.AsyncTranslator.stats).", tarjima_xizmati.stats)
+metrika.REGISTRY.add_stats("bot_dictionary_singleflight", "Coalesced dictionary lookups.", dictionar.coalescing_stats)
+metrika.REGISTRY.add_stats("bot_throttling", "Per-user throttling (see cheklov.ThrottlingMiddleware.stats).", cheklov.stats)
+metrika.REGISTRY.add_stats("bot_send_scheduler", "Outbound message scheduler (see cheklov.SendScheduler.stats).",
+                           lambda: dict(yuborish_navbati.stats(), retry_after=bot.retry_after_errors))
+metrika.REGISTRY.add_stats("bot_text_admission", "matn_qayta_ishlash admission control.", matn_navbati.stats)
+metrika.REGISTRY.add_collector(lambda: (
+    (f"bot_api_calls_per_update_{field}", "Bot API calls caused by one update (see javob.ApiCallMetrics).", ("update",),
+     [((turi,), ms[field]) for turi, ms in api_metrikasi.stats().items()])
+    for field in ("avg_calls", "max_calls", "within_target")))
+if sorov_jurnali is not None:
+    metrika.REGISTRY.add_stats("bot_query_log", "Query-frequency log (see isitish.QueryLog.stats).", sorov_jurnali.stats)
+metrika.REGISTRY.add_stats("bot_users", "Registered users.", lambda: {"total": foydalanuvchilar_soni()})
+metrika_serveri = MetricsServer(host=METRIKA_HOST, port=METRIKA_PORT) if METRIKA_PORT else None
+
+
+# --- Bot ishga tushganda: kanal ma'lumotini tayyorlash va fon yangilashni boshlash ---
+async def bot_ishga_tushganda(dispatcher: Dispatcher):
+    global azolik_xabari_yangilash_taski, reklama_taski, foydalanuvchilar_yozish_taski
+    if metrika_serveri:
+        try:
+            await metrika_serveri.start()
+        except OSError as e:
+            log.error(f"Metrika serverini {METRIKA_HOST}:{METRIKA_PORT} da ishga tushirib bo'lmadi: {e}")
+    foydalanuvchilar_yozish_taski = asyncio.create_task(foydalanuvchilarni_davriy_yozish())
+    if JORIY_KANAL_ID:
+        try:
+            await azolik_xabarini_tayyorlash()
+        except Exception as e:
+            log.error(f"A'zolik xabarini oldindan tayyorlashda xatolik: {e}")
+    azolik_xabari_yangilash_taski = asyncio.create_task(azolik_xabarini_davriy_yangilash())
+    reklama_taski = asyncio.create_task(tugallanmagan_reklamalarni_davom_ettirish())
+
+
+# --- Bot to'xtaganda resurslarni yopish ---
+async def bot_toxtaganda(dispatcher: Dispatcher):
+    if azolik_xabari_yangilash_taski:
+        azolik_xabari_yangilash_taski.cancel()
+    if foydalanuvchilar_yozish_taski:
+        foydalanuvchilar_yozish_taski.cancel()
+    if reklama_taski and not reklama_taski.done():
+        reklama_taski.cancel() # Checkpoint saqlanadi, keyingi ishga tushishda davom ettiriladi
+        try: await reklama_taski
+        except (asyncio.CancelledError, Exception): pass
+    if metrika_serveri:
+        await metrika_serveri.stop()
+    tarjima_xizmati.close()
+    if sorov_jurnali is not None:
+        # Keshlar yopilishidan oldin: keyingi ishga tushish issiq boshlanadi
+        if KESH_SURATI_FAYLI:
+            try:
+                kesh_suratini_saqlash()
+            except Exception as e:
+                log.error(f"Kesh suratini saqlashda xatolik: {e}")
+        sorov_jurnali.close()
+    foydalanuvchilar.close()
+    tarjima_keshi.close()
+    await audio_keshi.close()
+    await yuborish_navbati.close()
+    dictionar.close_cache()
+    dictionar.close_local_index()
+    await dictionar.close_http()
+    log.info(f"Tarjima keshi yopildi: {tarjima_keshi.stats()}")
 
 
 # --- Skriptni Ishga Tushirish Nuqtasi ---
@@ -761,10 +1484,36 @@ if __name__ == "__main__":
         kanal_idni_yuklash() # Kanal ID sini fayldan yuklash
         if not JORIY_KANAL_ID:
             log.warning("!!! DIQQAT: Majburiy a'zolik kanali o'rnatilmagan. Kanalni o'rnatish uchun admin sifatida /admin buyrug'i -> 'Kanal Sozlash' tugmasidan foydalaning. !!!")
-        log.info("Polling boshlanmoqda...")
+        # Issiq start: oldingi ishdan qolgan kesh surati va mashhur so'rovlar polling boshlanishidan oldin tayyorlanadi
+        if sorov_jurnali is not None:
+            if KESH_SURATI_FAYLI:
+                kesh_suratini_yuklash()
+            try:
+                asyncio.get_event_loop().run_until_complete(mashhur_sorovlarni_isitish())
+            except Exception as e:
+                log.error(f"Mashhur so'rovlarni oldindan olishda xatolik: {e}")
+        # chat_member yangilanishlari standart holda kelmaydi, shuning uchun aniq so'raladi
+        ruxsat_etilgan_yangilanishlar = (types.AllowedUpdates.MESSAGE | types.AllowedUpdates.CALLBACK_QUERY
+                                        | types.AllowedUpdates.INLINE_QUERY | types.AllowedUpdates.CHAT_MEMBER)
         try:
-            # Botni ishga tushirish (yangi xabarlarni kutish)
-            executor.start_polling(dp, skip_updates=True) # skip_updates=True - bot offlayn bo'lgandagi xabarlarni o'tkazib yuboradi
+            if BOT_REJIMI == "webhook":
+                # Webhook rejimi: Telegram yangilanishlarni o'zi yuboradi, bot o'chiq paytdagilari ham saqlanadi
+                from webhook import WebhookServer
+                webhook_url = f"{WEBHOOK_HOST.rstrip('/')}{WEBHOOK_PATH}" if WEBHOOK_HOST else None
+                if not webhook_url:
+                    log.warning("WEBHOOK_HOST berilmagan: setWebhook chaqirilmaydi, mavjud webhook sozlamasi ishlatiladi.")
+                if not WEBHOOK_SECRET:
+                    log.warning("WEBHOOK_SECRET berilmagan: webhook so'rovlari tekshirilmaydi!")
+                log.info(f"Webhook server {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH} da ishga tushirilmoqda...")
+                WebhookServer(dp, webhook_url, WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                              queue_size=WEBHOOK_NAVBAT_HAJMI, workers=WEBHOOK_ISHCHILARI,
+                              allowed_updates=ruxsat_etilgan_yangilanishlar,
+                              on_startup=bot_ishga_tushganda, on_shutdown=bot_toxtaganda).run(WEBAPP_HOST, WEBAPP_PORT)
+            else:
+                log.info("Polling boshlanmoqda...")
+                # Botni ishga tushirish (yangi xabarlarni kutish)
+                executor.start_polling(dp, skip_updates=True, on_startup=bot_ishga_tushganda, on_shutdown=bot_toxtaganda,
+                                       allowed_updates=ruxsat_etilgan_yangilanishlar) # skip_updates=True - bot offlayn bo'lgandagi xabarlarni o'tkazib yuboradi
         except Exception as e:
             log.critical(f"Bot ishga tushishida yoki polling paytida kritik xatolik: {e}", exc_info=True)
         finally:
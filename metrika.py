@@ -0,0 +1,277 @@
+# metrika.py
+import bisect
+import contextlib
+import logging
+import time
+
+from aiohttp import web
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+log = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache-speed answers up to the slowest upstream timeouts
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels. Used from the event loop thread only."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> count
+
+    def inc(self, *labelvalues, amount=1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def total(self):
+        return sum(self._values.values())
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labelvalues, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, optionally split by labels.
+
+    `observe` is a bisect plus three increments, cheap enough for every
+    upstream call. Used from the event loop thread only.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values tuple -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labelvalues, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, [("le", _format_value(float(bound)))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(series[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """
+    Holds metrics and renders them in the Prometheus text format.
+
+    Besides counters and histograms, collectors can be registered: callables
+    invoked at scrape time that turn existing `stats()` dicts into gauges,
+    so components keep their own counters and pay nothing extra on the hot path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """
+        Args:
+            collect (callable): Returns an iterable of (name, documentation, labelnames, samples),
+                where samples is an iterable of (label values tuple, number); rendered as gauges.
+        """
+        self._collectors.append(collect)
+
+    def add_stats(self, prefix, documentation, stats, labels=()):
+        """
+        Exposes every numeric field of `stats()` as a gauge named `<prefix>_<field>`.
+
+        Args:
+            prefix (str): Metric name prefix, e.g. "bot_throttling".
+            documentation (str): Help text shared by the gauges.
+            stats (callable): Returns a dict, e.g. `ThrottlingMiddleware.stats`.
+            labels (tuple): Extra (name, value) label pairs, e.g. (("cache", "tarjima"),).
+        """
+        labelnames = tuple(name for name, _ in labels)
+        labelvalues = tuple(value for _, value in labels)
+
+        def collect():
+            for field, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield f"{prefix}_{field}", documentation, labelnames, [(labelvalues, value)]
+
+        self.add_collector(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        # Collectors may report the same gauge name for several label sets; group them
+        gauges = {}
+        for collect in self._collectors:
+            try:
+                for name, documentation, labelnames, samples in collect():
+                    entry = gauges.setdefault(name, (documentation, []))
+                    entry[1].extend((labelnames, labelvalues, value) for labelvalues, value in samples)
+            except Exception as e:
+                log.warning(f"Metrics collector {collect!r} failed: {e}")
+        for name, (documentation, samples) in gauges.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labelnames, labelvalues, value in samples:
+                lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DEPENDENCY_LATENCY = REGISTRY.histogram(
+    "bot_dependency_duration_seconds", "Latency of calls to external dependencies.", ("dependency",))
+DEPENDENCY_ERRORS = REGISTRY.counter(
+    "bot_dependency_errors_total", "Failed calls to external dependencies (errors and timeouts).", ("dependency",))
+HANDLER_LATENCY = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Time spent in each update handler.", ("handler",))
+BROADCAST_MESSAGES = REGISTRY.counter(
+    "bot_broadcast_messages_total", "Broadcast messages by outcome.", ("result",))
+SEND_FALLBACKS = REGISTRY.counter(
+    "bot_send_fallbacks_total", "Messages that had to be resent in a degraded form (target: zero).", ("reason",))
+
+
+def observe_dependency(dependency, seconds, error=False):
+    """Records one call to an external dependency."""
+    DEPENDENCY_LATENCY.observe(seconds, dependency)
+    if error:
+        DEPENDENCY_ERRORS.inc(dependency)
+
+
+@contextlib.contextmanager
+def track(dependency):
+    """Times the wrapped call to `dependency`; exceptions count as errors and are re-raised."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        observe_dependency(dependency, time.perf_counter() - started, error)
+
+
+def register_cache(cache):
+    """Exposes a kesh.TTLCache's counters and hit ratio, labelled by its name."""
+    REGISTRY.add_stats("bot_cache", "Cache counters (see kesh.TTLCache.stats).", cache.stats,
+                       labels=(("cache", cache.name),))
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Observes the duration of every message, callback, inline query and chat member handler by function name."""
+
+    def __init__(self, histogram=HANDLER_LATENCY):
+        super().__init__()
+        self.histogram = histogram
+
+    async def _start(self, data):
+        handler = current_handler.get(None)
+        data["_handler_timing"] = (getattr(handler, "__name__", "unknown"), time.perf_counter())
+
+    async def _stop(self, data):
+        timing = data.pop("_handler_timing", None)
+        if timing is not None:
+            self.histogram.observe(time.perf_counter() - timing[1], timing[0])
+
+    async def on_process_message(self, message, data: dict):
+        await self._start(data)
+
+    async def on_post_process_message(self, message, results, data: dict):
+        await self._stop(data)
+
+    async def on_process_callback_query(self, callback_query, data: dict):
+        await self._start(data)
+
+    async def on_post_process_callback_query(self, callback_query, results, data: dict):
+        await self._stop(data)
+
+    async def on_process_inline_query(self, inline_query, data: dict):
+        await self._start(data)
+
+    async def on_post_process_inline_query(self, inline_query, results, data: dict):
+        await self._stop(data)
+
+    async def on_process_chat_member(self, chat_member, data: dict):
+        await self._start(data)
+
+    async def on_post_process_chat_member(self, chat_member, results, data: dict):
+        await self._stop(data)
+
+
+class MetricsServer:
+    """Serves `GET /metrics` from a registry on a separate local port."""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9102):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def handle(self, request):
+        return web.Response(body=self.registry.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info(f"Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,234 @@
+# reklama.py
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+
+from cheklov import TokenBucket
+
+log = logging.getLogger(__name__)
+
+
+class BroadcastJob:
+    """
+    State of a single broadcast, mirrored to a checkpoint directory.
+
+    `<id>.json` holds the job description and `<id>.done` is an append-only
+    log of user IDs that were already processed (delivered or failed), so a
+    resumed job never sends to them again.
+    """
+
+    def __init__(self, job_id, text, admin_chat_id, status_message_id, checkpoint_dir, created=None):
+        self.job_id = job_id
+        self.text = text
+        self.admin_chat_id = admin_chat_id
+        self.status_message_id = status_message_id
+        self.created = created or time.time()
+        self.meta_path = os.path.join(checkpoint_dir, f"{job_id}.json")
+        self.done_path = os.path.join(checkpoint_dir, f"{job_id}.done")
+        self.done = set()
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0  # Already processed before a restart
+        self.started = time.monotonic()
+        self.finished = False
+        self._pending = []
+        self._log = None  # Append handle for done_path, kept open while the job runs
+
+    @property
+    def processed(self):
+        return self.sent + self.failed
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def save_meta(self):
+        meta = {
+            "job_id": self.job_id,
+            "text": self.text,
+            "admin_chat_id": self.admin_chat_id,
+            "status_message_id": self.status_message_id,
+            "created": self.created,
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    @classmethod
+    def load(cls, meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        job = cls(meta["job_id"], meta["text"], meta["admin_chat_id"], meta["status_message_id"],
+                  os.path.dirname(meta_path), created=meta.get("created"))
+        if os.path.exists(job.done_path):
+            with open(job.done_path, "r") as f:
+                # A torn last line after a crash is simply ignored
+                job.done = {int(line) for line in f if line.strip().isdigit()}
+        return job
+
+    def record(self, user_id, delivered):
+        self.done.add(user_id)
+        self._pending.append(user_id)
+        if delivered:
+            self.sent += 1
+        else:
+            self.failed += 1
+        # Written straight away so a crash never loses a delivered ID (and resends to that user)
+        self.flush()
+
+    def flush(self):
+        """Appends processed IDs to the checkpoint log; IDs from a failed write are retried next time."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            if self._log is None:
+                self._log = open(self.done_path, "a")
+            self._log.write("".join(f"{user_id}\n" for user_id in pending))
+            self._log.flush()  # Handed to the OS, so it survives a crash of the bot process
+        except OSError as e:
+            log.error(f"Broadcast {self.job_id}: could not write checkpoint: {e}")
+            self._pending = pending + self._pending
+            self.close()  # Reopened on the next attempt
+
+    def close(self):
+        """Closes the checkpoint log handle."""
+        if self._log is not None:
+            try:
+                self._log.close()
+            except OSError as e:
+                log.warning(f"Broadcast {self.job_id}: could not close checkpoint: {e}")
+            self._log = None
+
+    def remove_files(self):
+        self.close()
+        for path in (self.meta_path, self.done_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning(f"Broadcast {self.job_id}: could not remove {path}: {e}")
+
+
+class Broadcaster:
+    """
+    Sends a message to every user with bounded concurrency and a global rate limit.
+
+    A producer streams user IDs into a small queue that a fixed pool of
+    workers drains, so memory stays flat regardless of the number of users.
+    Progress is checkpointed to disk and unfinished jobs can be resumed after
+    a restart with pending_jobs().
+    """
+
+    def __init__(self, send, user_ids, report=None, rate=25.0, workers=8,
+                 checkpoint_dir="reklama_holati", progress_interval=5.0):
+        """
+        Args:
+            send (coroutine function): `send(user_id, text)`; returns a truthy
+                value if the message was delivered.
+            user_ids (callable): Returns an iterable of all user IDs to send to.
+            report (coroutine function | None): `report(job)` called
+                periodically and once more when the job finishes.
+            rate (float): Global messages per second (Telegram allows ~30).
+            workers (int): Number of concurrent senders.
+            checkpoint_dir (str): Directory for checkpoint files.
+            progress_interval (float): Seconds between progress reports.
+        """
+        self.send = send
+        self.user_ids = user_ids
+        self.report = report
+        self.bucket = TokenBucket(rate, capacity=max(1.0, rate / 5))  # Small burst to keep the pace smooth
+        self.workers = workers
+        self.checkpoint_dir = checkpoint_dir
+        self.progress_interval = progress_interval
+        self.current = None
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    @property
+    def busy(self):
+        return self.current is not None and not self.current.finished
+
+    def create_job(self, text, admin_chat_id, status_message_id):
+        """Creates and checkpoints a new job; start it with run()."""
+        job = BroadcastJob(uuid.uuid4().hex[:12], text, admin_chat_id, status_message_id, self.checkpoint_dir)
+        job.save_meta()
+        return job
+
+    def pending_jobs(self):
+        """Loads unfinished jobs left behind by a previous run, oldest first."""
+        jobs = []
+        for name in os.listdir(self.checkpoint_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                jobs.append(BroadcastJob.load(os.path.join(self.checkpoint_dir, name)))
+            except (OSError, ValueError, KeyError) as e:
+                log.error(f"Could not load broadcast checkpoint {name}: {e}")
+        return sorted(jobs, key=lambda job: job.created)
+
+    async def run(self, job):
+        """Runs `job` to completion, skipping users recorded in its checkpoint."""
+        self.current = job
+        job.started = time.monotonic()
+        queue = asyncio.Queue(maxsize=self.workers * 4)
+        log.info(f"Broadcast {job.job_id} started ({len(job.done)} users already processed).")
+
+        async def worker():
+            while True:
+                user_id = await queue.get()
+                try:
+                    if user_id is None:
+                        return
+                    await self.bucket.acquire()
+                    try:
+                        delivered = bool(await self.send(user_id, job.text))
+                    except Exception as e:
+                        log.error(f"Broadcast {job.job_id}: sending to {user_id} failed: {e}")
+                        delivered = False
+                    job.record(user_id, delivered)
+                finally:
+                    queue.task_done()
+
+        async def progress():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                job.flush()  # Retries IDs whose write failed earlier
+                await self._report(job)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        progress_task = asyncio.create_task(progress())
+        try:
+            for user_id in self.user_ids():
+                if user_id in job.done:
+                    job.skipped += 1
+                    continue
+                await queue.put(user_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            progress_task.cancel()
+            for task in workers:
+                task.cancel()
+            job.flush()
+            job.close()
+
+        job.finished = True
+        log.info(f"Broadcast {job.job_id} finished: {job.sent} sent, {job.failed} failed, {job.skipped} skipped.")
+        await self._report(job)
+        job.remove_files()
+        return job
+
+    async def _report(self, job):
+        if self.report is None:
+            return
+        try:
+            await self.report(job)
+        except Exception as e:
+            log.warning(f"Broadcast {job.job_id}: progress report failed: {e}")
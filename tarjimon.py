@@ -0,0 +1,211 @@
+# tarjimon.py
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrika
+from kesh import SingleFlight, normalize_text
+
+log = logging.getLogger(__name__)
+
+
+class AsyncTranslator:
+    """
+    Runs a synchronous googletrans `Translator` off the event loop.
+
+    Calls go to a dedicated, sized thread pool, so a slow Google response
+    only blocks a worker thread. At most `max_concurrency` calls run at once
+    and each call is given up after `timeout` seconds. Callers waiting for a
+    free slot are counted as the queue depth. Identical translations
+    requested while one is in flight share that call.
+    """
+
+    def __init__(self, translator, max_workers=8, max_concurrency=None, timeout=10.0, cache=None,
+                 local_detector=None, local_threshold=0.8):
+        """
+        Args:
+            translator: A googletrans `Translator` (or anything with the same
+                `detect(text)` / `translate(text, dest=, src=)` methods).
+            max_workers (int): Size of the dedicated thread pool.
+            max_concurrency (int | None): Maximum calls in flight (defaults to max_workers).
+            timeout (float): Per-call timeout in seconds.
+            cache (kesh.TTLCache | None): Optional translation cache.
+            local_detector (callable | None): Offline detector returning
+                (lang, confidence), e.g. `til_aniqlash.detect_language`.
+            local_threshold (float): Minimum local confidence needed to skip
+                the remote `detect` call.
+        """
+        self.translator = translator
+        self.timeout = timeout
+        self.cache = cache
+        self.local_detector = local_detector
+        self.local_threshold = local_threshold
+        self.max_concurrency = max_concurrency or max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tarjimon")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._inflight = SingleFlight("tarjima")
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.local_detections = 0
+        self.remote_detections = 0
+        self.batched = 0
+        self.batch_mismatches = 0
+
+    @staticmethod
+    def cache_key(text, src, dest):
+        """Cache key: normalized text plus source and destination languages."""
+        return f"{src}:{dest}:{normalize_text(text)}"
+
+    async def detect(self, text):
+        """
+        Detects the language of `text`.
+
+        The offline detector is tried first; the wrapped translator is only
+        called when it is missing or not confident enough.
+
+        Returns:
+            str | None: The detected language code.
+        """
+        if self.local_detector is not None:
+            lang, confidence = self.local_detector(text)
+            if lang and confidence >= self.local_threshold:
+                self.local_detections += 1
+                return lang
+        self.remote_detections += 1
+        detected = await self._run(self.translator.detect, text)
+        return detected.lang
+
+    async def translate(self, text, dest, src="auto"):
+        """
+        Translates `text` from `src` to `dest`, consulting the cache first.
+
+        Returns:
+            str: The translated text.
+        """
+        key = self.cache_key(text, src, dest)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                log.debug(f"Translation cache hit: '{key}'")
+                return cached
+
+        return await self._inflight.do(key, self._translate, key, text, dest, src)
+
+    async def translate_batch(self, texts, dest, src="auto"):
+        """
+        Translates several short texts (e.g. a pasted word list) with as few upstream calls as possible.
+
+        Cached items are answered locally; the rest are joined one per line
+        and sent as a single translation. If the result does not split back
+        into the same number of lines, the missing items are translated one
+        by one (concurrently, within the usual concurrency limit).
+
+        Returns:
+            list[str]: Translations in the order of `texts`.
+        """
+        results = [None] * len(texts)
+        missing = []
+        for i, text in enumerate(texts):
+            cached = self.cache.get(self.cache_key(text, src, dest)) if self.cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.append(i)
+        if not missing:
+            return results
+
+        if len(missing) > 1:
+            joined = "\n".join(texts[i].replace("\n", " ") for i in missing)
+            result = await self._run(self.translator.translate, joined, dest=dest, src=src)
+            lines = result.text.split("\n") if result.text else []
+            if len(lines) == len(missing):
+                self.batched += len(missing)
+                for i, line in zip(missing, lines):
+                    results[i] = line.strip()
+                    if self.cache is not None and results[i]:
+                        self.cache.set(self.cache_key(texts[i], src, dest), results[i])
+                return results
+            self.batch_mismatches += 1
+            log.warning(f"Batch translation returned {len(lines)} lines for {len(missing)} items, translating one by one")
+
+        translated = await asyncio.gather(*(self.translate(texts[i], dest, src) for i in missing))
+        for i, text in zip(missing, translated):
+            results[i] = text
+        return results
+
+    async def _translate(self, key, text, dest, src):
+        result = await self._run(self.translator.translate, text, dest=dest, src=src)
+        translated = result.text
+        if self.cache is not None and translated:
+            self.cache.set(key, translated)
+        return translated
+
+    async def _run(self, func, *args, **kwargs):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        queued_at = time.monotonic()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.total_wait += time.monotonic() - queued_at
+
+        self.in_flight += 1
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except RuntimeError:
+            self._release()  # Executor already shut down
+            raise
+        # The slot is held until the worker thread really finishes: a timed-out
+        # googletrans call keeps running, and new calls must not queue unseen behind it
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+        try:
+            with metrika.track(f"translator.{func.__name__}"):
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            log.warning(f"Translator call {func.__name__} timed out after {self.timeout}s")
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _release_threadsafe(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # The loop is closed; nothing is waiting for the slot any more
+
+    def stats(self):
+        """Returns queue depth, concurrency and error counters."""
+        return {
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_wait": self.total_wait / self.calls if self.calls else 0.0,
+            "local_detections": self.local_detections,
+            "remote_detections": self.remote_detections,
+            "coalesced": self._inflight.coalesced,
+            "batched": self.batched,
+            "batch_mismatches": self.batch_mismatches,
+        }
+
+    def close(self):
+        """Shuts down the worker pool without waiting for stuck calls."""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,272 @@
+# til_aniqlash.py
+import logging
+import math
+import re
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+# Small built-in training texts for the character n-gram profiles.
+# They only need to capture letter patterns, not vocabulary coverage.
+_EN_CORPUS = """
+the quick brown fox jumps over the lazy dog. what would you like to drink this morning?
+i think that we should go home now because it is getting late and the weather is cold.
+she was reading a book about history while her brother watched television in the kitchen.
+they have been working together for many years and they know each other very well.
+please write your name and address on this form and bring it back tomorrow.
+learning english is not difficult if you practice every day and listen carefully.
+where is the nearest station? how much does the ticket cost? which way should i walk?
+beautiful weather, strong coffee, bright light, thought, through, knowledge, question.
+children played with their friends in the garden after school while parents talked.
+the teacher explained the lesson and the students asked interesting questions.
+computer, window, country, people, because, family, little, government, different.
+important, information, education, development, company, something, everything.
+would could should might must shall will always never sometimes usually often.
+white yellow green black purple orange brown grey with without whether which who whose.
+running swimming walking talking reading writing thinking building meeting morning.
+nation station action condition position relation attention question mention.
+"""
+
+_UZ_CORPUS = """
+men bugun ertalab maktabga bordim va o'qituvchimiz bilan gaplashdim.
+bu kitob juda qiziqarli, uni o'qib chiqishingizni maslahat beraman.
+biz yozda qishloqqa boramiz, u yerda buvim va bobom yashaydi.
+siz qayerda ishlaysiz? men shaharda, katta kompaniyada ishlayman.
+o'zbekiston markaziy osiyoda joylashgan go'zal mamlakat hisoblanadi.
+bolalar hovlida o'ynashyapti, onam oshxonada ovqat tayyorlayapti.
+rahmat, yaxshi, qanday, nima, qachon, qayerda, nega, kim, qaysi, necha.
+ertaga havo sovuq bo'ladi, shuning uchun issiq kiyim kiyib oling.
+do'stlarim bilan choyxonada o'tirib, palov yedik va suhbatlashdik.
+ingliz tilini o'rganish uchun har kuni mashq qilish kerak.
+kitoblar, daftarlar, qalamlar, o'quvchilar, o'qituvchilar, maktablar.
+shaharning markazida yangi bog' qurildi, u yerda ko'plab daraxtlar bor.
+g'alaba, g'isht, tog', bog', o'g'il, qo'l, yo'l, so'z, ko'z, to'g'ri.
+ishlamoqda, o'qimoqda, yozmoqda, kelyapti, ketyapti, boryapman, kelganman.
+xonada, uyda, ishda, maktabdan, bozorga, shaharga, do'konga, ko'chada.
+olma, nok, uzum, qovun, tarvuz, non, suv, sut, go'sht, sabzi, piyoz.
+chiroyli, kichkina, katta, yangi, eski, qizil, sariq, yashil, oq, qora.
+yaxshimisiz, assalomu alaykum, xayr, kechirasiz, marhamat, albatta.
+"""
+
+_EN_WORDS = {
+    "the", "a", "an", "is", "are", "was", "were", "be", "been", "and", "or", "of", "to", "in",
+    "on", "at", "for", "with", "you", "i", "he", "she", "it", "we", "they", "this", "that",
+    "what", "how", "why", "where", "when", "who", "do", "does", "did", "have", "has", "not",
+    "my", "your", "can", "will", "would", "please", "thank", "thanks", "hello", "yes", "no",
+}
+_UZ_WORDS = {
+    "va", "bu", "u", "men", "sen", "siz", "biz", "ular", "bilan", "uchun", "emas", "yo'q", "ha",
+    "nima", "qanday", "qayerda", "nega", "kim", "qaysi", "salom", "rahmat", "yaxshi", "juda",
+    "ham", "lekin", "agar", "keyin", "hozir", "bor", "edi", "kerak", "mumkin", "xayr",
+}
+
+# Frequent short English words. Three letters give the trigram model almost
+# nothing to go on ("sun", "man" score as Uzbek), so these are decided by the
+# list; words that are also common Uzbek words ("men" = I) are left to the
+# remote detector.
+_EN_SHORT_WORDS = {
+    "sun", "man", "men", "day", "boy", "car", "bed", "bag", "pen", "cup", "hat", "map", "egg", "arm",
+    "leg", "eye", "ear", "son", "mom", "dad", "run", "sit", "eat", "big", "old", "new", "hot", "red",
+    "sea", "sky", "tea", "toy", "box", "key", "bus", "job", "way", "war", "law", "art", "age", "air",
+    "oil", "ice", "dog", "cat", "cow", "pig", "fox", "bee", "ant", "fly", "net", "top", "end", "one",
+    "two", "six", "ten", "yes", "fire", "tree", "home", "hand", "head", "face", "door", "room", "food",
+    "fish", "bird", "milk", "rain", "snow", "wind", "moon", "star", "road", "city", "king", "baby",
+    "girl", "game", "song", "word", "name", "time", "year", "life", "work", "love", "good", "bad",
+    "fast", "slow", "come", "go", "get", "make", "take", "give", "see", "look", "find", "want", "know",
+    "say", "tell", "ask", "kind", "book", "cold", "warm", "blue", "black", "white", "play", "read",
+    "sing", "walk", "talk", "open", "shop", "ship", "boat", "sand", "salt", "rice", "meat", "bread",
+}
+_SHORT_INPUT = 4  # Letters; shorter inputs without a spelling cue are never confident
+_SHORT_MAX_CONFIDENCE = 0.75
+_AMBIGUOUS_CONFIDENCE = 0.55
+# Average per-trigram log-likelihood the winning profile must reach to count as
+# evidence on its own. The en/uz score only compares the two languages, so a
+# French word or a place name still lands confidently on one side of it.
+_MIN_LOG_PROB = -6.75
+
+# Uzbek Latin writes o‘ and g‘ with several apostrophe look-alikes
+_APOSTROPHES = re.compile(r"[‘’ʻʼ`´]")
+_NON_LETTERS = re.compile(r"[^a-z' ]+")
+_NON_LATIN = re.compile(r"[^\x00-\x7f‘’ʻʼ´]")
+
+# (pattern, weight, distinctive); single letters also occur in other languages
+# and names (merci, Qatar), so only the distinctive cues count as evidence
+_UZ_PATTERNS = (
+    (re.compile(r"[og]'"), 3.0, True),        # o', g'
+    (re.compile(r"q(?!u)"), 1.5, False),      # q without a following u
+    (re.compile(r"(?:lar|ning|dagi|moq|yap|gan)\b"), 1.0, True),  # common suffixes
+    (re.compile(r"\bx"), 0.75, False),        # initial x (xona, xayr)
+)
+_EN_PATTERNS = (
+    (re.compile(r"w"), 2.0, False),           # w does not occur in Uzbek Latin
+    (re.compile(r"c(?!h)"), 2.0, False),      # c only appears in the ch digraph
+    (re.compile(r"th|wh|ph|ee|oo"), 1.0, True),
+    (re.compile(r"(?:ing|tion|ough)\b"), 1.0, True),
+)
+
+_NGRAM = 3
+_SMOOTHING = 0.5
+
+
+def _normalize(text):
+    text = _APOSTROPHES.sub("'", text.lower())
+    return " ".join(_NON_LETTERS.sub(" ", text).split())
+
+
+def _ngrams(text):
+    grams = []
+    for word in text.split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + _NGRAM] for i in range(len(padded) - _NGRAM + 1))
+    return grams
+
+
+class _Profile:
+    __slots__ = ("counts", "total", "vocab")
+
+    def __init__(self, corpus):
+        self.counts = Counter(_ngrams(_normalize(corpus)))
+        self.total = sum(self.counts.values())
+        self.vocab = len(self.counts)
+
+    def log_prob(self, grams):
+        denominator = self.total + _SMOOTHING * (self.vocab + 1)
+        return sum(math.log((self.counts.get(g, 0) + _SMOOTHING) / denominator) for g in grams)
+
+
+_PROFILES = {"en": _Profile(_EN_CORPUS), "uz": _Profile(_UZ_CORPUS)}
+
+
+def detect_language(text):
+    """
+    Decides whether `text` is English or Uzbek (Latin script) without any
+    network calls.
+
+    Combines a character trigram model with Uzbek/English spelling cues
+    (o‘, g‘, q without u, w, c outside "ch", -ing, -lar...) and common
+    function words. Frequent short English words are matched from a list.
+    Inputs of up to four letters with no spelling cue, and inputs with no
+    positive en/uz evidence (a distinctive spelling cue, a function word,
+    or a trigram likelihood high enough under the winning profile) get a
+    confidence below the default threshold, so other languages and proper
+    names go to the remote detector.
+
+    Args:
+        text (str): The text to classify.
+
+    Returns:
+        tuple[str | None, float]: ("en" | "uz", confidence in [0.5, 1.0]),
+            or (None, 0.0) if the text is not Latin-script English/Uzbek.
+    """
+    if not isinstance(text, str) or _NON_LATIN.search(text):
+        return None, 0.0
+    normalized = _normalize(text)
+    if not normalized.replace("'", "").strip():
+        return None, 0.0
+
+    words = normalized.split()
+    if len(words) == 1 and words[0] in _EN_SHORT_WORDS:
+        return "en", _AMBIGUOUS_CONFIDENCE if words[0] in _UZ_WORDS else 0.95
+
+    grams = _ngrams(normalized)
+    # Average per-trigram log-likelihood ratio, so long texts are not overconfident
+    score = (_PROFILES["uz"].log_prob(grams) - _PROFILES["en"].log_prob(grams)) / len(grams)
+
+    cues = 0
+    evidence = False
+    for patterns, sign in ((_UZ_PATTERNS, 1.0), (_EN_PATTERNS, -1.0)):
+        for pattern, weight, distinctive in patterns:
+            matches = len(pattern.findall(normalized))
+            cues += matches
+            evidence = evidence or (distinctive and matches > 0)
+            score += sign * weight * matches
+    for word in words:
+        if word in _UZ_WORDS:
+            cues += 1
+            evidence = True
+            score += 2.0
+        elif word in _EN_WORDS:
+            cues += 1
+            evidence = True
+            score -= 2.0
+
+    p_uz = 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, score))))
+    lang, confidence = ("uz", p_uz) if p_uz >= 0.5 else ("en", 1.0 - p_uz)
+    if not evidence:
+        # Capitalised words with nothing else to go on are most likely names (Qatar, Iraq)
+        name_like = all(word[:1].isupper() for word in text.split())
+        evidence = not name_like and _PROFILES[lang].log_prob(grams) / len(grams) >= _MIN_LOG_PROB
+    if (not cues and len(normalized.replace("'", "").replace(" ", "")) <= _SHORT_INPUT) or not evidence:
+        confidence = min(confidence, _SHORT_MAX_CONFIDENCE)
+    return lang, confidence
+
+
+# Labelled samples for the benchmark below; None marks other languages and
+# proper names, which must stay below the threshold and go to the remote detector
+BENCHMARK_SAMPLES = [
+    ("hello", "en"), ("apple", "en"), ("water", "en"), ("book", "en"), ("beautiful", "en"),
+    ("friend", "en"), ("school", "en"), ("teacher", "en"), ("happy", "en"), ("thank you", "en"),
+    ("good morning", "en"), ("how are you", "en"), ("computer", "en"), ("knowledge", "en"),
+    ("weather", "en"), ("quickly", "en"), ("strength", "en"), ("language", "en"),
+    ("i love you", "en"), ("see you later", "en"), ("where is the bus stop", "en"),
+    ("house", "en"), ("river", "en"), ("mountain", "en"), ("dictionary", "en"),
+    ("translation", "en"), ("pencil", "en"), ("window", "en"), ("green", "en"), ("dog", "en"),
+    ("cat", "en"), ("sun", "en"), ("man", "en"), ("men", "en"), ("day", "en"), ("boy", "en"),
+    ("map", "en"), ("big", "en"), ("fish", "en"), ("star", "en"), ("road", "en"), ("children", "en"), ("question", "en"), ("answer", "en"), ("listen", "en"),
+    ("olma", "uz"), ("salom", "uz"), ("kitob", "uz"), ("do'st", "uz"), ("o'qituvchi", "uz"),
+    ("maktab", "uz"), ("rahmat", "uz"), ("qalam", "uz"), ("suv", "uz"), ("non", "uz"),
+    ("yaxshi", "uz"), ("go'zal", "uz"), ("tog'", "uz"), ("o‘zbek", "uz"), ("g‘isht", "uz"),
+    ("qanday", "uz"), ("qiz", "uz"), ("uy", "uz"), ("bola", "uz"), ("daraxt", "uz"),
+    ("men seni sevaman", "uz"), ("qayerdasiz", "uz"), ("xayrli tong", "uz"),
+    ("bugun havo issiq", "uz"), ("kitoblar", "uz"), ("o'quvchilar", "uz"),
+    ("shahar", "uz"), ("choy", "uz"), ("qush", "uz"), ("ko'cha", "uz"), ("yo'l", "uz"),
+    ("oshxona", "uz"), ("sabzi", "uz"), ("qovun", "uz"), ("baliq", "uz"), ("dengiz", "uz"),
+    ("merci beaucoup", None), ("gracias", None), ("bonjour", None), ("ciao", None),
+    ("arrivederci", None), ("hola amigo", None), ("guten tag", None), ("obrigado", None),
+    ("por favor", None), ("Qatar", None), ("Iraq", None), ("Mexico", None), ("Moscow", None),
+    ("Quebec", None), ("Zimbabwe", None), ("Tokyo", None),
+]
+
+
+if __name__ == '__main__':
+    # Accuracy/latency benchmark on the labelled sample set
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Offline en/uz detector benchmark")
+    parser.add_argument("--threshold", type=float, default=0.8, help="confidence needed to skip the remote detector")
+    parser.add_argument("--repeat", type=int, default=200, help="timing repetitions per sample")
+    args = parser.parse_args()
+
+    correct = confident = confident_correct = fallbacks = fallback_correct = 0
+    for sample, expected in BENCHMARK_SAMPLES:
+        lang, confidence = detect_language(sample)
+        if expected is None:
+            # Other languages: only a confident answer is a miss
+            fallbacks += 1
+            ok = confidence < args.threshold
+            fallback_correct += ok
+            if not ok:
+                print(f"  miss: {sample!r:28} expected=fallback got={lang} ({confidence:.2f})")
+            continue
+        ok = lang == expected
+        correct += ok
+        if confidence >= args.threshold:
+            confident += 1
+            confident_correct += ok
+        if not ok:
+            print(f"  miss: {sample!r:28} expected={expected} got={lang} ({confidence:.2f})")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for sample, _expected in BENCHMARK_SAMPLES:
+            detect_language(sample)
+    per_call_us = (time.perf_counter() - start) / (args.repeat * len(BENCHMARK_SAMPLES)) * 1e6
+
+    total = len(BENCHMARK_SAMPLES) - fallbacks
+    print(f"samples:              {total} en/uz, {fallbacks} other")
+    print(f"accuracy (all):       {correct / total:.1%}")
+    print(f"confident (>= {args.threshold}): {confident / total:.1%} of samples")
+    print(f"accuracy (confident): {confident_correct / confident:.1%}" if confident else "accuracy (confident): n/a")
+    print(f"fallback (other):     {fallback_correct / fallbacks:.1%}" if fallbacks else "fallback (other):     n/a")
+    print(f"latency:              {per_call_us:.1f} us/call")
@@ -0,0 +1,137 @@
+# webhook.py
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Receives Telegram updates over HTTPS webhooks instead of long polling.
+
+    Incoming updates are checked against the secret token, acknowledged
+    immediately and put on a bounded queue that a fixed pool of workers
+    feeds into the dispatcher. When the queue is full Telegram gets a 503
+    and retries later. On shutdown the server stops accepting updates and
+    drains the queue before exiting.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, webhook_url, path, secret_token=None, queue_size=1000,
+                 workers=32, drain_timeout=15.0, allowed_updates=None, on_startup=None, on_shutdown=None):
+        """
+        Args:
+            dispatcher (Dispatcher): The aiogram dispatcher to feed.
+            webhook_url (str | None): Public URL registered with setWebhook
+                (None to leave the current registration alone).
+            path (str): Local HTTP path the server listens on.
+            secret_token (str | None): Expected X-Telegram-Bot-Api-Secret-Token value.
+            queue_size (int): Maximum number of queued, unprocessed updates.
+            workers (int): Number of concurrent update handlers.
+            drain_timeout (float): Seconds to wait for queued updates on shutdown.
+            allowed_updates (list | None): Update types to request from Telegram.
+            on_startup / on_shutdown (coroutine function | None): Called with the dispatcher.
+        """
+        self.dispatcher = dispatcher
+        self.webhook_url = webhook_url
+        self.path = path
+        self.secret_token = secret_token
+        self.queue_size = queue_size
+        self.queue = None  # Created on startup, inside the server's event loop
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.allowed_updates = allowed_updates
+        self.user_on_startup = on_startup
+        self.user_on_shutdown = on_shutdown
+        self.accepting = False
+        self._tasks = []
+        self.received = 0
+        self.rejected = 0
+        self.unauthorized = 0
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    def run(self, host="0.0.0.0", port=8080):
+        """Runs the server until SIGINT/SIGTERM."""
+        web.run_app(self.make_app(), host=host, port=port, print=None)
+
+    async def handle(self, request):
+        if self.secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            self.unauthorized += 1
+            return web.Response(status=401)
+        if not self.accepting:
+            return web.Response(status=503)
+        try:
+            update = types.Update.to_object(await request.json())
+        except Exception as e:
+            log.warning(f"Malformed webhook payload: {e}")
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram keeps the update and retries the delivery later
+            self.rejected += 1
+            return web.Response(status=503)
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                # Through updates_handler (as polling does) so update-level middlewares run
+                await self.dispatcher.updates_handler.notify(update)
+            except Exception as e:
+                log.exception(f"Error while processing update {update.update_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _on_startup(self, app):
+        Bot.set_current(self.dispatcher.bot)
+        Dispatcher.set_current(self.dispatcher)
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.user_on_startup:
+            await self.user_on_startup(self.dispatcher)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.webhook_url:
+            await self.dispatcher.bot.set_webhook(self.webhook_url, secret_token=self.secret_token,
+                                                  allowed_updates=self.allowed_updates)
+            log.info(f"Webhook registered: {self.webhook_url}")
+        self.accepting = True
+
+    async def _on_shutdown(self, app):
+        self.accepting = False
+        pending = self.queue.qsize()
+        log.info(f"Webhook server stopping, draining {pending} queued updates...")
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Drain timed out with {self.queue.qsize()} updates still queued.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.user_on_shutdown:
+            await self.user_on_shutdown(self.dispatcher)
+        # The webhook stays registered, so Telegram holds updates that arrive while we are down
+        await self.dispatcher.storage.close()
+        await self.dispatcher.storage.wait_closed()
+        session = await self.dispatcher.bot.get_session()
+        await session.close()
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "received": self.received,
+            "rejected": self.rejected,
+            "unauthorized": self.unauthorized,
+        }